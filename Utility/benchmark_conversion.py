@@ -0,0 +1,245 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from conversion_stats import ConversionStats, collecting
+from convert_to_pascal_voc_kernel import convert_directory_to_pascal_voc, iter_pascal_voc_text
+from get_image_size import read_image_size
+from load_annotation import discover_image_annotation_pairs
+from polygon_to_bbox_util import pack_polygons, polygons_to_bboxes, polygons_to_voc_polygons
+from synthetic_annotations import add_synthetic_dataset_arguments, generate_synthetic_dataset, synthetic_dataset_options
+from xml_to_polygon import xml_to_polygon_batch
+
+
+BENCHMARK_VERSION = 3
+BENCHMARK_STAGES = (
+    "discovery",
+    "size_read",
+    "xml_parse",
+    "geometry",
+    "bezier",
+    "bbox",
+    "voc_serialization",
+    "end_to_end",
+)
+
+_CURVE_SHAPES = ("Curve", "ClosedCurve")
+
+
+def _stage_result(items: int, wall: list[float], cpu: list[float]) -> dict[str, object]:
+    best = min(wall)
+    return {
+        "items": items,
+        "wall_seconds": wall,
+        "best_seconds": best,
+        "median_seconds": statistics.median(wall),
+        "cpu_seconds": min(cpu),
+        "items_per_second": items / best if best > 0.0 else None,
+    }
+
+
+def _time_stage(run: Callable[[], int], repeat: int) -> dict[str, object]:
+    # Best-of-`repeat` wall and CPU time; `run` returns the number of items it processed.
+    wall: list[float] = []
+    cpu: list[float] = []
+    items = 0
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        items = run()
+        wall.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+
+    return _stage_result(items, wall, cpu)
+
+
+def benchmark_conversion(
+    dataset_dir: str | Path,
+    *,
+    repeat: int = 3,
+    jobs: int = 1,
+    bezier_flatness: float | None = None,
+    arc_tolerance: float | None = None,
+) -> dict[str, object]:
+    # Times each conversion stage over the pairs in dataset_dir on the previous stage's precomputed
+    # results (the parser stages share one pass), then the whole batch conversion end to end.
+    dataset_dir = Path(dataset_dir)
+    stages: dict[str, dict[str, object]] = {}
+    state: dict[str, object] = {}
+
+    polygon_options: dict[str, object] = {}
+    if bezier_flatness is not None:
+        polygon_options["bezier_flatness"] = bezier_flatness
+    if arc_tolerance is not None:
+        polygon_options["arc_tolerance"] = arc_tolerance
+
+    def discovery() -> int:
+        state["pairs"], _ = discover_image_annotation_pairs(dataset_dir)
+        return len(state["pairs"])
+
+    def size_read() -> int:
+        state["sizes"] = [read_image_size(image_path) for image_path, _ in state["pairs"]]
+        return len(state["sizes"])
+
+    # xml_parse, geometry and bezier are interleaved in the streaming parser, so they run together
+    # through xml_to_polygon_batch and each gets the parser's own exclusive stage time (as in --stats).
+    def polygon_pass() -> dict[str, object]:
+        stats = ConversionStats()
+        with collecting(stats):
+            state["class_polygons"] = [
+                xml_to_polygon_batch(annotation_xml, **polygon_options).to_class_polygons()
+                for _, annotation_xml in state["pairs"]
+            ]
+        return stats.to_dict()
+
+    # Per image, as the VOC writer does: pack the polygons, then one batched pass each.
+    def bbox() -> int:
+        count = 0
+        for class_polygons, (width, height) in zip(state["class_polygons"], state["sizes"]):
+            coords, offsets = pack_polygons(polygon for _, polygon in class_polygons)
+            polygons_to_bboxes(coords, offsets, image_width=width, image_height=height)
+            polygons_to_voc_polygons(coords, offsets, image_width=width, image_height=height)
+            count += len(class_polygons)
+        return count
+
+    def voc_serialization() -> int:
+        size = 0
+        for (image_path, _), class_polygons, (width, height) in zip(state["pairs"], state["class_polygons"], state["sizes"]):
+            text = "".join(
+                iter_pascal_voc_text(
+                    class_polygons,
+                    filename=image_path.name,
+                    width=width,
+                    height=height,
+                    folder=image_path.parent.name,
+                    image_path=str(image_path),
+                )
+            )
+            size += len(text.encode("utf-8"))
+        state["voc_bytes"] = size
+        return len(state["class_polygons"])
+
+    def end_to_end() -> int:
+        with tempfile.TemporaryDirectory(prefix="voc_benchmark_") as output_dir:
+            written, _ = convert_directory_to_pascal_voc(
+                dataset_dir,
+                output_dir,
+                polygon_options=polygon_options,
+                jobs=jobs,
+            )
+        return len(written)
+
+    stages["discovery"] = _time_stage(discovery, repeat)
+    stages["size_read"] = _time_stage(size_read, repeat)
+    runs = [polygon_pass() for _ in range(repeat)]
+    entries = {
+        name[len("entries.") :]: n
+        for name, n in runs[-1]["counters"].items()
+        if name.startswith("entries.") and name != "entries.(none)"
+    }
+    curve_entries = sum(entries.get(shape, 0) for shape in _CURVE_SHAPES)
+    for name, items in (
+        ("xml_parse", sum(entries.values())),
+        ("geometry", sum(entries.values()) - curve_entries),
+        ("bezier", curve_entries),
+    ):
+        times = [run["stages"].get(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0}) for run in runs]
+        stages[name] = _stage_result(items, [t["wall_seconds"] for t in times], [t["cpu_seconds"] for t in times])
+    stages["bbox"] = _time_stage(bbox, repeat)
+    stages["voc_serialization"] = _time_stage(voc_serialization, repeat)
+    stages["end_to_end"] = _time_stage(end_to_end, repeat)
+
+    vertices = sum(len(polygon) for class_polygons in state["class_polygons"] for _, polygon in class_polygons)
+    return {
+        "images": len(state["pairs"]),
+        "entries": sum(entries.values()),
+        "vertices": vertices,
+        "voc_bytes": state["voc_bytes"],
+        "stages": stages,
+    }
+
+
+def _environment() -> dict[str, object]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time each Pascal VOC conversion stage on a synthetic (or existing) dataset and emit JSON results.",
+    )
+    parser.add_argument("--dataset", help="Existing image/annotation directory (default: generate a synthetic one)")
+    parser.add_argument("--keep-dataset", help="Write the synthetic dataset here and keep it (default: a temp directory)")
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--label", default="", help="Free-form label stored with the results, e.g. a version or commit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best is reported (default: 3)")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes for the end_to_end stage (default: 1)")
+    parser.add_argument("--bezier-flatness", type=float, help="As in convert_to_pascal_voc.py")
+    parser.add_argument("--arc-tolerance", type=float, help="As in convert_to_pascal_voc.py")
+    add_synthetic_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        raise SystemExit("--repeat must be >= 1")
+
+    options = synthetic_dataset_options(args)
+    run_kwargs = {
+        "repeat": args.repeat,
+        "jobs": args.jobs,
+        "bezier_flatness": args.bezier_flatness,
+        "arc_tolerance": args.arc_tolerance,
+    }
+
+    if args.dataset:
+        dataset: dict[str, object] = {"path": str(Path(args.dataset).resolve())}
+        measured = benchmark_conversion(args.dataset, **run_kwargs)
+    else:
+        dataset = {"synthetic": {**vars(options), "shapes": list(options.shapes)}}
+        with tempfile.TemporaryDirectory(prefix="voc_benchmark_data_") as tmp_dir:
+            dataset_dir = Path(args.keep_dataset) if args.keep_dataset else Path(tmp_dir)
+            generate_synthetic_dataset(dataset_dir, options)
+            measured = benchmark_conversion(dataset_dir, **run_kwargs)
+
+    results = {
+        "benchmark": "pascal_voc_conversion",
+        "version": BENCHMARK_VERSION,
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "dataset": dataset,
+        "settings": run_kwargs,
+        **measured,
+    }
+
+    text = json.dumps(results, indent=1)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+        for name in BENCHMARK_STAGES:
+            stage = measured["stages"][name]
+            print(f"{name:>18}: {stage['best_seconds']:9.4f} s  {stage['items']:>9} items", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,17 +17,22 @@ def bezier_open_curve(points, tension):
     pts = np.empty((n * 3 - 2, 2), dtype=float)
     pts[0::3] = points
 
-    if n == 2:
-        pts[1], pts[2] = control_point(0.0, 0.0, points[0], points[0], points[1], points[1])
-    else:
-        pts[1], pts[2] = control_point(0.0, weight, points[0], points[0], points[1], points[2])
-
-        for i in range(1, n - 2):
-            pts[i * 3 + 1], pts[i * 3 + 2] = control_point(
-                weight, weight, points[i - 1], points[i], points[i + 1], points[i + 2]
-            )
-
-        pts[-3], pts[-2] = control_point(weight, 0.0, points[-3], points[-2], points[-1], points[-1])
+    # Segment i runs from points[i] to points[i + 1]; end neighbors are clamped
+    # and the outer handles get zero weight.
+    index = np.arange(n - 1)
+    weight1 = np.full(n - 1, weight, dtype=float)
+    weight2 = np.full(n - 1, weight, dtype=float)
+    weight1[0] = 0.0
+    weight2[-1] = 0.0
+
+    pts[1::3], pts[2::3] = control_point_arrays(
+        weight1,
+        weight2,
+        points[np.maximum(index - 1, 0)],
+        points[index],
+        points[index + 1],
+        points[np.minimum(index + 2, n - 1)],
+    )
 
     return pts
 
@@ -50,17 +55,56 @@ def bezier_closed_curve(points, tension):
         pts[1], pts[2] = control_point(0.0, 0.0, points[0], points[0], points[1], points[1])
         pts[4], pts[5] = pts[2], pts[1]
     else:
-        pts[1], pts[2] = control_point(weight, weight, points[-1], points[0], points[1], points[2])
+        index = np.arange(n)
+        weights = np.full(n, weight, dtype=float)
+
+        pts[1::3], pts[2::3] = control_point_arrays(
+            weights,
+            weights,
+            points[(index - 1) % n],
+            points[index],
+            points[(index + 1) % n],
+            points[(index + 2) % n],
+        )
 
-        for i in range(1, n - 2):
-            pts[i * 3 + 1], pts[i * 3 + 2] = control_point(
-                weight, weight, points[i - 1], points[i], points[i + 1], points[i + 2]
-            )
+    return pts
 
-        pts[-6], pts[-5] = control_point(weight, weight, points[-3], points[-2], points[-1], points[0])
-        pts[-3], pts[-2] = control_point(weight, weight, points[-2], points[-1], points[0], points[1])
 
-    return pts
+def control_point_arrays(weight1, weight2, pt0, pt1, pt2, pt3):
+    # Array form of control_point over M segments: pt* are (M, 2), weights are (M,) or scalars.
+    # Operations are ordered as in the scalar path so results match it exactly.
+    weight1 = np.broadcast_to(np.asarray(weight1, dtype=float), pt1.shape[:1])
+    weight2 = np.broadcast_to(np.asarray(weight2, dtype=float), pt2.shape[:1])
+
+    v12 = pt2 - pt1
+    n12 = _row_norm(v12)
+
+    c1 = limited_overshoot_control_point_arrays(weight1, pt1, n12, pt2 - pt0)
+    c2 = limited_overshoot_control_point_arrays(weight2, pt2, n12, pt1 - pt3)
+
+    degenerate = ~(n12 > 0.0)
+    c1[degenerate] = pt1[degenerate]
+    c2[degenerate] = pt2[degenerate]
+
+    return c1, c2
+
+
+def limited_overshoot_control_point_arrays(weight, pt, interval_length, direction):
+    direction_length = _row_norm(direction)
+    valid = direction_length > 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.minimum(1.0, interval_length / direction_length * 2.0)
+
+    result = pt + weight[:, None] * (direction * scale[:, None])
+    result[~valid] = pt[~valid]
+
+    return result
+
+
+def _row_norm(v):
+    # Per-row dot product through matmul rounds like np.linalg.norm on a single vector.
+    return np.sqrt(np.matmul(v[:, None, :], v[:, :, None])[:, 0, 0])
 
 
 def control_point(weight1, weight2, pt0, pt1, pt2, pt3):
@@ -2,17 +2,28 @@
 # https://github.com/tk-yoshimura
 
 
+from functools import lru_cache
+
 import numpy as np
 
 from bezier_control_point import bezier_closed_curve, bezier_open_curve
 
 
-def _cubic_bezier(p0, c1, c2, p1, t):
+MAX_ADAPTIVE_SAMPLES = 1024
+
+@lru_cache(maxsize=64)
+def _bernstein_basis(samples_per_segment):
+    # (samples + 1, 4) cubic Bernstein weights at t = linspace(0, 1, samples + 1).
+    t = np.linspace(0.0, 1.0, samples_per_segment + 1)
     u = 1.0 - t
-    return (u ** 3) * p0 + 3.0 * (u ** 2) * t * c1 + 3.0 * u * (t ** 2) * c2 + (t ** 3) * p1
 
+    basis = np.column_stack((u ** 3, 3.0 * (u ** 2) * t, 3.0 * u * (t ** 2), t ** 3))
+    basis.setflags(write=False)
+
+    return basis
 
-def interpolate_from_control_points(control_points, samples_per_segment=20):
+
+def interpolate_from_control_points(control_points, samples_per_segment=20, flatness=None):
     control_points = np.asarray(control_points, dtype=float)
 
     if control_points.ndim != 2 or control_points.shape[1] != 2:
@@ -25,29 +36,74 @@ def interpolate_from_control_points(control_points, samples_per_segment=20):
         raise ValueError("samples_per_segment must be >= 1")
 
     segment_count = (control_points.shape[0] - 1) // 3
-    result = []
 
-    for i in range(segment_count):
-        p0 = control_points[i * 3]
-        c1 = control_points[i * 3 + 1]
-        c2 = control_points[i * 3 + 2]
-        p1 = control_points[i * 3 + 3]
+    index = np.arange(segment_count)[:, None] * 3 + np.arange(4)
+    segments = control_points[index]
+
+    if flatness is not None:
+        sample_counts = bezier_segment_sample_counts(segments, flatness)
+        result = np.empty((int(sample_counts.sum()) + 1, 2), dtype=float)
+        result[0] = control_points[0]
+        result[1:] = evaluate_bezier_segments_ragged(segments, sample_counts)
+        return result
+
+    values = evaluate_bezier_segments(segments, samples_per_segment)
+
+    # Segments share endpoints: keep t = 0 only for the first one.
+    result = np.empty((segment_count * samples_per_segment + 1, 2), dtype=float)
+    result[0] = values[0, 0]
+    result[1:] = values[:, 1:].reshape(-1, 2)
+
+    return result
+
 
-        t_values = np.linspace(0.0, 1.0, samples_per_segment + 1)
-        if i > 0:
-            t_values = t_values[1:]
+def evaluate_bezier_segments(segments, samples_per_segment):
+    # segments: (S, 4, 2) cubic control points -> (S, samples + 1, 2) points at t = linspace(0, 1, samples + 1).
+    # All segments are evaluated with one matrix product.
+    segments = np.asarray(segments, dtype=float)
+    segment_count = segments.shape[0]
+    basis = _bernstein_basis(int(samples_per_segment))
 
-        for t in t_values:
-            result.append(_cubic_bezier(p0, c1, c2, p1, t))
+    stacked = segments.transpose(1, 0, 2).reshape(4, segment_count * 2)
+    values = (basis @ stacked).reshape(basis.shape[0], segment_count, 2)
+
+    return values.transpose(1, 0, 2)
+
+
+def bezier_segment_sample_counts(segments, flatness, max_samples=MAX_ADAPTIVE_SAMPLES):
+    # Chords per cubic segment so that the flattened polyline stays within `flatness` of the curve.
+    # Uniform t-steps of 1/n deviate by at most 3/4 * max(|p0 - 2c1 + c2|, |c1 - 2c2 + p1|) / n^2.
+    if not flatness > 0.0:
+        raise ValueError("flatness must be > 0")
+
+    segments = np.asarray(segments, dtype=float)
+    d1 = segments[:, 0] - 2.0 * segments[:, 1] + segments[:, 2]
+    d2 = segments[:, 1] - 2.0 * segments[:, 2] + segments[:, 3]
+    bend = np.maximum(np.hypot(d1[:, 0], d1[:, 1]), np.hypot(d2[:, 0], d2[:, 1]))
+
+    counts = np.ceil(np.sqrt(0.75 * bend / flatness))
+    return np.clip(np.nan_to_num(counts, nan=1.0), 1, max_samples).astype(np.int64)
+
+
+def evaluate_bezier_segments_ragged(segments, sample_counts):
+    # Points at t = j / k (j = 1..k, k = sample_counts[s]) of every segment, concatenated in segment order.
+    segments = np.asarray(segments, dtype=float)
+    sample_counts = np.asarray(sample_counts, dtype=np.int64)
+
+    segment = np.repeat(np.arange(segments.shape[0]), sample_counts)
+    first = np.cumsum(sample_counts) - sample_counts
+    t = (np.arange(segment.shape[0]) - first[segment] + 1) / sample_counts[segment]
+    u = 1.0 - t
 
-    return np.asarray(result, dtype=float)
+    basis = np.column_stack((u ** 3, 3.0 * (u ** 2) * t, 3.0 * u * (t ** 2), t ** 3))
+    return np.einsum("tk,tkd->td", basis, segments[segment])
 
 
-def interpolate_open_curve(points, tension=0.5, samples_per_segment=20):
+def interpolate_open_curve(points, tension=0.5, samples_per_segment=20, flatness=None):
     control_points = bezier_open_curve(points, tension)
-    return interpolate_from_control_points(control_points, samples_per_segment=samples_per_segment)
+    return interpolate_from_control_points(control_points, samples_per_segment=samples_per_segment, flatness=flatness)
 
 
-def interpolate_closed_curve(points, tension=0.5, samples_per_segment=20):
+def interpolate_closed_curve(points, tension=0.5, samples_per_segment=20, flatness=None):
     control_points = bezier_closed_curve(points, tension)
-    return interpolate_from_control_points(control_points, samples_per_segment=samples_per_segment)
+    return interpolate_from_control_points(control_points, samples_per_segment=samples_per_segment, flatness=flatness)
@@ -4,58 +4,248 @@
 
 import numpy as np
 
-from bezier_interpolation import interpolate_closed_curve, interpolate_open_curve
+from bezier_control_point import control_point_arrays
+from bezier_interpolation import (
+    bezier_segment_sample_counts,
+    evaluate_bezier_segments,
+    evaluate_bezier_segments_ragged,
+)
 
 
 SAMPLES_PER_SEGMENT = 16
 
+# Centerline steps shorter than this, relative to the curve's largest coordinate, are rounding
+# noise (e.g. samples on a segment between two identical clicks) and count as zero.
+DEGENERATE_STEP = 1e-9
 
-def _normalize(v):
-    n = np.linalg.norm(v)
-    if n > 0.0:
-        return v / n
-    return np.array([0.0, 0.0], dtype=float)
 
+def _ragged_index(lengths):
+    # For ragged groups of the given lengths: (group id, position within group) of every element.
+    lengths = np.asarray(lengths, dtype=np.int64)
+    group = np.repeat(np.arange(lengths.shape[0]), lengths)
+    starts = np.cumsum(lengths) - lengths
+    local = np.arange(group.shape[0]) - starts[group]
+    return group, local
 
-def _compute_tangents(polyline):
-    n = polyline.shape[0]
-    tangents = np.zeros((n, 2), dtype=float)
 
-    if n == 0:
-        return tangents
-    if n == 1:
-        tangents[0] = np.array([1.0, 0.0], dtype=float)
-        return tangents
+def _offsets_from_lengths(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
 
-    tangents[0] = _normalize(polyline[1] - polyline[0])
-    tangents[-1] = _normalize(polyline[-1] - polyline[-2])
 
-    for i in range(1, n - 1):
-        tangents[i] = _normalize(polyline[i + 1] - polyline[i - 1])
+def _normalize_rows(v):
+    # Per-row dot product through matmul rounds like np.linalg.norm on a single vector.
+    n = np.sqrt(np.matmul(v[:, None, :], v[:, :, None])[:, 0, 0])
+    result = np.zeros_like(v)
+    valid = n > 0.0
+    result[valid] = v[valid] / n[valid, None]
+    return result
 
-    for i in range(n):
-        if np.linalg.norm(tangents[i]) == 0.0:
-            if i > 0 and np.linalg.norm(tangents[i - 1]) > 0.0:
-                tangents[i] = tangents[i - 1]
-            else:
-                tangents[i] = np.array([1.0, 0.0], dtype=float)
+
+def _compute_tangents(polyline, offsets):
+    # Unit tangents of every ragged polyline: one-sided at both ends, central in between.
+    # Zero (degenerate) tangents inherit the previous one in the same polyline, or (1, 0) at its start.
+    if polyline.shape[0] == 0:
+        return np.zeros((0, 2), dtype=float)
+
+    lengths = np.diff(offsets)
+    curve, local = _ragged_index(lengths)
+    n = lengths[curve]
+
+    index = np.arange(polyline.shape[0])
+    start = offsets[:-1][curve]
+    prev_index = np.where(local == 0, index, index - 1)
+    next_index = np.where(local == n - 1, index, index + 1)
+
+    steps = polyline[next_index] - polyline[prev_index]
+    nonempty = lengths > 0
+    scale = np.zeros(lengths.shape[0], dtype=float)
+    scale[nonempty] = np.maximum.reduceat(np.abs(polyline).max(axis=1), offsets[:-1][nonempty])
+    tolerance = DEGENERATE_STEP * np.maximum(scale, 1.0)[curve]
+    steps[np.hypot(steps[:, 0], steps[:, 1]) <= tolerance] = 0.0
+
+    tangents = _normalize_rows(steps)
+
+    single = n == 1
+    tangents[single] = (1.0, 0.0)
+
+    nonzero = (tangents != 0.0).any(axis=1)
+    source = np.maximum.accumulate(np.where(nonzero, index, -1))
+    inherited = ~nonzero & (source >= start)
+    fallback = ~nonzero & (source < start)
+    tangents[inherited] = tangents[source[inherited]]
+    tangents[fallback] = (1.0, 0.0)
 
     return tangents
 
 
-def bezier_closed_region(points, tension=0.5, samples_per_segment=SAMPLES_PER_SEGMENT):
+def _curve_centerlines(coords, offsets, closed, tension, samples_per_segment, flatness):
+    # Flatten every open/closed curve; returns the centerline points and their ragged offsets.
+    lengths = np.diff(offsets)
+    weight = tension / 2.0
+
+    segment_counts = np.where(lengths >= 2, np.where(closed, lengths, lengths - 1), 0)
+    curve, i = _ragged_index(segment_counts)
+    n = lengths[curve]
+    start = offsets[:-1][curve]
+    is_closed = closed[curve]
+
+    # Closed curves wrap around; open curves clamp the neighbors and zero the outer handle weights.
+    prev_local = np.where(is_closed, (i - 1) % np.maximum(n, 1), np.maximum(i - 1, 0))
+    next_local = np.where(is_closed, (i + 1) % np.maximum(n, 1), i + 1)
+    next2_local = np.where(is_closed, (i + 2) % np.maximum(n, 1), np.minimum(i + 2, n - 1))
+
+    weight1 = np.full(i.shape[0], weight, dtype=float)
+    weight2 = np.full(i.shape[0], weight, dtype=float)
+    weight1[~is_closed & (i == 0)] = 0.0
+    weight2[~is_closed & (i == n - 2)] = 0.0
+    weight1[is_closed & (n == 2)] = 0.0
+    weight2[is_closed & (n == 2)] = 0.0
+
+    p1 = coords[start + i]
+    p2 = coords[start + next_local]
+    c1, c2 = control_point_arrays(
+        weight1,
+        weight2,
+        coords[start + prev_local],
+        p1,
+        p2,
+        coords[start + next2_local],
+    )
+
+    segments = np.stack((p1, c1, c2, p2), axis=1)
+
+    # Samples at t in (0, 1] per segment: fixed count, or enough chords to stay within `flatness`.
+    if flatness is None:
+        sample_counts = np.full(segments.shape[0], samples_per_segment, dtype=np.int64)
+        samples = evaluate_bezier_segments(segments, samples_per_segment)[:, 1:].reshape(-1, 2)
+    else:
+        sample_counts = bezier_segment_sample_counts(segments, flatness)
+        samples = evaluate_bezier_segments_ragged(segments, sample_counts)
+
+    curve_sample_counts = np.bincount(curve, weights=sample_counts, minlength=lengths.shape[0]).astype(np.int64)
+
+    # Curves with fewer than two points are passed through unchanged.
+    centerline_lengths = np.where(segment_counts > 0, curve_sample_counts + 1, lengths)
+    centerline_offsets = _offsets_from_lengths(centerline_lengths)
+    centerline = np.empty((int(centerline_offsets[-1]), 2), dtype=float)
+
+    passthrough = segment_counts == 0
+    src_curve, src_local = _ragged_index(np.where(passthrough, lengths, 0))
+    centerline[centerline_offsets[:-1][src_curve] + src_local] = coords[offsets[:-1][src_curve] + src_local]
+
+    first_segment = _offsets_from_lengths(segment_counts)[:-1]
+    has_segments = segment_counts > 0
+    centerline[centerline_offsets[:-1][has_segments]] = p1[first_segment[has_segments]]
+
+    sample_curve, sample_local = _ragged_index(curve_sample_counts)
+    centerline[centerline_offsets[:-1][sample_curve] + 1 + sample_local] = samples
+
+    return centerline, centerline_offsets
+
+
+def bezier_regions(
+    coords,
+    offsets,
+    closed,
+    stroke_widths,
+    tension=0.5,
+    samples_per_segment=SAMPLES_PER_SEGMENT,
+    flatness=None,
+):
+    # Batched bezier_closed_region / bezier_open_stroke_region over many ragged curves.
+    # Curve k uses coords[offsets[k]:offsets[k + 1]]; stroke_widths is ignored for closed curves.
+    # With flatness (pixels), each segment gets just enough samples to stay within it
+    # and samples_per_segment is ignored.
+    # Returns (region_coords, region_offsets) in the same ragged layout.
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    closed = np.asarray(closed, dtype=bool)
+    stroke_widths = np.asarray(stroke_widths, dtype=float)
+
+    if offsets.ndim != 1 or offsets.shape[0] < 1 or offsets[0] != 0 or offsets[-1] != coords.shape[0]:
+        raise ValueError("offsets must start at 0 and end at the number of points")
+    curve_count = offsets.shape[0] - 1
+    if closed.shape != (curve_count,) or stroke_widths.shape != (curve_count,):
+        raise ValueError("closed and stroke_widths must have one value per curve")
+    if samples_per_segment < 1:
+        raise ValueError("samples_per_segment must be >= 1")
+
+    lengths = np.diff(offsets)
+    if np.any(~closed & (lengths > 0) & (stroke_widths < 0.0)):
+        raise ValueError("stroke_width must be >= 0")
+
+    centerline, centerline_offsets = _curve_centerlines(
+        coords,
+        offsets,
+        closed,
+        tension,
+        samples_per_segment,
+        flatness,
+    )
+    centerline_lengths = np.diff(centerline_offsets)
+
+    # Closed curves end where they start; drop the duplicated closing point.
+    drop_last = closed & (centerline_lengths >= 2)
+    first = centerline[centerline_offsets[:-1][drop_last]]
+    last = centerline[centerline_offsets[1:][drop_last] - 1]
+    drop_last[drop_last] = np.isclose(first, last).all(axis=1)
+
+    # Open curves with a stroke width become a left/right outline around the centerline.
+    stroked = ~closed & (centerline_lengths >= 2) & (stroke_widths != 0.0)
+
+    region_lengths = np.where(stroked, centerline_lengths * 2, centerline_lengths - drop_last)
+    region_offsets = _offsets_from_lengths(region_lengths)
+    regions = np.empty((int(region_offsets[-1]), 2), dtype=float)
+
+    copy_lengths = np.where(stroked, 0, region_lengths)
+    curve, local = _ragged_index(copy_lengths)
+    regions[region_offsets[:-1][curve] + local] = centerline[centerline_offsets[:-1][curve] + local]
+
+    if np.any(stroked):
+        stroke_lengths = np.where(stroked, centerline_lengths, 0)
+        stroke_offsets = _offsets_from_lengths(stroke_lengths)
+        curve, local = _ragged_index(stroke_lengths)
+        src = centerline_offsets[:-1][curve] + local
+        polyline = centerline[src]
+
+        tangents = _compute_tangents(polyline, stroke_offsets)
+        normals = np.column_stack((-tangents[:, 1], tangents[:, 0]))
+
+        half = (stroke_widths[curve] * 0.5)[:, None]
+        left = polyline + normals * half
+        right = polyline - normals * half
+
+        base = region_offsets[:-1][curve]
+        n = stroke_lengths[curve]
+        regions[base + local] = left
+        regions[base + 2 * n - 1 - local] = right
+
+    return regions, region_offsets
+
+
+def _single_curve_region(points, closed, stroke_width, tension, samples_per_segment, flatness):
+    regions, _ = bezier_regions(
+        points,
+        [0, points.shape[0]],
+        [closed],
+        [stroke_width],
+        tension=tension,
+        samples_per_segment=samples_per_segment,
+        flatness=flatness,
+    )
+    return regions
+
+
+def bezier_closed_region(points, tension=0.5, samples_per_segment=SAMPLES_PER_SEGMENT, flatness=None):
     points = np.asarray(points, dtype=float)
     if points.ndim != 2 or points.shape[1] != 2:
         raise ValueError("points must be shape (N, 2)")
     if points.shape[0] == 0:
         return np.empty((0, 2), dtype=float)
 
-    curve = interpolate_closed_curve(points, tension=tension, samples_per_segment=samples_per_segment)
-
-    if curve.shape[0] >= 2 and np.allclose(curve[0], curve[-1]):
-        curve = curve[:-1]
-
-    return curve
+    return _single_curve_region(points, True, 0.0, tension, samples_per_segment, flatness)
 
 
 def bezier_open_stroke_region(
@@ -63,6 +253,7 @@ def bezier_open_stroke_region(
     stroke_width,
     tension=0.5,
     samples_per_segment=SAMPLES_PER_SEGMENT,
+    flatness=None,
 ):
     points = np.asarray(points, dtype=float)
     if points.ndim != 2 or points.shape[1] != 2:
@@ -72,18 +263,4 @@ def bezier_open_stroke_region(
     if stroke_width < 0.0:
         raise ValueError("stroke_width must be >= 0")
 
-    centerline = interpolate_open_curve(points, tension=tension, samples_per_segment=samples_per_segment)
-
-    if centerline.shape[0] == 1 or stroke_width == 0.0:
-        return centerline.copy()
-
-    tangents = _compute_tangents(centerline)
-    normals = np.column_stack((-tangents[:, 1], tangents[:, 0]))
-
-    half = stroke_width * 0.5
-    left = centerline + normals * half
-    right = centerline - normals * half
-
-    polygon = np.vstack((left, right[::-1]))
-
-    return polygon
+    return _single_curve_region(points, False, stroke_width, tension, samples_per_segment, flatness)
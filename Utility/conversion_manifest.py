@@ -0,0 +1,154 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from zip_archive import ZipMember, as_source, source_stamp
+
+
+MANIFEST_FILENAME = "pascal_voc_manifest.json"
+MANIFEST_VERSION = 1
+IMAGE_HEADER_BYTES = 64 * 1024
+
+
+def file_sha256(path: str | Path | ZipMember, *, limit: int | None = None) -> str:
+    digest = hashlib.sha256()
+    remaining = limit
+
+    with as_source(path).open("rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+    return digest.hexdigest()
+
+
+def _stamp_unchanged(previous: dict[str, object] | None, stamp: dict[str, object], digest_key: str) -> bool:
+    return (
+        previous is not None
+        and digest_key in previous
+        and all(previous.get(key) == value for key, value in stamp.items())
+    )
+
+
+def pair_fingerprint(
+    image_path: str | Path | ZipMember,
+    annotation_xml_path: str | Path | ZipMember,
+    previous: dict[str, object] | None = None,
+) -> dict[str, object]:
+    image_path = as_source(image_path)
+    annotation_xml_path = as_source(annotation_xml_path)
+
+    # size + mtime_ns for files, size + crc32 for ZIP members.
+    xml_stamp = {f"xml_{key}": value for key, value in source_stamp(annotation_xml_path).items()}
+    image_stamp = {f"image_{key}": value for key, value in source_stamp(image_path).items()}
+
+    fingerprint: dict[str, object] = {
+        "annotation_xml": str(annotation_xml_path),
+        **xml_stamp,
+        **image_stamp,
+    }
+
+    # Hashes are only recomputed when the stamp moved, so unchanged trees cost one stat per file.
+    if _stamp_unchanged(previous, xml_stamp, "xml_sha256"):
+        fingerprint["xml_sha256"] = previous["xml_sha256"]
+    else:
+        fingerprint["xml_sha256"] = file_sha256(annotation_xml_path)
+
+    if _stamp_unchanged(previous, image_stamp, "image_header_sha256"):
+        fingerprint["image_header_sha256"] = previous["image_header_sha256"]
+    else:
+        fingerprint["image_header_sha256"] = file_sha256(image_path, limit=IMAGE_HEADER_BYTES)
+
+    return fingerprint
+
+
+class ConversionManifest:
+    def __init__(self, path: str | Path, params: dict[str, object], entries: dict[str, dict] | None = None) -> None:
+        self.path = Path(path)
+        self.params = params
+        self.entries: dict[str, dict] = entries if entries is not None else {}
+
+    @classmethod
+    def load(cls, output_dir: str | Path, params: dict[str, object]) -> ConversionManifest:
+        path = Path(output_dir) / MANIFEST_FILENAME
+
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls(path, params)
+
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return cls(path, params)
+
+        entries = data.get("entries", {})
+        if data.get("params") != params:
+            # Different conversion parameters invalidate every output, but the
+            # entries are kept so that their outputs can still be found as stale.
+            entries = {key: {"output": entry.get("output")} for key, entry in entries.items()}
+
+        return cls(path, params, entries)
+
+    def fingerprint(self, key: str, image_path: str | Path, annotation_xml_path: str | Path) -> dict[str, object]:
+        return pair_fingerprint(image_path, annotation_xml_path, self.entries.get(key))
+
+    def is_current(self, key: str, fingerprint: dict[str, object], output_path: str | Path) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry.get("output") != self._relative_output(output_path):
+            return False
+        if entry.get("xml_sha256") != fingerprint["xml_sha256"]:
+            return False
+        if entry.get("image_header_sha256") != fingerprint["image_header_sha256"]:
+            return False
+
+        try:
+            output_stat = Path(output_path).stat()
+        except OSError:
+            return False
+
+        return entry.get("output_size") == output_stat.st_size and entry.get("output_mtime_ns") == output_stat.st_mtime_ns
+
+    def record(self, key: str, fingerprint: dict[str, object], output_path: str | Path) -> None:
+        output_stat = Path(output_path).stat()
+        self.entries[key] = {
+            **fingerprint,
+            "output": self._relative_output(output_path),
+            "output_size": output_stat.st_size,
+            "output_mtime_ns": output_stat.st_mtime_ns,
+        }
+
+    def discard(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+    def stale_outputs(self, current_keys: set[str]) -> list[tuple[str, Path]]:
+        return [
+            (key, self.path.parent / entry["output"])
+            for key, entry in sorted(self.entries.items())
+            if key not in current_keys and entry.get("output")
+        ]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "params": self.params,
+            "entries": dict(sorted(self.entries.items())),
+        }
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def _relative_output(self, output_path: str | Path) -> str:
+        return Path(os.path.relpath(Path(output_path), self.path.parent)).as_posix()
@@ -0,0 +1,186 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import os
+import queue
+import threading
+from typing import Callable, Iterator, Sequence, TypeVar
+
+from conversion_stats import active_stats, call_with_stats
+
+
+Task = TypeVar("Task")
+Payload = TypeVar("Payload")
+Result = TypeVar("Result")
+
+
+@dataclass
+class PipelineOptions:
+    # Threads prefetching inputs, threads flushing outputs, and the capacity of each queue between stages.
+    read_workers: int = 2
+    write_workers: int = 2
+    queue_depth: int = 16
+
+
+# Marks an item whose earlier stage failed; it still travels down the pipeline so every stage sees every index.
+_FAILED = object()
+_DONE = object()
+
+
+def _error_text(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def resolve_jobs(jobs: int | None) -> int:
+    if jobs is None or jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def iter_task_results(fn: Callable[[Task], Result], tasks: Sequence[Task], jobs: int) -> Iterator[Result]:
+    # fn over tasks in task order, on `jobs` worker processes when there is more than one.
+    # Results are yielded as they arrive, so callers can write them out and release them in order.
+    # Stats measured in the workers are merged into the active collector.
+    if jobs == 1 or len(tasks) <= 1:
+        yield from map(fn, tasks)
+        return
+
+    stats = active_stats()
+    if stats is not None:
+        fn = partial(call_with_stats, fn)
+
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    executor = ProcessPoolExecutor(max_workers=min(jobs, len(tasks)))
+    try:
+        # map() yields in submission order, so outputs stay deterministic.
+        for result in executor.map(fn, tasks, chunksize=chunksize):
+            if stats is not None:
+                result, snapshot = result
+                stats.merge(snapshot)
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_pipeline(
+    tasks: Sequence[Task],
+    read: Callable[[Task], Payload],
+    compute: Callable[[Payload], Result],
+    write: Callable[[Task, Result], None],
+    *,
+    compute_workers: int = 1,
+    options: PipelineOptions | None = None,
+) -> list[str | None]:
+    # read -> compute -> write for every task, with the stages running concurrently.
+    # read/write run on threads (I/O releases the GIL); compute runs on one thread, or on a
+    # process pool when compute_workers > 1 (compute and its payloads must then be picklable).
+    # Bounded queues between the stages apply backpressure, so at most about queue_depth items
+    # are buffered per stage whatever the number of tasks.
+    # Returns one error message (or None) per task, in task order.
+    options = options if options is not None else PipelineOptions()
+    if options.read_workers < 1 or options.write_workers < 1 or options.queue_depth < 1:
+        raise ValueError("read_workers, write_workers and queue_depth must be >= 1")
+
+    count = len(tasks)
+    errors: list[str | None] = [None] * count
+    if count == 0:
+        return errors
+
+    indices: queue.SimpleQueue[int] = queue.SimpleQueue()
+    for i in range(count):
+        indices.put(i)
+
+    read_queue: queue.Queue = queue.Queue(maxsize=options.queue_depth)
+    write_queue: queue.Queue = queue.Queue(maxsize=options.queue_depth)
+
+    def reader() -> None:
+        while True:
+            try:
+                i = indices.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                payload = read(tasks[i])
+            except Exception as e:
+                errors[i] = _error_text(e)
+                payload = _FAILED
+            read_queue.put((i, payload))
+
+    def compute_inline() -> None:
+        for _ in range(count):
+            i, payload = read_queue.get()
+            result = _FAILED
+            if payload is not _FAILED:
+                try:
+                    result = compute(payload)
+                except Exception as e:
+                    errors[i] = _error_text(e)
+            write_queue.put((i, result))
+
+    def writer() -> None:
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                return
+            i, result = item
+            if result is _FAILED:
+                continue
+            try:
+                write(tasks[i], result)
+            except Exception as e:
+                errors[i] = _error_text(e)
+
+    executor: ProcessPoolExecutor | None = None
+    threads = [threading.Thread(target=reader, daemon=True) for _ in range(min(options.read_workers, count))]
+    threads += [threading.Thread(target=writer, daemon=True) for _ in range(options.write_workers)]
+
+    if compute_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=min(compute_workers, count))
+        # Futures in flight; sized so every compute worker can stay busy.
+        futures: queue.Queue = queue.Queue(maxsize=max(options.queue_depth, compute_workers))
+
+        def dispatcher() -> None:
+            for _ in range(count):
+                i, payload = read_queue.get()
+                future: Future | None = None
+                if payload is not _FAILED:
+                    try:
+                        future = executor.submit(compute, payload)
+                    except Exception as e:
+                        errors[i] = _error_text(e)
+                futures.put((i, future))
+
+        def collector() -> None:
+            for _ in range(count):
+                i, future = futures.get()
+                result = _FAILED
+                if future is not None:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors[i] = _error_text(e)
+                write_queue.put((i, result))
+
+        compute_threads = [threading.Thread(target=dispatcher, daemon=True), threading.Thread(target=collector, daemon=True)]
+    else:
+        compute_threads = [threading.Thread(target=compute_inline, daemon=True)]
+
+    try:
+        for thread in threads + compute_threads:
+            thread.start()
+        for thread in compute_threads:
+            thread.join()
+        for _ in range(options.write_workers):
+            write_queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return errors
@@ -0,0 +1,192 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+from pathlib import Path
+import pstats
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Mapping, TypeVar
+
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+# Collector of the current run, or None. Instrumented code checks it once per call, so
+# disabled instrumentation costs one global lookup (stage() returns a shared no-op context).
+_active: ConversionStats | None = None
+_local = threading.local()
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class ConversionStats:
+    # Per-stage wall/CPU time and named counters (entries per shape, vertices, bytes read/written, ...).
+    # Stage times are exclusive: time spent in a nested stage, e.g. XML parsing pulled lazily while
+    # the VOC text is serialized, is charged to the nested stage only. Times are summed over calls
+    # and threads; CPU time is per thread. Thread-safe.
+
+    def __init__(self) -> None:
+        self.stages: dict[str, list[float]] = {}
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def add_time(self, name: str, wall: float, cpu: float, calls: int = 1) -> None:
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [calls, wall, cpu]
+            else:
+                entry[0] += calls
+                entry[1] += wall
+                entry[2] += cpu
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, data: Mapping[str, object]) -> None:
+        # Adds a to_dict() snapshot, e.g. one returned by a worker process.
+        for name, stage in data.get("stages", {}).items():
+            self.add_time(name, stage["wall_seconds"], stage["cpu_seconds"], stage["calls"])
+        for name, n in data.get("counters", {}).items():
+            self.count(name, n)
+
+    def to_dict(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "elapsed_seconds": time.perf_counter() - self._started,
+                "stages": {
+                    name: {"calls": int(calls), "wall_seconds": wall, "cpu_seconds": cpu}
+                    for name, (calls, wall, cpu) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.to_dict(), indent=1), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class _Stage:
+    __slots__ = ("stats", "name", "calls", "wall", "cpu", "child_wall", "child_cpu")
+
+    def __init__(self, stats: ConversionStats, name: str, calls: int = 1) -> None:
+        self.stats = stats
+        self.name = name
+        self.calls = calls
+
+    def __enter__(self) -> None:
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.child_wall = self.child_cpu = 0.0
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+            stack[-1].child_cpu += cpu
+
+        self.stats.add_time(self.name, wall - self.child_wall, cpu - self.child_cpu, self.calls)
+
+
+def active_stats() -> ConversionStats | None:
+    return _active
+
+
+@contextlib.contextmanager
+def collecting(stats: ConversionStats | None) -> Iterator[ConversionStats | None]:
+    # Routes stage()/count()/timed_iter() in this process to `stats` (None disables them).
+    global _active
+    previous = _active
+    _active = stats
+    try:
+        yield stats
+    finally:
+        _active = previous
+
+
+def stage(name: str) -> contextlib.AbstractContextManager:
+    stats = _active
+    return _NULL_STAGE if stats is None else _Stage(stats, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    stats = _active
+    if stats is not None:
+        stats.count(name, n)
+
+
+def _timed_iter(stats: ConversionStats, name: str, iterator: Iterator[Item]) -> Iterator[Item]:
+    calls = 1
+    while True:
+        with _Stage(stats, name, calls):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        calls = 0
+        yield item
+
+
+def timed_iter(name: str, iterable: Iterable[Item]) -> Iterable[Item]:
+    # Charges the time spent producing each item (not consuming it) to `name`.
+    stats = _active
+    return iterable if stats is None else _timed_iter(stats, name, iter(iterable))
+
+
+def call_with_stats(fn: Callable[[Item], Result], arg: Item) -> tuple[Result, dict[str, object]]:
+    # For process pools (wrap with functools.partial): fn(arg) measured into a fresh collector,
+    # returned as a snapshot for the parent to merge().
+    stats = ConversionStats()
+    with collecting(stats):
+        result = fn(arg)
+    return result, stats.to_dict()
+
+
+def measured_in_workers(
+    compute: Callable[[Item], Result],
+    write: Callable[[object, Result], None],
+) -> tuple[Callable[[Item], tuple[Result, dict[str, object]]], Callable[[object, tuple[Result, dict[str, object]]], None]]:
+    # compute/write for run_pipeline with a process pool: compute is measured in the worker and its
+    # snapshot is merged into the active collector before the result is written.
+    stats = _active
+    if stats is None:
+        return compute, write
+
+    def write_merged(task: object, result: tuple[Result, dict[str, object]]) -> None:
+        value, snapshot = result
+        stats.merge(snapshot)
+        write(task, value)
+
+    return functools.partial(call_with_stats, compute), write_merged
+
+
+def profile_call(output_path: str | Path, fn: Callable[..., Result], *args, **kwargs) -> Result:
+    # Runs one call under cProfile and dumps the profile to output_path (readable with pstats/snakeviz).
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        profiler.dump_stats(str(output_path))
+
+
+def print_profile(path: str | Path, limit: int = 20) -> None:
+    pstats.Stats(str(path)).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
@@ -0,0 +1,303 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Mapping, Sequence
+
+import numpy as np
+
+from conversion_pipeline import iter_task_results, resolve_jobs
+from convert_to_pascal_voc_kernel import DirectoryConversionReport
+from image_size_cache import with_cached_image_sizes
+from zip_archive import relative_source_path
+from load_annotation import discover_image_annotation_pairs, load_image_annotation_context
+from polygon_simplify import simplify_polygon
+from polygon_to_coco import (
+    COCO_SEGMENTATIONS,
+    coco_bbox,
+    coco_polygon,
+    polygon_areas,
+    polygon_to_rle,
+)
+
+
+__all__ = [
+    "image_xml_pair_to_coco_annotations",
+    "convert_directory_to_coco",
+    "main",
+]
+
+
+def _json(obj: object) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def image_xml_pair_to_coco_annotations(
+    image_path: str | Path,
+    annotation_xml_path: str | Path,
+    *,
+    segmentation: str = "polygon",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
+) -> tuple[int, int, list[tuple[str, str]]]:
+    # Returns (width, height, [(class_name, annotation_json_body)]).
+    # The body holds every field except the ids, which are only known to the writer.
+    if segmentation not in COCO_SEGMENTATIONS:
+        raise ValueError(f"Unsupported segmentation: {segmentation}")
+
+    context = load_image_annotation_context(
+        image_path,
+        annotation_xml_path,
+        polygon_options=polygon_options,
+        image_size=image_size,
+        exif_orientation=exif_orientation,
+    )
+    width = int(context["width"])
+    height = int(context["height"])
+    class_polygons = context["class_polygons"]
+
+    polygons = [np.asarray(polygon, dtype=float).reshape(-1, 2) for _, polygon in class_polygons]
+    if simplify_tolerance is not None:
+        polygons = [simplify_polygon(polygon, simplify_tolerance) for polygon in polygons]
+
+    if segmentation == "polygon":
+        # The area is that of the clipped vertices actually written, in one vectorized shoelace pass.
+        flat = [
+            coco_polygon(polygon, image_width=width, image_height=height) if polygon.shape[0] else []
+            for polygon in polygons
+        ]
+        offsets = np.zeros(len(flat) + 1, dtype=np.int64)
+        np.cumsum([len(segm) // 2 for segm in flat], out=offsets[1:])
+        coords = np.fromiter((v for segm in flat for v in segm), dtype=float, count=int(offsets[-1]) * 2)
+        areas = polygon_areas(coords.reshape(-1, 2), offsets).tolist()
+
+    annotations: list[tuple[str, str]] = []
+    for k, ((class_name, _), polygon) in enumerate(zip(class_polygons, polygons)):
+        if polygon.shape[0] == 0:
+            continue
+
+        if segmentation == "polygon":
+            segm = [flat[k]]
+            area = round(areas[k], 2)
+        else:
+            segm, area = polygon_to_rle(polygon, width, height)
+
+        bbox = coco_bbox(polygon, image_width=width, image_height=height)
+        body = f'"segmentation":{_json(segm)},"area":{_json(area)},"bbox":{_json(bbox)},"iscrowd":0'
+        annotations.append((class_name, body))
+
+    return width, height, annotations
+
+
+def _coco_pair_task(
+    task: tuple[Path, Path, dict[str, object]],
+) -> tuple[tuple[int, int, list[tuple[str, str]]] | None, str | None]:
+    image_path, annotation_xml, convert_kwargs = task
+    try:
+        return image_xml_pair_to_coco_annotations(image_path, annotation_xml, **convert_kwargs), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def convert_directory_to_coco(
+    input_dir: str | Path,
+    output_json: str | Path,
+    *,
+    segmentation: str = "polygon",
+    class_names: Sequence[str] | None = None,
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    jobs: int = 1,
+    image_cache: str | Path | None = None,
+    scan_threads: int = 1,
+    annotation_archive: str | Path | None = None,
+    exif_orientation: bool = False,
+    report: DirectoryConversionReport | None = None,
+) -> tuple[list[Path], list[Path]]:
+    # Writes one COCO JSON for every image/annotation pair under input_dir.
+    # "images" is streamed straight into the output and "annotations" into a spool file
+    # next to it, so memory use does not grow with the dataset.
+    # Category ids follow class_names, then classes in order of first appearance.
+    if segmentation not in COCO_SEGMENTATIONS:
+        raise ValueError(f"Unsupported segmentation: {segmentation}")
+
+    input_dir = Path(input_dir)
+    output_json = Path(output_json)
+    output_json.parent.mkdir(parents=True, exist_ok=True)
+    jobs = resolve_jobs(jobs)
+
+    pairs, missing_annotations = discover_image_annotation_pairs(
+        input_dir,
+        threads=scan_threads,
+        annotation_archive=annotation_archive,
+    )
+
+    convert_kwargs: dict[str, object] = {
+        "segmentation": segmentation,
+        "polygon_options": dict(polygon_options) if polygon_options is not None else None,
+        "simplify_tolerance": simplify_tolerance,
+        "exif_orientation": exif_orientation,
+    }
+    tasks = [(image_path, annotation_xml, convert_kwargs) for image_path, annotation_xml in pairs]
+
+    if image_cache is not None:
+        tasks = with_cached_image_sizes(tasks, image_cache, threads=jobs, exif_orientation=exif_orientation)
+
+    category_ids: dict[str, int] = {name: i for i, name in enumerate(dict.fromkeys(class_names or ()), start=1)}
+
+    written: list[Path] = []
+    failed: list[tuple[Path, str]] = []
+    annotation_id = 0
+
+    tmp_path = output_json.with_name(output_json.name + ".tmp")
+    try:
+        with tmp_path.open("w", encoding="utf-8", newline="\n", buffering=1 << 16) as f, tempfile.TemporaryFile(
+            "w+", encoding="utf-8", newline="\n", dir=output_json.parent
+        ) as spool:
+            f.write('{"info":{"description":"PetaPetaAnnotator export"},\n"images":[')
+
+            for (image_path, _), (result, error) in zip(pairs, iter_task_results(_coco_pair_task, tasks, jobs)):
+                if error is not None:
+                    failed.append((image_path, error))
+                    continue
+
+                width, height, annotations = result
+                image_id = len(written) + 1
+                image = {
+                    "id": image_id,
+                    "file_name": relative_source_path(image_path, input_dir).as_posix(),
+                    "width": width,
+                    "height": height,
+                }
+                f.write(("\n" if image_id == 1 else ",\n") + _json(image))
+                written.append(image_path)
+
+                for class_name, body in annotations:
+                    category_id = category_ids.setdefault(class_name, len(category_ids) + 1)
+                    annotation_id += 1
+                    spool.write(
+                        ("\n" if annotation_id == 1 else ",\n")
+                        + f'{{"id":{annotation_id},"image_id":{image_id},"category_id":{category_id},{body}}}'
+                    )
+
+            f.write('\n],\n"annotations":[')
+            spool.seek(0)
+            shutil.copyfileobj(spool, f, 1 << 20)
+            f.write('\n],\n"categories":[')
+            f.write(",".join(f"\n{_json({'id': i, 'name': name})}" for name, i in category_ids.items()))
+            f.write("\n]}\n")
+
+        os.replace(tmp_path, output_json)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if report is not None:
+        report.written.extend(written)
+        report.missing.extend(missing_annotations)
+        report.failed.extend(failed)
+    elif failed:
+        details = "\n".join(f"  {p}: {message}" for p, message in failed)
+        raise RuntimeError(f"failed to convert {len(failed)} image files:\n{details}")
+
+    return written, missing_annotations
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Export image/annotation XML pairs into a single COCO JSON file.",
+    )
+
+    parser.add_argument(
+        "--input-dir",
+        required=True,
+        help="Root directory (or .zip archive) to scan for images (png/jpg/webp/bmp/gif/tif) and *_annotations.xml pairs",
+    )
+    parser.add_argument("--output", required=True, help="Output COCO JSON path")
+    parser.add_argument(
+        "--segmentation",
+        choices=COCO_SEGMENTATIONS,
+        default="polygon",
+        help="polygon: flat vertex lists with shoelace area, rle: compressed RLE with pixel area",
+    )
+    parser.add_argument(
+        "--classes",
+        help="Comma-separated class names for category ids 1..N (other classes follow in order of appearance)",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes (default: 1, 0 = all CPUs)")
+    parser.add_argument("--image-cache", help="SQLite file caching image sizes between runs")
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=1,
+        help="Threads listing directories during discovery; helps on network storage (default: 1)",
+    )
+    parser.add_argument(
+        "--annotation-archive",
+        help="ZIP of *_annotations.xml files, read in place instead of annotations next to the images",
+    )
+    parser.add_argument(
+        "--exif-orientation",
+        action="store_true",
+        help="Use the displayed size of JPEG/TIFF/WebP images, i.e. width and height swapped for EXIF orientations 5-8",
+    )
+    parser.add_argument("--bezier-flatness", type=float, help="Curve flattening tolerance in pixels")
+    parser.add_argument("--arc-tolerance", type=float, help="Circle/Ellipse chord error in pixels")
+    parser.add_argument("--simplify-tolerance", type=float, help="Douglas-Peucker tolerance in pixels for polygons")
+
+    return parser
+
+
+def main() -> None:
+    args = _build_arg_parser().parse_args()
+
+    polygon_options: dict[str, object] = {}
+    if args.bezier_flatness is not None:
+        polygon_options["bezier_flatness"] = args.bezier_flatness
+    if args.arc_tolerance is not None:
+        polygon_options["arc_tolerance"] = args.arc_tolerance
+
+    class_names = [name.strip() for name in args.classes.split(",")] if args.classes else None
+
+    report = DirectoryConversionReport()
+    written, missing = convert_directory_to_coco(
+        args.input_dir,
+        args.output,
+        segmentation=args.segmentation,
+        class_names=class_names,
+        polygon_options=polygon_options,
+        simplify_tolerance=args.simplify_tolerance,
+        jobs=args.jobs,
+        image_cache=args.image_cache,
+        scan_threads=args.scan_threads,
+        annotation_archive=args.annotation_archive,
+        exif_orientation=args.exif_orientation,
+        report=report,
+    )
+
+    print(f"exported: {len(written)} images -> {args.output}")
+
+    if missing:
+        print(f"missing annotation xml for {len(missing)} image files:")
+        for p in missing:
+            print(f"  {p}")
+
+    if report.failed:
+        print(f"failed to convert {len(report.failed)} image files:")
+        for p, message in report.failed:
+            print(f"  {p}: {message}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Mapping, Sequence
+
+from conversion_pipeline import iter_task_results, resolve_jobs
+from convert_to_pascal_voc_kernel import DirectoryConversionReport
+from image_size_cache import with_cached_image_sizes
+from zip_archive import is_zip_archive, relative_source_path
+from load_annotation import discover_image_annotation_pairs, load_image_annotation_context
+from polygon_to_mask import BAND_HEIGHT, MASK_MODES, mask_class_ids, save_mask_png
+from xml_to_polygon import xml_to_class_names
+
+
+MASK_CLASSES_FILENAME = "mask_classes.txt"
+
+
+__all__ = [
+    "convert_image_xml_pair_to_mask",
+    "convert_directory_to_masks",
+    "main",
+]
+
+
+def convert_image_xml_pair_to_mask(
+    image_path: str | Path,
+    annotation_xml_path: str | Path,
+    output_png_path: str | Path,
+    *,
+    mode: str = "merged",
+    class_ids: Mapping[str, int] | None = None,
+    polygon_options: Mapping[str, object] | None = None,
+    band_height: int = BAND_HEIGHT,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
+) -> list[Path]:
+    context = load_image_annotation_context(
+        image_path,
+        annotation_xml_path,
+        polygon_options=polygon_options,
+        image_size=image_size,
+        exif_orientation=exif_orientation,
+    )
+
+    return save_mask_png(
+        context["class_polygons"],
+        output_png_path,
+        int(context["width"]),
+        int(context["height"]),
+        mode=mode,
+        class_ids=class_ids,
+        band_height=band_height,
+    )
+
+
+def _convert_mask_task(task: tuple[Path, Path, Path, dict[str, object]]) -> tuple[list[Path], str | None]:
+    image_path, annotation_xml, output_png, convert_kwargs = task
+    try:
+        return convert_image_xml_pair_to_mask(image_path, annotation_xml, output_png, **convert_kwargs), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def _class_names_task(annotation_xml: Path) -> tuple[list[str], str | None]:
+    try:
+        return xml_to_class_names(annotation_xml), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def convert_directory_to_masks(
+    input_dir: str | Path,
+    output_dir: str | Path | None = None,
+    *,
+    mode: str = "merged",
+    class_names: Sequence[str] | None = None,
+    polygon_options: Mapping[str, object] | None = None,
+    band_height: int = BAND_HEIGHT,
+    jobs: int = 1,
+    image_cache: str | Path | None = None,
+    scan_threads: int = 1,
+    annotation_archive: str | Path | None = None,
+    exif_orientation: bool = False,
+    report: DirectoryConversionReport | None = None,
+) -> tuple[list[Path], list[Path]]:
+    if mode not in MASK_MODES:
+        raise ValueError(f"Unsupported mask mode: {mode}")
+
+    if output_dir is None and is_zip_archive(input_dir):
+        raise ValueError("output_dir is required when input_dir is a ZIP archive")
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir) if output_dir is not None else input_dir
+    jobs = resolve_jobs(jobs)
+
+    pairs, missing_annotations = discover_image_annotation_pairs(
+        input_dir,
+        threads=scan_threads,
+        annotation_archive=annotation_archive,
+    )
+
+    failed: list[tuple[Path, str]] = []
+
+    class_ids: dict[str, int] | None = None
+    if mode == "merged":
+        # Labels must mean the same class in every file, so they are fixed up front. Files that
+        # cannot be read here are reported as failed and not converted.
+        if class_names is None:
+            names: set[str] = set()
+            readable = []
+            annotation_xmls = [annotation_xml for _, annotation_xml in pairs]
+            for pair, (pair_names, error) in zip(pairs, iter_task_results(_class_names_task, annotation_xmls, jobs)):
+                if error is None:
+                    names.update(pair_names)
+                    readable.append(pair)
+                else:
+                    failed.append((pair[0], error))
+            pairs = readable
+            class_names = sorted(names)
+        class_ids = mask_class_ids(class_names)
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        lines = ["0\t_background_"] + [f"{label}\t{name}" for name, label in class_ids.items()]
+        (output_dir / MASK_CLASSES_FILENAME).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    convert_kwargs: dict[str, object] = {
+        "mode": mode,
+        "class_ids": class_ids,
+        "polygon_options": dict(polygon_options) if polygon_options is not None else None,
+        "band_height": band_height,
+        "exif_orientation": exif_orientation,
+    }
+
+    tasks: list[tuple[Path, Path, Path, dict[str, object]]] = []
+    for image_path, annotation_xml in pairs:
+        rel_parent = relative_source_path(image_path, input_dir).parent
+        output_png = output_dir / rel_parent / f"{image_path.stem}_mask.png"
+        tasks.append((image_path, annotation_xml, output_png, convert_kwargs))
+
+    if image_cache is not None:
+        tasks = with_cached_image_sizes(tasks, image_cache, threads=jobs, exif_orientation=exif_orientation)
+
+    written: list[Path] = []
+
+    for task, (paths, error) in zip(tasks, iter_task_results(_convert_mask_task, tasks, jobs)):
+        if error is None:
+            written.extend(paths)
+        else:
+            failed.append((task[0], error))
+
+    if report is not None:
+        report.written.extend(written)
+        report.missing.extend(missing_annotations)
+        report.failed.extend(failed)
+    elif failed:
+        details = "\n".join(f"  {p}: {message}" for p, message in failed)
+        raise RuntimeError(f"failed to convert {len(failed)} image files:\n{details}")
+
+    return written, missing_annotations
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Rasterize annotation XML into PNG segmentation masks.",
+    )
+
+    parser.add_argument(
+        "--input-dir",
+        required=True,
+        help="Root directory (or .zip archive) to scan for images (png/jpg/webp/bmp/gif/tif) and *_annotations.xml pairs",
+    )
+    parser.add_argument("--output-dir", help="Output directory for mask PNG files (default: input-dir)")
+    parser.add_argument(
+        "--mode",
+        choices=MASK_MODES,
+        default="merged",
+        help="merged: class labels in one PNG, per_class: one 0/255 PNG per class, instance: object IDs",
+    )
+    parser.add_argument(
+        "--classes",
+        help="Comma-separated class names for merged labels 1..N (default: all classes found, sorted)",
+    )
+    parser.add_argument(
+        "--band-height",
+        type=int,
+        default=BAND_HEIGHT,
+        help=f"Rows rasterized at a time (default: {BAND_HEIGHT})",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes (default: 1, 0 = all CPUs)")
+    parser.add_argument("--image-cache", help="SQLite file caching image sizes between runs")
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=1,
+        help="Threads listing directories during discovery; helps on network storage (default: 1)",
+    )
+    parser.add_argument(
+        "--annotation-archive",
+        help="ZIP of *_annotations.xml files, read in place instead of annotations next to the images",
+    )
+    parser.add_argument(
+        "--exif-orientation",
+        action="store_true",
+        help="Use the displayed size of JPEG/TIFF/WebP images, i.e. width and height swapped for EXIF orientations 5-8",
+    )
+    parser.add_argument("--bezier-flatness", type=float, help="Curve flattening tolerance in pixels")
+    parser.add_argument("--arc-tolerance", type=float, help="Circle/Ellipse chord error in pixels")
+
+    return parser
+
+
+def main() -> None:
+    args = _build_arg_parser().parse_args()
+
+    polygon_options: dict[str, object] = {}
+    if args.bezier_flatness is not None:
+        polygon_options["bezier_flatness"] = args.bezier_flatness
+    if args.arc_tolerance is not None:
+        polygon_options["arc_tolerance"] = args.arc_tolerance
+
+    class_names = [name.strip() for name in args.classes.split(",")] if args.classes else None
+
+    report = DirectoryConversionReport()
+    written, missing = convert_directory_to_masks(
+        args.input_dir,
+        output_dir=args.output_dir,
+        mode=args.mode,
+        class_names=class_names,
+        polygon_options=polygon_options,
+        band_height=args.band_height,
+        jobs=args.jobs,
+        image_cache=args.image_cache,
+        scan_threads=args.scan_threads,
+        annotation_archive=args.annotation_archive,
+        exif_orientation=args.exif_orientation,
+        report=report,
+    )
+
+    print(f"converted: {len(written)}")
+    for p in written:
+        print(f"  {p}")
+
+    if missing:
+        print(f"missing annotation xml for {len(missing)} image files:")
+        for p in missing:
+            print(f"  {p}")
+
+    if report.failed:
+        print(f"failed to convert {len(report.failed)} image files:")
+        for p, message in report.failed:
+            print(f"  {p}: {message}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
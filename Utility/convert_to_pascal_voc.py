@@ -5,18 +5,27 @@
 from __future__ import annotations
 
 import argparse
+from pathlib import Path
 
-from polygon_to_bbox_util import polygon_to_bbox, polygon_to_voc_polygon
+from polygon_to_bbox_util import polygon_to_bbox, polygon_to_voc_polygon, polygons_to_bboxes, polygons_to_voc_polygons
 from convert_to_pascal_voc_kernel import (
+    DirectoryConversionReport,
     class_polygons_to_pascal_voc_tree,
     convert_directory_to_pascal_voc,
     convert_image_xml_pair_to_pascal_voc,
+    convert_image_xml_pair_to_pascal_voc_tiles,
     convert_png_xml_pair_to_pascal_voc,
+    profile_image_xml_pair_conversion,
     save_pascal_voc,
+    write_pascal_voc,
     xml_annotations_to_pascal_voc,
 )
+from conversion_pipeline import PipelineOptions
+from conversion_stats import ConversionStats, collecting, print_profile
+from polygon_tiling import TileOptions, tile_size
+from shard_archive import SHARD_FORMATS, ShardOptions
 from get_image_size import read_image_size, read_jpeg_size, read_png_size
-from load_annotation import discover_image_annotation_pairs, discover_png_annotation_pairs
+from load_annotation import ANNOTATION_SUFFIX, discover_image_annotation_pairs, discover_png_annotation_pairs
 
 
 __all__ = [
@@ -25,14 +34,21 @@ __all__ = [
     "read_image_size",
     "polygon_to_bbox",
     "polygon_to_voc_polygon",
+    "polygons_to_bboxes",
+    "polygons_to_voc_polygons",
     "class_polygons_to_pascal_voc_tree",
     "save_pascal_voc",
+    "write_pascal_voc",
     "xml_annotations_to_pascal_voc",
     "convert_image_xml_pair_to_pascal_voc",
+    "convert_image_xml_pair_to_pascal_voc_tiles",
     "discover_image_annotation_pairs",
     "convert_png_xml_pair_to_pascal_voc",
     "discover_png_annotation_pairs",
     "convert_directory_to_pascal_voc",
+    "DirectoryConversionReport",
+    "TileOptions",
+    "profile_image_xml_pair_conversion",
     "main",
 ]
 
@@ -44,9 +60,92 @@ def _build_arg_parser() -> argparse.ArgumentParser:
 
     parser.add_argument(
         "--input-dir",
-        help="Root directory to scan for *.png/*.jpg/*.jpeg and *_annotations.xml pairs",
+        help="Root directory (or .zip archive) to scan for images (png/jpg/webp/bmp/gif/tif) and *_annotations.xml pairs",
     )
     parser.add_argument("--output-dir", help="Output directory for Pascal VOC XML files (default: input-dir)")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for batch mode (default: 1, 0 = all CPUs)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip pairs whose inputs and output are unchanged since the last run (batch mode)",
+    )
+    parser.add_argument(
+        "--prune-stale",
+        action="store_true",
+        help="With --incremental, delete outputs whose image/annotation pair has disappeared",
+    )
+    parser.add_argument(
+        "--image-cache",
+        help="SQLite file caching image width/height/depth between runs (batch mode)",
+    )
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=1,
+        help="Threads listing directories during discovery; helps on network storage (default: 1)",
+    )
+    parser.add_argument(
+        "--annotation-archive",
+        help="ZIP of *_annotations.xml files, read in place instead of annotations next to the images",
+    )
+    parser.add_argument(
+        "--exif-orientation",
+        action="store_true",
+        help="Use the displayed size of JPEG/TIFF/WebP images, i.e. width and height swapped for EXIF orientations 5-8",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap reading, geometry (--jobs processes) and writing through bounded queues (batch mode)",
+    )
+    parser.add_argument("--read-workers", type=int, default=2, help="Reader threads with --pipeline (default: 2)")
+    parser.add_argument("--write-workers", type=int, default=2, help="Writer threads with --pipeline (default: 2)")
+    parser.add_argument(
+        "--queue-depth",
+        type=int,
+        default=16,
+        help="Items buffered between pipeline stages (default: 16)",
+    )
+    parser.add_argument(
+        "--shard-format",
+        choices=SHARD_FORMATS,
+        help="Append VOC XML to tar/zip shards with a per-shard index instead of one file per image (batch mode)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=float,
+        default=256,
+        help="Approximate shard size in MiB with --shard-format (default: 256)",
+    )
+    parser.add_argument(
+        "--tile-size",
+        help="Write one VOC file per tile of this size, WIDTH or WIDTHxHEIGHT pixels, with clipped polygons (batch mode)",
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        type=int,
+        default=0,
+        help="Minimum pixels shared by neighbouring tiles with --tile-size (default: 0)",
+    )
+    parser.add_argument(
+        "--tile-keep-empty",
+        action="store_true",
+        help="With --tile-size, also write tiles that contain no object",
+    )
+    parser.add_argument(
+        "--stats",
+        help="Write per-stage wall/CPU time and counters (entries per shape, vertices, bytes) to this JSON file",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Convert only this image (with its *_annotations.xml) under cProfile and print the hottest calls",
+    )
+    parser.add_argument("--profile-output", help="cProfile output file for --profile (default: <image_stem>.prof)")
 
     parser.add_argument("--input-xml", help="Input annotation XML path (single mode)")
     parser.add_argument("--output-xml", help="Output Pascal VOC XML path (single mode)")
@@ -58,30 +157,154 @@ def _build_arg_parser() -> argparse.ArgumentParser:
     parser.add_argument("--folder", default="", help="VOC <folder> (single mode)")
     parser.add_argument("--image-path", default="", help="VOC <path> (single mode)")
     parser.add_argument("--database", default="Unknown", help="VOC <source>/<database>")
+    parser.add_argument(
+        "--bezier-flatness",
+        type=float,
+        help="Flatten Curve/ClosedCurve to this max deviation in pixels (default: fixed samples per segment)",
+    )
+    parser.add_argument(
+        "--arc-tolerance",
+        type=float,
+        help="Pick Circle/Ellipse vertex counts for this max chord error in pixels (default: 64 vertices)",
+    )
+    parser.add_argument(
+        "--simplify-tolerance",
+        type=float,
+        help="Simplify VOC polygons (Douglas-Peucker) to this many pixels after rounding; 0 = drop duplicates only",
+    )
 
     return parser
 
 
+def _polygon_options(args: argparse.Namespace) -> dict[str, object]:
+    options: dict[str, object] = {}
+    if args.bezier_flatness is not None:
+        options["bezier_flatness"] = args.bezier_flatness
+    if args.arc_tolerance is not None:
+        options["arc_tolerance"] = args.arc_tolerance
+    return options
+
+
+def _pipeline_options(args: argparse.Namespace) -> PipelineOptions | None:
+    if not args.pipeline:
+        return None
+    return PipelineOptions(
+        read_workers=args.read_workers,
+        write_workers=args.write_workers,
+        queue_depth=args.queue_depth,
+    )
+
+
+def _shard_options(args: argparse.Namespace) -> ShardOptions | None:
+    if args.shard_format is None:
+        return None
+    return ShardOptions(format=args.shard_format, max_bytes=max(1, int(args.shard_size * (1 << 20))))
+
+
+def _tile_options(args: argparse.Namespace) -> TileOptions | None:
+    if args.tile_size is None:
+        return None
+    try:
+        size = [int(v) for v in args.tile_size.lower().split("x")]
+    except ValueError:
+        size = []
+    if len(size) not in (1, 2):
+        raise SystemExit("--tile-size must be WIDTH or WIDTHxHEIGHT")
+    options = TileOptions(width=size[0], height=size[-1], overlap=args.tile_overlap, keep_empty=args.tile_keep_empty)
+    try:
+        tile_size(options)
+    except ValueError as e:
+        raise SystemExit(f"--tile-size/--tile-overlap: {e}")
+    return options
+
+
 def main() -> None:
     args = _build_arg_parser().parse_args()
+    polygon_options = _polygon_options(args)
+
+    if args.profile:
+        image_path = Path(args.profile)
+        profile_output = args.profile_output or f"{image_path.stem}.prof"
+        profile_image_xml_pair_conversion(
+            image_path,
+            image_path.with_name(image_path.stem + ANNOTATION_SUFFIX),
+            profile_output,
+            depth=args.depth,
+            database=args.database,
+            polygon_options=polygon_options,
+            simplify_tolerance=args.simplify_tolerance,
+            exif_orientation=args.exif_orientation,
+        )
+        print_profile(profile_output)
+        print(f"profile: {profile_output}")
+        return
+
+    stats = ConversionStats() if args.stats else None
+    try:
+        with collecting(stats):
+            _run(args, polygon_options)
+    finally:
+        if stats is not None:
+            stats.save(args.stats)
+
 
+def _run(args: argparse.Namespace, polygon_options: dict[str, object]) -> None:
     if args.input_dir:
+        if args.shard_format is not None and args.incremental:
+            raise SystemExit("--incremental cannot be combined with --shard-format")
+        if args.tile_size is not None and (args.incremental or args.pipeline or args.shard_format is not None):
+            raise SystemExit("--tile-size cannot be combined with --incremental, --pipeline or --shard-format")
+
+        report = DirectoryConversionReport()
         written, missing = convert_directory_to_pascal_voc(
             args.input_dir,
             output_dir=args.output_dir,
             depth=args.depth,
             database=args.database,
+            polygon_options=polygon_options,
+            simplify_tolerance=args.simplify_tolerance,
+            jobs=args.jobs,
+            incremental=args.incremental,
+            prune_stale=args.prune_stale,
+            image_cache=args.image_cache,
+            scan_threads=args.scan_threads,
+            annotation_archive=args.annotation_archive,
+            exif_orientation=args.exif_orientation,
+            pipeline=_pipeline_options(args),
+            shards=_shard_options(args),
+            tiles=_tile_options(args),
+            report=report,
         )
 
         print(f"converted: {len(written)}")
         for p in written:
             print(f"  {p}")
 
+        if report.shards:
+            print(f"shards: {len(report.shards)}")
+            for p in report.shards:
+                print(f"  {p}")
+
+        if report.skipped:
+            print(f"skipped (unchanged): {len(report.skipped)}")
+
+        if report.stale:
+            label = "removed stale outputs" if args.prune_stale else "stale outputs (source pair removed)"
+            print(f"{label}: {len(report.stale)}")
+            for p in report.stale:
+                print(f"  {p}")
+
         if missing:
             print(f"missing annotation xml for {len(missing)} image files:")
             for p in missing:
                 print(f"  {p}")
 
+        if report.failed:
+            print(f"failed to convert {len(report.failed)} image files:")
+            for p, message in report.failed:
+                print(f"  {p}: {message}")
+            raise SystemExit(1)
+
         return
 
     required = [args.input_xml, args.output_xml, args.filename, args.width, args.height]
@@ -101,6 +324,8 @@ def main() -> None:
         folder=args.folder,
         image_path=args.image_path,
         database=args.database,
+        polygon_options=polygon_options,
+        simplify_tolerance=args.simplify_tolerance,
     )
 
 
@@ -3,21 +3,93 @@
 
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Iterable, Sequence
+from dataclasses import dataclass, field
+from functools import partial
+import io
+from itertools import islice, repeat
+import os
+from pathlib import Path, PurePosixPath
+import tempfile
+from typing import Callable, Iterable, Iterator, Mapping, Sequence
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
+from xml.sax.saxutils import escape
 
 import numpy as np
 
-from polygon_to_bbox_util import polygon_to_bbox, polygon_to_voc_polygon
+from conversion_manifest import ConversionManifest
+from conversion_pipeline import PipelineOptions, iter_task_results, resolve_jobs, run_pipeline
+from conversion_stats import active_stats, measured_in_workers, profile_call, stage, timed_iter
+from image_size_cache import with_cached_image_sizes
+from shard_archive import ShardOptions, ShardWriter
+from zip_archive import as_source, is_zip_archive, relative_source_path
+from polygon_simplify import simplify_polygon
+from polygon_batch import PolygonBatch
+from polygon_tiling import TileOptions, iter_polygon_tiles, tile_size
+from polygon_to_bbox_util import pack_polygons, polygons_to_bboxes, polygons_to_voc_polygons
 from load_annotation import (
     discover_image_annotation_pairs,
-    load_class_polygons_from_xml,
+    iter_class_polygons_from_xml,
     load_image_annotation_context,
+    load_image_context,
 )
 
 
+# minidom escapes double quotes in text nodes as well.
+_VOC_TEXT_ENTITIES = {'"': "&quot;"}
+_VOC_OBJECT_CHUNK = 1024
+
+
+@dataclass
+class DirectoryConversionReport:
+    written: list[Path] = field(default_factory=list)
+    missing: list[Path] = field(default_factory=list)
+    failed: list[tuple[Path, str]] = field(default_factory=list)
+    skipped: list[Path] = field(default_factory=list)
+    stale: list[Path] = field(default_factory=list)
+    shards: list[Path] = field(default_factory=list)
+
+
+def _voc_objects(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    width: int,
+    height: int,
+    simplify_tolerance: float | None,
+) -> Iterator[tuple[str, tuple[int, int, int, int], np.ndarray]]:
+    # Bboxes and integer polygons are computed for _VOC_OBJECT_CHUNK polygons at a time (a whole
+    # PolygonBatch at once), which keeps streamed input streaming.
+    if isinstance(class_polygons, PolygonBatch):
+        batch = class_polygons
+        chunks = iter([(batch.class_names, batch.class_ids.tolist(), batch.coords, batch.offsets)])
+    else:
+        chunks = _voc_object_chunks(iter(class_polygons))
+
+    for class_names, class_ids, coords, offsets in chunks:
+        with stage("bbox"):
+            bboxes = polygons_to_bboxes(coords, offsets, image_width=width, image_height=height).tolist()
+            voc_coords = polygons_to_voc_polygons(coords, offsets, image_width=width, image_height=height)
+        bounds = offsets.tolist()
+
+        for k, (class_id, bbox) in enumerate(zip(class_ids, bboxes)):
+            voc_poly = voc_coords[bounds[k] : bounds[k + 1]]
+            if simplify_tolerance is not None:
+                # Drop duplicate and near-collinear integer vertices; the bbox still comes from the full polygon.
+                voc_poly = simplify_polygon(voc_poly, simplify_tolerance)
+
+            yield class_names[class_id], tuple(bbox), voc_poly
+
+
+def _voc_object_chunks(
+    class_polygons: Iterator[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+) -> Iterator[tuple[list[str], range, np.ndarray, np.ndarray]]:
+    while True:
+        chunk = list(islice(class_polygons, _VOC_OBJECT_CHUNK))
+        if not chunk:
+            return
+        coords, offsets = pack_polygons(polygon for _, polygon in chunk)
+        yield [class_name for class_name, _ in chunk], range(len(chunk)), coords, offsets
+
+
 def class_polygons_to_pascal_voc_tree(
     class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
     *,
@@ -28,7 +100,10 @@ def class_polygons_to_pascal_voc_tree(
     folder: str = "",
     image_path: str = "",
     database: str = "Unknown",
+    simplify_tolerance: float | None = None,
+    truncated: Iterable[bool] | None = None,
 ) -> ET.ElementTree:
+    # truncated: per-object VOC truncated flags in object order (default all 0).
     root = ET.Element("annotation")
 
     ET.SubElement(root, "folder").text = folder
@@ -45,22 +120,13 @@ def class_polygons_to_pascal_voc_tree(
 
     ET.SubElement(root, "segmented").text = "1"
 
-    for class_name, polygon in class_polygons:
-        voc_poly = polygon_to_voc_polygon(
-            polygon,
-            image_width=width,
-            image_height=height,
-        )
-        xmin, ymin, xmax, ymax = polygon_to_bbox(
-            polygon,
-            image_width=width,
-            image_height=height,
-        )
-
+    objects = _voc_objects(class_polygons, width, height, simplify_tolerance)
+    flags = truncated if truncated is not None else repeat(False)
+    for (class_name, (xmin, ymin, xmax, ymax), voc_poly), is_truncated in zip(objects, flags):
         obj = ET.SubElement(root, "object")
         ET.SubElement(obj, "name").text = class_name
         ET.SubElement(obj, "pose").text = "Unspecified"
-        ET.SubElement(obj, "truncated").text = "0"
+        ET.SubElement(obj, "truncated").text = str(int(bool(is_truncated)))
         ET.SubElement(obj, "difficult").text = "0"
 
         # Keep bbox for broad VOC parser compatibility, and add polygon for segmentation.
@@ -87,6 +153,148 @@ def save_pascal_voc(tree: ET.ElementTree, output_path: str | Path) -> None:
     output_path.write_bytes(pretty)
 
 
+def _voc_text_element(indent: str, tag: str, text: str) -> str:
+    # Same layout as minidom's toprettyxml for a text-only element.
+    if not text:
+        return f"{indent}<{tag}/>\n"
+    return f"{indent}<{tag}>{escape(text, _VOC_TEXT_ENTITIES)}</{tag}>\n"
+
+
+def _voc_object_text(
+    class_name: str,
+    bbox: tuple[int, int, int, int],
+    voc_poly: np.ndarray,
+    truncated: bool = False,
+) -> str:
+    xmin, ymin, xmax, ymax = bbox
+
+    parts = [
+        "  <object>\n",
+        _voc_text_element("    ", "name", class_name),
+        "    <pose>Unspecified</pose>\n",
+        "    <truncated>1</truncated>\n" if truncated else "    <truncated>0</truncated>\n",
+        "    <difficult>0</difficult>\n",
+        "    <bndbox>\n",
+        f"      <xmin>{xmin}</xmin>\n",
+        f"      <ymin>{ymin}</ymin>\n",
+        f"      <xmax>{xmax}</xmax>\n",
+        f"      <ymax>{ymax}</ymax>\n",
+        "    </bndbox>\n",
+    ]
+
+    if len(voc_poly) == 0:
+        parts.append("    <polygon/>\n")
+    else:
+        parts.append("    <polygon>\n")
+        parts.extend(
+            f"      <x{i}>{x}</x{i}>\n      <y{i}>{y}</y{i}>\n"
+            for i, (x, y) in enumerate(voc_poly.tolist(), start=1)
+        )
+        parts.append("    </polygon>\n")
+
+    parts.append("  </object>\n")
+    return "".join(parts)
+
+
+def iter_pascal_voc_text(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    *,
+    filename: str,
+    width: int,
+    height: int,
+    depth: int = 3,
+    folder: str = "",
+    image_path: str = "",
+    database: str = "Unknown",
+    simplify_tolerance: float | None = None,
+    truncated: Iterable[bool] | None = None,
+) -> Iterator[str]:
+    # VOC XML text piece by piece (header, one piece per object, footer), byte-identical to
+    # class_polygons_to_pascal_voc_tree + save_pascal_voc.
+    yield "".join(
+        [
+            '<?xml version="1.0" encoding="utf-8"?>\n',
+            "<annotation>\n",
+            _voc_text_element("  ", "folder", folder),
+            _voc_text_element("  ", "filename", filename),
+            _voc_text_element("  ", "path", image_path),
+            "  <source>\n",
+            _voc_text_element("    ", "database", database),
+            "  </source>\n",
+            "  <size>\n",
+            f"    <width>{int(width)}</width>\n",
+            f"    <height>{int(height)}</height>\n",
+            f"    <depth>{int(depth)}</depth>\n",
+            "  </size>\n",
+            "  <segmented>1</segmented>\n",
+        ]
+    )
+
+    objects = _voc_objects(class_polygons, width, height, simplify_tolerance)
+    flags = truncated if truncated is not None else repeat(False)
+    for (class_name, bbox, voc_poly), is_truncated in zip(objects, flags):
+        yield _voc_object_text(class_name, bbox, voc_poly, bool(is_truncated))
+
+    yield "</annotation>\n"
+
+
+def write_text_atomic(output_path: str | Path, parts: Iterable[str]) -> None:
+    # Write to a sibling temp file so a failure mid-stream never leaves a truncated output.
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    try:
+        with stage("write"):
+            with tmp_path.open("w", encoding="utf-8", newline="\n", buffering=1 << 16) as f:
+                # Lazily generated parts are serialization, not writing.
+                if not isinstance(parts, (list, tuple)):
+                    parts = timed_iter("voc_serialization", parts)
+                for part in parts:
+                    f.write(part)
+            stats = active_stats()
+            if stats is not None:
+                stats.count("files_written")
+                stats.count("bytes_written", tmp_path.stat().st_size)
+            os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_pascal_voc(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    output_path: str | Path,
+    *,
+    filename: str,
+    width: int,
+    height: int,
+    depth: int = 3,
+    folder: str = "",
+    image_path: str = "",
+    database: str = "Unknown",
+    simplify_tolerance: float | None = None,
+    truncated: Iterable[bool] | None = None,
+) -> None:
+    # Streaming equivalent of class_polygons_to_pascal_voc_tree + save_pascal_voc:
+    # writes the same bytes object by object, without building a tree.
+    write_text_atomic(
+        output_path,
+        iter_pascal_voc_text(
+            class_polygons,
+            filename=filename,
+            width=width,
+            height=height,
+            depth=depth,
+            folder=folder,
+            image_path=image_path,
+            database=database,
+            simplify_tolerance=simplify_tolerance,
+            truncated=truncated,
+        ),
+    )
+
+
 def xml_annotations_to_pascal_voc(
     input_xml_path: str | Path,
     output_voc_path: str | Path,
@@ -98,10 +306,13 @@ def xml_annotations_to_pascal_voc(
     folder: str = "",
     image_path: str = "",
     database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
 ) -> None:
-    class_polygons = load_class_polygons_from_xml(input_xml_path)
-    tree = class_polygons_to_pascal_voc_tree(
+    class_polygons = iter_class_polygons_from_xml(input_xml_path, polygon_options=polygon_options)
+    write_pascal_voc(
         class_polygons,
+        output_voc_path,
         filename=filename,
         width=width,
         height=height,
@@ -109,8 +320,8 @@ def xml_annotations_to_pascal_voc(
         folder=folder,
         image_path=image_path,
         database=database,
+        simplify_tolerance=simplify_tolerance,
     )
-    save_pascal_voc(tree, output_voc_path)
 
 
 def convert_image_xml_pair_to_pascal_voc(
@@ -120,11 +331,23 @@ def convert_image_xml_pair_to_pascal_voc(
     *,
     depth: int = 3,
     database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
 ) -> None:
-    context = load_image_annotation_context(image_path, annotation_xml_path)
+    context = load_image_annotation_context(
+        image_path,
+        annotation_xml_path,
+        streaming=True,
+        polygon_options=polygon_options,
+        image_size=image_size,
+        exif_orientation=exif_orientation,
+    )
 
-    tree = class_polygons_to_pascal_voc_tree(
+    write_pascal_voc(
         context["class_polygons"],
+        output_voc_path,
         filename=str(context["filename"]),
         width=int(context["width"]),
         height=int(context["height"]),
@@ -132,8 +355,57 @@ def convert_image_xml_pair_to_pascal_voc(
         folder=str(context["folder"]),
         image_path=str(context["image_path"]),
         database=database,
+        simplify_tolerance=simplify_tolerance,
+    )
+
+
+def convert_image_xml_pair_to_pascal_voc_tiles(
+    image_path: str | Path,
+    annotation_xml_path: str | Path,
+    output_dir: str | Path,
+    *,
+    tiles: TileOptions,
+    depth: int = 3,
+    database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
+) -> list[Path]:
+    # One VOC file per tile, <image_stem>_x<x0>_y<y0>.xml in output_dir, with polygons clipped to
+    # the tile, coordinates relative to it and truncated=1 for objects cut by the tile border.
+    # <filename> names the tile image (same pattern and suffix); <path> is the full image.
+    context = load_image_annotation_context(
+        image_path,
+        annotation_xml_path,
+        polygon_options=polygon_options,
+        image_size=image_size,
+        exif_orientation=exif_orientation,
     )
-    save_pascal_voc(tree, output_voc_path)
+    image_name = PurePosixPath(str(context["filename"]))
+    output_dir = Path(output_dir)
+
+    written: list[Path] = []
+    tile_polygons = iter_polygon_tiles(context["class_polygons"], int(context["width"]), int(context["height"]), tiles)
+    for (x0, y0, tile_width, tile_height), batch, truncated in tile_polygons:
+        tile_stem = f"{image_name.stem}_x{x0}_y{y0}"
+        output_xml = output_dir / f"{tile_stem}.xml"
+        write_pascal_voc(
+            batch,
+            output_xml,
+            filename=tile_stem + image_name.suffix,
+            width=tile_width,
+            height=tile_height,
+            depth=depth,
+            folder=str(context["folder"]),
+            image_path=str(context["image_path"]),
+            database=database,
+            simplify_tolerance=simplify_tolerance,
+            truncated=truncated.tolist(),
+        )
+        written.append(output_xml)
+
+    return written
 
 
 def convert_png_xml_pair_to_pascal_voc(
@@ -143,15 +415,190 @@ def convert_png_xml_pair_to_pascal_voc(
     *,
     depth: int = 3,
     database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
 ) -> None:
-    # Backward-compatible alias. Input can now be PNG/JPEG as well.
+    # Backward-compatible alias. Input can now be any format in IMAGE_EXTENSIONS.
     convert_image_xml_pair_to_pascal_voc(
         png_path,
         annotation_xml_path,
         output_voc_path,
         depth=depth,
         database=database,
+        polygon_options=polygon_options,
+        simplify_tolerance=simplify_tolerance,
+    )
+
+
+def profile_image_xml_pair_conversion(
+    image_path: str | Path,
+    annotation_xml_path: str | Path,
+    profile_output: str | Path,
+    *,
+    depth: int = 3,
+    database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    exif_orientation: bool = False,
+) -> None:
+    # Converts one (slow) pair under cProfile into a throwaway output and dumps the profile to profile_output.
+    with tempfile.TemporaryDirectory(prefix="voc_profile_") as tmp_dir:
+        profile_call(
+            profile_output,
+            convert_image_xml_pair_to_pascal_voc,
+            image_path,
+            annotation_xml_path,
+            Path(tmp_dir) / "profile.xml",
+            depth=depth,
+            database=database,
+            polygon_options=polygon_options,
+            simplify_tolerance=simplify_tolerance,
+            exif_orientation=exif_orientation,
+        )
+
+
+def _convert_pair_task(task: tuple[Path, Path, Path, dict[str, object]]) -> str | None:
+    # Runs in worker processes: errors are returned as text so that one bad file
+    # does not tear down the whole pool.
+    image_path, annotation_xml, output_xml, convert_kwargs = task
+    try:
+        convert_image_xml_pair_to_pascal_voc(
+            image_path,
+            annotation_xml,
+            output_xml,
+            **convert_kwargs,
+        )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _convert_pair_tiles_task(
+    tiles: TileOptions,
+    task: tuple[Path, Path, Path, dict[str, object]],
+) -> tuple[list[Path], str | None]:
+    # Tiled counterpart of _convert_pair_task (bind tiles with functools.partial); the tile
+    # files go next to the per-image output and are returned.
+    image_path, annotation_xml, output_xml, convert_kwargs = task
+    try:
+        written = convert_image_xml_pair_to_pascal_voc_tiles(
+            image_path,
+            annotation_xml,
+            output_xml.parent,
+            tiles=tiles,
+            **convert_kwargs,
+        )
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+    return written, None
+
+
+def _pipeline_read(task: tuple[Path, Path, Path, dict[str, object]]) -> dict[str, object]:
+    # Pipeline I/O stage: image header and raw annotation bytes, so compute never waits on storage.
+    image_path, annotation_xml, _, convert_kwargs = task
+    context = load_image_context(
+        image_path,
+        image_size=convert_kwargs.get("image_size"),
+        exif_orientation=convert_kwargs.get("exif_orientation", False),
     )
+    with stage("xml_read"):
+        xml_bytes = as_source(annotation_xml).read_bytes()
+
+    stats = active_stats()
+    if stats is not None:
+        stats.count("xml_bytes_read", len(xml_bytes))
+
+    return {**context, "xml_bytes": xml_bytes, "convert_kwargs": convert_kwargs}
+
+
+def _pipeline_compute(payload: dict[str, object]) -> str:
+    # Pipeline compute stage (may run in a worker process): geometry and VOC text, no file access.
+    convert_kwargs = payload["convert_kwargs"]
+    class_polygons = iter_class_polygons_from_xml(
+        io.BytesIO(payload["xml_bytes"]),
+        polygon_options=convert_kwargs.get("polygon_options"),
+    )
+    return "".join(
+        timed_iter(
+            "voc_serialization",
+            iter_pascal_voc_text(
+                class_polygons,
+                filename=str(payload["filename"]),
+                width=int(payload["width"]),
+                height=int(payload["height"]),
+                depth=convert_kwargs.get("depth", 3),
+                folder=str(payload["folder"]),
+                image_path=str(payload["image_path"]),
+                database=convert_kwargs.get("database", "Unknown"),
+                simplify_tolerance=convert_kwargs.get("simplify_tolerance"),
+            ),
+        )
+    )
+
+
+def _pipeline_write(task: tuple[Path, Path, Path, dict[str, object]], text: str) -> None:
+    write_text_atomic(task[2], (text,))
+
+
+def _pipeline_stages(
+    compute: Callable[[dict[str, object]], str],
+    write: Callable[[tuple[Path, Path, Path, dict[str, object]], str], None],
+    jobs: int,
+) -> tuple[Callable, Callable]:
+    # With a process pool, compute is measured in the workers and merged before writing.
+    return measured_in_workers(compute, write) if jobs > 1 else (compute, write)
+
+
+def _shard_pair_task(task: tuple[Path, Path, Path, dict[str, object]]) -> tuple[str | None, str | None]:
+    # Runs in worker processes for shard output: the VOC text is returned instead of written.
+    try:
+        return _pipeline_compute(_pipeline_read(task)), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _convert_tasks_to_shards(
+    tasks: Sequence[tuple[Path, Path, Path, dict[str, object]]],
+    input_dir: Path,
+    output_dir: Path,
+    *,
+    jobs: int,
+    pipeline: PipelineOptions | None,
+    shards: ShardOptions,
+) -> tuple[list[str | None], list[Path | None], list[Path]]:
+    # Appends each VOC document to the shards in output_dir, keyed by the image path relative to
+    # input_dir and named like the per-file output. Returns the errors and the written record
+    # (<shard>/<member>) per task, and the shard files.
+    outputs: list[Path | None] = [None] * len(tasks)
+    slots = {task[2]: i for i, task in enumerate(tasks)}
+
+    with ShardWriter(output_dir, shards) as writer:
+
+        def append(task: tuple[Path, Path, Path, dict[str, object]], text: str) -> None:
+            member = task[2].relative_to(output_dir).as_posix()
+            key = relative_source_path(task[0], input_dir).as_posix()
+            data = text.encode("utf-8")
+            with stage("write"):
+                outputs[slots[task[2]]] = writer.add(key, member, data) / member
+
+            stats = active_stats()
+            if stats is not None:
+                stats.count("records_written")
+                stats.count("bytes_written", len(data))
+
+        if pipeline is not None:
+            # Records are appended in completion order here; the index still finds each one.
+            compute, write = _pipeline_stages(_pipeline_compute, append, jobs)
+            errors = run_pipeline(tasks, _pipeline_read, compute, write, compute_workers=jobs, options=pipeline)
+        else:
+            # Results arrive in task order, so shards are deterministic.
+            errors = []
+            for task, (text, error) in zip(tasks, iter_task_results(_shard_pair_task, tasks, jobs)):
+                if error is None:
+                    append(task, text)
+                errors.append(error)
+
+    return errors, outputs, writer.shards
 
 
 def convert_directory_to_pascal_voc(
@@ -160,26 +607,172 @@ def convert_directory_to_pascal_voc(
     *,
     depth: int = 3,
     database: str = "Unknown",
+    polygon_options: Mapping[str, object] | None = None,
+    simplify_tolerance: float | None = None,
+    jobs: int = 1,
+    incremental: bool = False,
+    prune_stale: bool = False,
+    image_cache: str | Path | None = None,
+    scan_threads: int = 1,
+    annotation_archive: str | Path | None = None,
+    exif_orientation: bool = False,
+    pipeline: PipelineOptions | None = None,
+    shards: ShardOptions | None = None,
+    tiles: TileOptions | None = None,
+    report: DirectoryConversionReport | None = None,
 ) -> tuple[list[Path], list[Path]]:
+    # With pipeline options, reading, geometry (on `jobs` processes) and writing overlap
+    # through bounded queues instead of running back to back for each pair.
+    # input_dir may also be a ZIP of images, and annotation_archive a delivered ZIP of annotation XML.
+    # With shard options, VOC documents are appended to tar/zip shards (plus an index per shard)
+    # instead of one file per image; written then lists <shard>/<member> records.
+    # With tile options, every image gets one VOC file per tile instead (see
+    # convert_image_xml_pair_to_pascal_voc_tiles); written lists the tile files.
+    if output_dir is None and is_zip_archive(input_dir):
+        raise ValueError("output_dir is required when input_dir is a ZIP archive")
+    if shards is not None and incremental:
+        raise ValueError("incremental conversion tracks one file per image and cannot write shards")
+    if tiles is not None and (incremental or pipeline is not None or shards is not None):
+        raise ValueError("tiled output cannot be combined with incremental, pipeline or shard output")
+    if tiles is not None:
+        tile_size(tiles)
     input_dir = Path(input_dir)
     output_dir = Path(output_dir) if output_dir is not None else input_dir
+    jobs = resolve_jobs(jobs)
 
-    pairs, missing_annotations = discover_image_annotation_pairs(input_dir)
+    with stage("discovery"):
+        pairs, missing_annotations = discover_image_annotation_pairs(
+            input_dir,
+            threads=scan_threads,
+            annotation_archive=annotation_archive,
+        )
 
-    written: list[Path] = []
+    stats = active_stats()
+    if stats is not None:
+        stats.count("pairs", len(pairs))
+        stats.count("missing_annotations", len(missing_annotations))
+
+    convert_kwargs: dict[str, object] = {
+        "depth": depth,
+        "database": database,
+        "polygon_options": dict(polygon_options) if polygon_options is not None else None,
+        "simplify_tolerance": simplify_tolerance,
+    }
+    if exif_orientation:
+        # Only set when enabled, so manifests from runs without it stay valid.
+        convert_kwargs["exif_orientation"] = True
+
+    manifest: ConversionManifest | None = None
+    if incremental:
+        params: dict[str, object] = {"input_dir": str(input_dir.resolve()), **convert_kwargs}
+        if annotation_archive is not None:
+            params["annotation_archive"] = str(Path(annotation_archive).resolve())
+        manifest = ConversionManifest.load(output_dir, params)
+
+    tasks: list[tuple[Path, Path, Path, dict[str, object]]] = []
+    fingerprints: dict[Path, tuple[str, dict[str, object]]] = {}
+    current_outputs: set[Path] = set()
+    skipped: list[Path] = []
 
     for image_path, annotation_xml in pairs:
-        rel_parent = image_path.parent.relative_to(input_dir)
-        output_xml = output_dir / rel_parent / f"{image_path.stem}.xml"
-
-        convert_image_xml_pair_to_pascal_voc(
-            image_path,
-            annotation_xml,
-            output_xml,
-            depth=depth,
-            database=database,
+        rel_path = relative_source_path(image_path, input_dir)
+        output_xml = output_dir / rel_path.parent / f"{image_path.stem}.xml"
+
+        if manifest is not None:
+            key = rel_path.as_posix()
+            current_outputs.add(output_xml)
+            with stage("manifest"):
+                fingerprint = manifest.fingerprint(key, image_path, annotation_xml)
+                current = manifest.is_current(key, fingerprint, output_xml)
+            if current:
+                # Refresh stat fields so a touched-but-identical file is not rehashed next time.
+                manifest.record(key, fingerprint, output_xml)
+                skipped.append(output_xml)
+                continue
+            fingerprints[output_xml] = (key, fingerprint)
+
+        tasks.append((image_path, annotation_xml, output_xml, convert_kwargs))
+
+    if image_cache is not None:
+        with stage("image_cache"):
+            tasks = with_cached_image_sizes(tasks, image_cache, threads=jobs, exif_orientation=exif_orientation)
+
+    shard_paths: list[Path] = []
+    if tiles is not None:
+        results = list(iter_task_results(partial(_convert_pair_tiles_task, tiles), tasks, jobs))
+        outputs = [paths for paths, _ in results]
+        errors = [error for _, error in results]
+    elif shards is not None:
+        errors, outputs, shard_paths = _convert_tasks_to_shards(
+            tasks,
+            input_dir,
+            output_dir,
+            jobs=jobs,
+            pipeline=pipeline,
+            shards=shards,
         )
-        written.append(output_xml)
+    elif pipeline is not None:
+        compute, write = _pipeline_stages(_pipeline_compute, _pipeline_write, jobs)
+        errors = run_pipeline(
+            tasks,
+            _pipeline_read,
+            compute,
+            write,
+            compute_workers=jobs,
+            options=pipeline,
+        )
+    else:
+        errors = list(iter_task_results(_convert_pair_task, tasks, jobs))
 
-    return written, missing_annotations
+    written: list[Path] = []
+    failed: list[tuple[Path, str]] = []
+
+    for i, (task, error) in enumerate(zip(tasks, errors)):
+        if error is not None:
+            failed.append((task[0], error))
+        elif tiles is not None:
+            written.extend(outputs[i])
+        elif shards is not None:
+            written.append(outputs[i])
+        else:
+            written.append(task[2])
+
+    if stats is not None:
+        stats.count("skipped", len(skipped))
+        stats.count("failed", len(failed))
+
+    stale: list[Path] = []
+    if manifest is not None:
+        for output_xml in written:
+            key, fingerprint = fingerprints[output_xml]
+            manifest.record(key, fingerprint, output_xml)
+        for image_path, _ in failed:
+            manifest.discard(relative_source_path(image_path, input_dir).as_posix())
+
+        current_keys = {relative_source_path(image_path, input_dir).as_posix() for image_path, _ in pairs}
+        for key, output_xml in manifest.stale_outputs(current_keys):
+            if output_xml in current_outputs:
+                # The file now belongs to a current pair (e.g. x.png replaced by x.jpg): forget the
+                # old key, but neither delete nor report the output.
+                manifest.discard(key)
+                continue
+            if prune_stale:
+                output_xml.unlink(missing_ok=True)
+                manifest.discard(key)
+            stale.append(output_xml)
+
+        manifest.save()
+
+    if report is not None:
+        report.written.extend(written)
+        report.missing.extend(missing_annotations)
+        report.failed.extend(failed)
+        report.skipped.extend(skipped)
+        report.stale.extend(stale)
+        report.shards.extend(shard_paths)
+    elif failed:
+        # Without a report to record into, surface failures only after every other pair was written.
+        details = "\n".join(f"  {p}: {message}" for p, message in failed)
+        raise RuntimeError(f"failed to convert {len(failed)} image files:\n{details}")
 
+    return written, missing_annotations
@@ -0,0 +1,469 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import argparse
+import csv
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import sys
+from typing import Mapping, Sequence
+
+import numpy as np
+
+from conversion_pipeline import iter_task_results, resolve_jobs
+from image_size_cache import with_cached_image_sizes
+from load_annotation import discover_image_annotation_pairs, load_image_annotation_context
+from polygon_batch import SHAPE_TYPES, PolygonBatch
+from polygon_to_bbox_util import polygons_to_bboxes
+from polygon_to_coco import polygon_areas
+
+
+__all__ = [
+    "LogHistogram",
+    "DatasetStats",
+    "DatasetStatsReport",
+    "collect_dataset_stats",
+    "main",
+]
+
+# LogHistogram buckets: _OCTAVE_BUCKETS per power of two from 2^_MIN_EXPONENT to 2^_MAX_EXPONENT,
+# plus bucket 0 for everything at or below 2^_MIN_EXPONENT (zero included). Quantiles are within
+# (2^(1/32) - 1) / (2^(1/32) + 1) ~ 1.1% of the true value.
+_OCTAVE_BUCKETS = 32
+_MIN_EXPONENT = -8
+_MAX_EXPONENT = 40
+_BUCKETS = (_MAX_EXPONENT - _MIN_EXPONENT) * _OCTAVE_BUCKETS
+
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+IMAGE_METRICS = ("objects_per_image", "objects_per_megapixel")
+OBJECT_METRICS = ("polygon_area", "bbox_width", "bbox_height", "bbox_area", "vertices")
+CLASS_METRICS = ("polygon_area", "bbox_width", "bbox_height")
+
+
+class LogHistogram:
+    # Streaming distribution of non-negative values in constant memory: count, sum, min, max and
+    # log-spaced bucket counts, from which quantiles and a power-of-two histogram are read.
+    # Histograms of the same layout merge exactly, so partial results can be added up in any order.
+    __slots__ = ("counts", "count", "total", "minimum", "maximum")
+
+    def __init__(self) -> None:
+        self.counts = np.zeros(_BUCKETS + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def add(self, values: Sequence[float] | np.ndarray) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+
+        # Bucket i >= 1 holds (2^(e + (i - 1) / k), 2^(e + i / k)] with e = _MIN_EXPONENT, k = _OCTAVE_BUCKETS.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            keys = np.ceil((np.log2(values) - _MIN_EXPONENT) * _OCTAVE_BUCKETS)
+        keys = np.clip(np.nan_to_num(keys, nan=0.0), 0, _BUCKETS).astype(np.int64)
+
+        self.counts += np.bincount(keys, minlength=_BUCKETS + 1)
+        self.count += values.size
+        self.total += float(values.sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    def merge(self, other: LogHistogram) -> None:
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+
+        rank = q * (self.count - 1)
+        i = int(np.searchsorted(np.cumsum(self.counts), rank, side="right"))
+        if i == 0:
+            return self.minimum
+
+        # Harmonic middle of the bucket, which bounds the relative error from both ends.
+        upper = 2.0 ** (_MIN_EXPONENT + i / _OCTAVE_BUCKETS)
+        gamma = 2.0 ** (1.0 / _OCTAVE_BUCKETS)
+        return min(max(2.0 * upper / (gamma + 1.0), self.minimum), self.maximum)
+
+    def octaves(self) -> list[tuple[float, int]]:
+        # (upper bound, count) of every non-empty power-of-two bin (2^(j - 1), 2^j].
+        # The lowest bin also holds every value at or below 2^_MIN_EXPONENT, zero included.
+        per_octave = self.counts[1:].reshape(-1, _OCTAVE_BUCKETS).sum(axis=1)
+        per_octave[0] += self.counts[0]
+        return [(2.0 ** (_MIN_EXPONENT + j + 1), int(per_octave[j])) for j in np.flatnonzero(per_octave).tolist()]
+
+    def to_dict(self) -> dict[str, object]:
+        if self.count == 0:
+            return {"count": 0}
+
+        return {
+            "count": self.count,
+            "mean": _round(self.total / self.count),
+            "min": _round(self.minimum),
+            "max": _round(self.maximum),
+            "quantiles": {_quantile_name(q): _round(self.quantile(q)) for q in QUANTILES},
+            "histogram": [{"upper": _upper(upper), "count": n} for upper, n in self.octaves()],
+        }
+
+
+def _round(value: float) -> float | int:
+    # Integral values print as integers; sums merged in a different order differ only past 6 decimals.
+    value = round(float(value), 6)
+    return int(value) if value.is_integer() else value
+
+
+def _upper(value: float) -> float | int:
+    # Bin bounds are powers of two, exact as they are.
+    return int(value) if value >= 1 else value
+
+
+def _quantile_name(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+class _ClassStats:
+    __slots__ = ("objects", "images", "vertices", "metrics")
+
+    def __init__(self) -> None:
+        self.objects = 0
+        self.images = 0
+        self.vertices = 0
+        self.metrics = {name: LogHistogram() for name in CLASS_METRICS}
+
+    def merge(self, other: _ClassStats) -> None:
+        self.objects += other.objects
+        self.images += other.images
+        self.vertices += other.vertices
+        for name, histogram in other.metrics.items():
+            self.metrics[name].merge(histogram)
+
+
+@dataclass
+class DatasetStatsReport:
+    # Images left out of the summary: no annotation xml, or unreadable (path, message).
+    missing: list[Path] = field(default_factory=list)
+    failed: list[tuple[Path, str]] = field(default_factory=list)
+
+
+class DatasetStats:
+    # Dataset summary built one image at a time: image/object/vertex totals, objects per shape
+    # type and per class, and LogHistogram distributions per object, per image and per class.
+    # Memory depends on the number of classes only. Partial results (e.g. from worker processes)
+    # are combined with merge(); classes keep their order of first appearance.
+
+    def __init__(self) -> None:
+        self.images = 0
+        self.empty_images = 0
+        self.objects = 0
+        self.vertices = 0
+        self.empty_polygons = 0
+        self.shapes: dict[str, int] = {}
+        self.classes: dict[str, _ClassStats] = {}
+        self.metrics = {name: LogHistogram() for name in IMAGE_METRICS + OBJECT_METRICS}
+
+    def add_image(self, width: int, height: int, batch: PolygonBatch) -> None:
+        vertex_counts = batch.vertex_counts
+        if np.any(vertex_counts == 0):
+            self.empty_polygons += int(np.count_nonzero(vertex_counts == 0))
+            batch = batch.take(np.flatnonzero(vertex_counts))
+            vertex_counts = batch.vertex_counts
+
+        objects = len(batch)
+        self.images += 1
+        self.empty_images += objects == 0
+        self.objects += objects
+        self.vertices += int(vertex_counts.sum())
+        self.metrics["objects_per_image"].add([objects])
+        self.metrics["objects_per_megapixel"].add([objects * 1e6 / max(1, width * height)])
+        if objects == 0:
+            return
+
+        # Sizes are measured on the same integer boxes the VOC export writes.
+        bboxes = polygons_to_bboxes(batch.coords, batch.offsets, image_width=width, image_height=height)
+        values = {
+            "polygon_area": polygon_areas(batch.coords, batch.offsets),
+            "bbox_width": bboxes[:, 2] - bboxes[:, 0],
+            "bbox_height": bboxes[:, 3] - bboxes[:, 1],
+            "vertices": vertex_counts,
+        }
+        values["bbox_area"] = values["bbox_width"] * values["bbox_height"]
+        for name in OBJECT_METRICS:
+            self.metrics[name].add(values[name])
+
+        # Unset shapes (code -1) are counted under "".
+        shape_counts = np.bincount(batch.shape_codes.astype(np.int64) + 1, minlength=len(SHAPE_TYPES) + 1)
+        for shape, n in zip(("",) + SHAPE_TYPES, shape_counts.tolist()):
+            if n:
+                self.shapes[shape] = self.shapes.get(shape, 0) + n
+
+        # Class ids in order of first appearance within the file.
+        class_ids, first = np.unique(batch.class_ids, return_index=True)
+        for class_id in class_ids[np.argsort(first)].tolist():
+            picks = batch.class_ids == class_id
+            entry = self.classes.get(batch.class_names[class_id])
+            if entry is None:
+                entry = self.classes[batch.class_names[class_id]] = _ClassStats()
+            entry.objects += int(np.count_nonzero(picks))
+            entry.images += 1
+            entry.vertices += int(vertex_counts[picks].sum())
+            for name in CLASS_METRICS:
+                entry.metrics[name].add(values[name][picks])
+
+    def merge(self, other: DatasetStats) -> None:
+        self.images += other.images
+        self.empty_images += other.empty_images
+        self.objects += other.objects
+        self.vertices += other.vertices
+        self.empty_polygons += other.empty_polygons
+        for shape, n in other.shapes.items():
+            self.shapes[shape] = self.shapes.get(shape, 0) + n
+        for class_name, entry in other.classes.items():
+            self.classes.setdefault(class_name, _ClassStats()).merge(entry)
+        for name, histogram in other.metrics.items():
+            self.metrics[name].merge(histogram)
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "images": self.images,
+            "images_without_objects": self.empty_images,
+            "objects": self.objects,
+            "vertices": self.vertices,
+            "empty_polygons": self.empty_polygons,
+            "shapes": {shape: self.shapes[shape] for shape in ("",) + SHAPE_TYPES if shape in self.shapes},
+            "classes": {
+                class_name: {
+                    "objects": entry.objects,
+                    "images": entry.images,
+                    "vertices": entry.vertices,
+                    **{name: histogram.to_dict() for name, histogram in entry.metrics.items()},
+                }
+                for class_name, entry in self.classes.items()
+            },
+            "distributions": {name: histogram.to_dict() for name, histogram in self.metrics.items()},
+        }
+
+    def class_rows(self) -> list[dict[str, object]]:
+        # One flat row per class for the CSV summary.
+        rows = []
+        for class_name, entry in self.classes.items():
+            row: dict[str, object] = {
+                "class": class_name,
+                "objects": entry.objects,
+                "images": entry.images,
+                "object_share": _round(entry.objects / self.objects) if self.objects else 0,
+                "vertices_mean": _round(entry.vertices / entry.objects) if entry.objects else 0,
+            }
+            for name, histogram in entry.metrics.items():
+                row[f"{name}_mean"] = _round(histogram.total / histogram.count) if histogram.count else ""
+                for q in (0.05, 0.5, 0.95):
+                    row[f"{name}_{_quantile_name(q)}"] = _round(histogram.quantile(q)) if histogram.count else ""
+            rows.append(row)
+        return rows
+
+    def histogram_rows(self) -> list[dict[str, object]]:
+        # Long format (metric, class, upper, count); class is empty for dataset-wide metrics.
+        rows = []
+        for name, histogram in self.metrics.items():
+            rows.extend({"metric": name, "class": "", "upper": _upper(upper), "count": n} for upper, n in histogram.octaves())
+        for class_name, entry in self.classes.items():
+            for name, histogram in entry.metrics.items():
+                rows.extend(
+                    {"metric": name, "class": class_name, "upper": _upper(upper), "count": n}
+                    for upper, n in histogram.octaves()
+                )
+        return rows
+
+    def save_json(self, path: str | Path, extra: Mapping[str, object] | None = None) -> None:
+        _write_atomic(Path(path), json.dumps({**(extra or {}), **self.to_dict()}, ensure_ascii=False, indent=1) + "\n")
+
+    def save_class_csv(self, path: str | Path) -> None:
+        _write_csv(Path(path), self.class_rows())
+
+    def save_histogram_csv(self, path: str | Path) -> None:
+        _write_csv(Path(path), self.histogram_rows(), fieldnames=("metric", "class", "upper", "count"))
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text, encoding="utf-8", newline="\n")
+    os.replace(tmp_path, path)
+
+
+def _write_csv(path: Path, rows: list[dict[str, object]], fieldnames: Sequence[str] | None = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(fieldnames or (rows[0] if rows else ("class",))), lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def _stats_chunk_task(
+    tasks: list[tuple[Path, Path, dict[str, object]]],
+) -> tuple[DatasetStats, list[tuple[Path, str]]]:
+    # Runs in worker processes: one partial DatasetStats per chunk of images, so only a few
+    # fixed-size results cross the process boundary. Errors are returned as text.
+    stats = DatasetStats()
+    failed: list[tuple[Path, str]] = []
+    for image_path, annotation_xml, kwargs in tasks:
+        try:
+            context = load_image_annotation_context(image_path, annotation_xml, **kwargs)
+            stats.add_image(int(context["width"]), int(context["height"]), context["class_polygons"])
+        except Exception as e:
+            failed.append((image_path, f"{type(e).__name__}: {e}"))
+    return stats, failed
+
+
+def collect_dataset_stats(
+    input_dir: str | Path,
+    *,
+    polygon_options: Mapping[str, object] | None = None,
+    jobs: int = 1,
+    image_cache: str | Path | None = None,
+    scan_threads: int = 1,
+    annotation_archive: str | Path | None = None,
+    exif_orientation: bool = False,
+    report: DatasetStatsReport | None = None,
+) -> DatasetStats:
+    # One pass over every image/annotation pair under input_dir. With jobs > 1 the pairs are split
+    # into a few chunks per worker and the partial results are merged in pair order.
+    input_dir = Path(input_dir)
+    jobs = resolve_jobs(jobs)
+
+    pairs, missing_annotations = discover_image_annotation_pairs(
+        input_dir,
+        threads=scan_threads,
+        annotation_archive=annotation_archive,
+    )
+
+    kwargs: dict[str, object] = {
+        "polygon_options": dict(polygon_options) if polygon_options is not None else None,
+        "exif_orientation": exif_orientation,
+    }
+    tasks = [(image_path, annotation_xml, kwargs) for image_path, annotation_xml in pairs]
+
+    if image_cache is not None:
+        tasks = with_cached_image_sizes(tasks, image_cache, threads=jobs, exif_orientation=exif_orientation)
+
+    chunks = 1 if jobs == 1 else min(len(tasks), jobs * 4)
+    chunk_size = -(-len(tasks) // max(1, chunks))
+    chunk_tasks = [tasks[i : i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    stats = DatasetStats()
+    failed: list[tuple[Path, str]] = []
+    for partial, chunk_failed in iter_task_results(_stats_chunk_task, chunk_tasks, jobs):
+        stats.merge(partial)
+        failed.extend(chunk_failed)
+
+    if report is not None:
+        report.missing.extend(missing_annotations)
+        report.failed.extend(failed)
+    elif failed:
+        details = "\n".join(f"  {p}: {message}" for p, message in failed)
+        raise RuntimeError(f"failed to read {len(failed)} image files:\n{details}")
+
+    return stats
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Summarize the annotations of a dataset: class counts, object sizes, vertex counts and density.",
+    )
+
+    parser.add_argument(
+        "--input-dir",
+        required=True,
+        help="Root directory (or .zip archive) to scan for images (png/jpg/webp/bmp/gif/tif) and *_annotations.xml pairs",
+    )
+    parser.add_argument("--output", help="Write the JSON summary to this file (default: stdout)")
+    parser.add_argument("--class-csv", help="Write one row per class (counts, size means and quantiles) to this CSV")
+    parser.add_argument("--histogram-csv", help="Write the power-of-two histograms of every metric to this CSV")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes (default: 1, 0 = all CPUs)")
+    parser.add_argument("--image-cache", help="SQLite file caching image sizes between runs")
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=1,
+        help="Threads listing directories during discovery; helps on network storage (default: 1)",
+    )
+    parser.add_argument(
+        "--annotation-archive",
+        help="ZIP of *_annotations.xml files, read in place instead of annotations next to the images",
+    )
+    parser.add_argument(
+        "--exif-orientation",
+        action="store_true",
+        help="Use the displayed size of JPEG/TIFF/WebP images, i.e. width and height swapped for EXIF orientations 5-8",
+    )
+    parser.add_argument("--bezier-flatness", type=float, help="Curve flattening tolerance in pixels")
+    parser.add_argument("--arc-tolerance", type=float, help="Circle/Ellipse chord error in pixels")
+
+    return parser
+
+
+def main() -> None:
+    args = _build_arg_parser().parse_args()
+
+    polygon_options: dict[str, object] = {}
+    if args.bezier_flatness is not None:
+        polygon_options["bezier_flatness"] = args.bezier_flatness
+    if args.arc_tolerance is not None:
+        polygon_options["arc_tolerance"] = args.arc_tolerance
+
+    report = DatasetStatsReport()
+    stats = collect_dataset_stats(
+        args.input_dir,
+        polygon_options=polygon_options,
+        jobs=args.jobs,
+        image_cache=args.image_cache,
+        scan_threads=args.scan_threads,
+        annotation_archive=args.annotation_archive,
+        exif_orientation=args.exif_orientation,
+        report=report,
+    )
+
+    extra = {
+        "input_dir": str(Path(args.input_dir).resolve()),
+        "polygon_options": polygon_options,
+        "missing_annotations": len(report.missing),
+        "failed": len(report.failed),
+    }
+    if args.output:
+        stats.save_json(args.output, extra)
+        print(f"summarized: {stats.images} images, {stats.objects} objects, {len(stats.classes)} classes -> {args.output}")
+    else:
+        print(json.dumps({**extra, **stats.to_dict()}, ensure_ascii=False, indent=1))
+
+    if args.class_csv:
+        stats.save_class_csv(args.class_csv)
+    if args.histogram_csv:
+        stats.save_histogram_csv(args.histogram_csv)
+
+    # Progress and problems go to stderr so that stdout stays valid JSON.
+    out = sys.stderr if not args.output else sys.stdout
+    if report.missing:
+        print(f"missing annotation xml for {len(report.missing)} image files:", file=out)
+        for p in report.missing:
+            print(f"  {p}", file=out)
+
+    if report.failed:
+        print(f"failed to read {len(report.failed)} image files:", file=out)
+        for p, message in report.failed:
+            print(f"  {p}: {message}", file=out)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,99 +3,351 @@
 
 from __future__ import annotations
 
+import io
 from pathlib import Path
+from typing import BinaryIO
+
+from conversion_stats import count
+from zip_archive import ZipMember, as_source
 
 
 PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 JPEG_SOI = b"\xff\xd8"
 JPEG_EOI = b"\xff\xd9"
+GIF_SIGNATURES = (b"GIF87a", b"GIF89a")
+TIFF_SIGNATURES = (b"II*\x00", b"MM\x00*")
+
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff"})
+
+# Bytes fetched per read; JPEG headers with EXIF/ICC blocks usually fit in the first one.
+HEADER_BLOCK_SIZE = 64 * 1024
+
+# SOF markers that contain dimensions.
+_JPEG_SOF_MARKERS = frozenset({0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF})
+_JPEG_APP1 = 0xE1
+_EXIF_HEADER = b"Exif\x00\x00"
+
+_TIFF_IMAGE_WIDTH = 256
+_TIFF_IMAGE_LENGTH = 257
+_TIFF_ORIENTATION = 274
+_TIFF_SAMPLES_PER_PIXEL = 277
+
+# Channels per PNG color type: gray, RGB, palette, gray + alpha, RGBA.
+_PNG_COLOR_TYPE_DEPTH = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+# EXIF orientations 5-8 rotate by 90 degrees, so the displayed size is transposed.
+_TRANSPOSED_ORIENTATIONS = frozenset({5, 6, 7, 8})
+
+
+class _BufferedReader:
+    # Random access over a file through one cached block: reads inside the block cost no syscall,
+    # and a read past it refills the block from that offset.
+
+    def __init__(self, f: BinaryIO, block_size: int = HEADER_BLOCK_SIZE, *, counted: bool = True) -> None:
+        self._f = f
+        self._block_size = block_size
+        self._counted = counted
+        self._start = 0
+        self._buffer = b""
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        begin = offset - self._start
+        if begin < 0 or begin + size > len(self._buffer):
+            self._f.seek(offset)
+            self._buffer = self._f.read(max(size, self._block_size))
+            self._start = offset
+            if self._counted:
+                count("image_bytes_read", len(self._buffer))
+            begin = 0
+        return self._buffer[begin : begin + size]
+
+
+def _transposed(width: int, height: int, orientation: int | None) -> tuple[int, int]:
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def _read_tiff_tags(reader: _BufferedReader, base: int, tags: frozenset[int]) -> dict[int, int]:
+    # Integer values of the requested tags in IFD0 of a TIFF structure starting at `base`.
+    header = reader.read_at(base, 8)
+    if len(header) < 8 or header[:4] not in TIFF_SIGNATURES:
+        raise ValueError("Invalid TIFF header")
+
+    byteorder = "little" if header[:2] == b"II" else "big"
+    ifd_offset = int.from_bytes(header[4:8], byteorder)
+
+    count_bytes = reader.read_at(base + ifd_offset, 2)
+    if len(count_bytes) < 2:
+        raise ValueError("Truncated TIFF IFD")
+    count = int.from_bytes(count_bytes, byteorder)
 
+    entries = reader.read_at(base + ifd_offset + 2, count * 12)
+    if len(entries) < count * 12:
+        raise ValueError("Truncated TIFF IFD")
 
-def read_png_size(png_path: str | Path) -> tuple[int, int]:
-    png_path = Path(png_path)
+    values: dict[int, int] = {}
+    for i in range(0, count * 12, 12):
+        tag = int.from_bytes(entries[i : i + 2], byteorder)
+        if tag not in tags:
+            continue
+        value_type = int.from_bytes(entries[i + 2 : i + 4], byteorder)
+        if value_type == 3:  # SHORT
+            values[tag] = int.from_bytes(entries[i + 8 : i + 10], byteorder)
+        elif value_type == 4:  # LONG
+            values[tag] = int.from_bytes(entries[i + 8 : i + 12], byteorder)
+
+    return values
+
+
+def _exif_orientation(exif: bytes) -> int | None:
+    # Orientation from an EXIF payload (TIFF structure after the "Exif\0\0" header), if present.
+    try:
+        tags = _read_tiff_tags(_BufferedReader(io.BytesIO(exif), counted=False), 0, frozenset({_TIFF_ORIENTATION}))
+    except ValueError:
+        return None
+    return tags.get(_TIFF_ORIENTATION)
+
+
+def read_png_info(png_path: str | Path | ZipMember) -> tuple[int, int, int]:
+    png_path = as_source(png_path)
 
     with png_path.open("rb") as f:
-        header = f.read(24)
+        header = f.read(26)
+    count("image_bytes_read", len(header))
 
-    if len(header) < 24 or header[:8] != PNG_SIGNATURE:
+    if len(header) < 26 or header[:8] != PNG_SIGNATURE:
         raise ValueError(f"Invalid PNG file: {png_path}")
 
     width = int.from_bytes(header[16:20], byteorder="big", signed=False)
     height = int.from_bytes(header[20:24], byteorder="big", signed=False)
+    depth = _PNG_COLOR_TYPE_DEPTH.get(header[25], 3)
+
+    return width, height, depth
 
-    return width, height
 
+def read_png_size(png_path: str | Path | ZipMember) -> tuple[int, int]:
+    return read_png_info(png_path)[:2]
 
-def read_jpeg_size(jpeg_path: str | Path) -> tuple[int, int]:
-    jpeg_path = Path(jpeg_path)
 
-    with jpeg_path.open("rb") as f:
-        if f.read(2) != JPEG_SOI:
+def read_jpeg_info(jpeg_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int, int]:
+    # With exif_orientation, the size is reported as displayed (transposed for orientations 5-8).
+    jpeg_path = as_source(jpeg_path)
+
+    with jpeg_path.open("rb", buffering=0) as f:
+        reader = _BufferedReader(f)
+        if reader.read_at(0, 2) != JPEG_SOI:
             raise ValueError(f"Invalid JPEG file: {jpeg_path}")
 
+        orientation: int | None = None
+        pos = 2
+
         while True:
-            marker_prefix = f.read(1)
-            if not marker_prefix:
+            head = reader.read_at(pos, 4)
+            if len(head) < 2:
                 break
-            if marker_prefix != b"\xff":
-                continue
 
-            marker = f.read(1)
-            while marker == b"\xff":
-                marker = f.read(1)
-            if not marker:
-                break
+            # Skip stray bytes and 0xFF fill bytes up to the marker.
+            if head[0] != 0xFF or head[1] == 0xFF:
+                pos += 1
+                continue
+            marker = head[1]
 
             # Standalone markers without segment length.
-            if marker in {b"\x01"} or b"\xd0" <= marker <= b"\xd9":
-                if marker == JPEG_EOI[1:2]:
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                if marker == JPEG_EOI[1]:
                     break
+                pos += 2
                 continue
 
-            segment_len_bytes = f.read(2)
-            if len(segment_len_bytes) != 2:
+            if len(head) < 4:
                 break
 
-            segment_len = int.from_bytes(segment_len_bytes, byteorder="big", signed=False)
+            segment_len = int.from_bytes(head[2:4], byteorder="big", signed=False)
             if segment_len < 2:
                 raise ValueError(f"Invalid JPEG segment length in: {jpeg_path}")
 
-            # SOF markers that contain dimensions.
-            if marker in {
-                b"\xc0",
-                b"\xc1",
-                b"\xc2",
-                b"\xc3",
-                b"\xc5",
-                b"\xc6",
-                b"\xc7",
-                b"\xc9",
-                b"\xca",
-                b"\xcb",
-                b"\xcd",
-                b"\xce",
-                b"\xcf",
-            }:
-                sof = f.read(5)
-                if len(sof) != 5:
+            if marker in _JPEG_SOF_MARKERS:
+                sof = reader.read_at(pos + 4, 6)
+                if len(sof) != 6:
                     break
                 height = int.from_bytes(sof[1:3], byteorder="big", signed=False)
                 width = int.from_bytes(sof[3:5], byteorder="big", signed=False)
-                return width, height
+                return (*_transposed(width, height, orientation), sof[5])
+
+            if exif_orientation and marker == _JPEG_APP1 and orientation is None:
+                payload = reader.read_at(pos + 4, segment_len - 2)
+                if payload.startswith(_EXIF_HEADER):
+                    orientation = _exif_orientation(payload[len(_EXIF_HEADER) :])
 
-            f.seek(segment_len - 2, 1)
+            pos += 2 + segment_len
 
     raise ValueError(f"Could not read JPEG size from: {jpeg_path}")
 
 
-def read_image_size(image_path: str | Path) -> tuple[int, int]:
-    image_path = Path(image_path)
+def read_jpeg_size(jpeg_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int]:
+    return read_jpeg_info(jpeg_path, exif_orientation=exif_orientation)[:2]
+
+
+def read_webp_info(webp_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int, int]:
+    webp_path = as_source(webp_path)
+
+    with webp_path.open("rb", buffering=0) as f:
+        reader = _BufferedReader(f)
+        header = reader.read_at(0, 30)
+
+        if len(header) < 30 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+            raise ValueError(f"Invalid WebP file: {webp_path}")
+
+        fourcc = header[12:16]
+        if fourcc == b"VP8 ":
+            # Lossy: key frame start code, then 14-bit dimensions.
+            if header[23:26] != b"\x9d\x01\x2a":
+                raise ValueError(f"Invalid WebP VP8 frame in: {webp_path}")
+            width = int.from_bytes(header[26:28], byteorder="little") & 0x3FFF
+            height = int.from_bytes(header[28:30], byteorder="little") & 0x3FFF
+            return width, height, 3
+
+        if fourcc == b"VP8L":
+            # Lossless: signature byte, then (width - 1) and (height - 1) as 14-bit fields and the alpha hint.
+            if header[20] != 0x2F:
+                raise ValueError(f"Invalid WebP VP8L stream in: {webp_path}")
+            bits = int.from_bytes(header[21:25], byteorder="little")
+            depth = 4 if bits & (1 << 28) else 3
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, depth
+
+        if fourcc == b"VP8X":
+            # Extended: feature flags, then 24-bit canvas (width - 1) and (height - 1).
+            width = int.from_bytes(header[24:27], byteorder="little") + 1
+            height = int.from_bytes(header[27:30], byteorder="little") + 1
+            depth = 4 if header[20] & 0x10 else 3
+
+            orientation: int | None = None
+            if exif_orientation and header[20] & 0x08:
+                riff_end = 8 + int.from_bytes(header[4:8], byteorder="little")
+                pos = 12
+                while pos + 8 <= riff_end:
+                    chunk = reader.read_at(pos, 8)
+                    if len(chunk) < 8:
+                        break
+                    chunk_size = int.from_bytes(chunk[4:8], byteorder="little")
+                    if chunk[:4] == b"EXIF":
+                        payload = reader.read_at(pos + 8, chunk_size)
+                        # Some writers keep the JPEG-style header in front of the TIFF structure.
+                        if payload.startswith(_EXIF_HEADER):
+                            payload = payload[len(_EXIF_HEADER) :]
+                        orientation = _exif_orientation(payload)
+                        break
+                    pos += 8 + chunk_size + (chunk_size & 1)
+
+            return (*_transposed(width, height, orientation), depth)
+
+    raise ValueError(f"Unsupported WebP chunk in: {webp_path}")
+
+
+def read_webp_size(webp_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int]:
+    return read_webp_info(webp_path, exif_orientation=exif_orientation)[:2]
+
+
+def read_bmp_info(bmp_path: str | Path | ZipMember) -> tuple[int, int, int]:
+    bmp_path = as_source(bmp_path)
+
+    with bmp_path.open("rb") as f:
+        header = f.read(30)
+    count("image_bytes_read", len(header))
+
+    if len(header) < 18 or header[:2] != b"BM":
+        raise ValueError(f"Invalid BMP file: {bmp_path}")
+
+    dib_size = int.from_bytes(header[14:18], byteorder="little")
+    if dib_size == 12:
+        # OS/2 BITMAPCOREHEADER: unsigned 16-bit dimensions.
+        if len(header) < 26:
+            raise ValueError(f"Invalid BMP file: {bmp_path}")
+        width = int.from_bytes(header[18:20], byteorder="little")
+        height = int.from_bytes(header[20:22], byteorder="little")
+        bit_count = int.from_bytes(header[24:26], byteorder="little")
+        return width, height, 4 if bit_count == 32 else 3
+
+    if len(header) < 30:
+        raise ValueError(f"Invalid BMP file: {bmp_path}")
+    width = int.from_bytes(header[18:22], byteorder="little", signed=True)
+    height = int.from_bytes(header[22:26], byteorder="little", signed=True)
+    bit_count = int.from_bytes(header[28:30], byteorder="little")
+
+    # Negative height marks a top-down bitmap.
+    return abs(width), abs(height), 4 if bit_count == 32 else 3
+
+
+def read_bmp_size(bmp_path: str | Path | ZipMember) -> tuple[int, int]:
+    return read_bmp_info(bmp_path)[:2]
+
+
+def read_gif_info(gif_path: str | Path | ZipMember) -> tuple[int, int, int]:
+    gif_path = as_source(gif_path)
+
+    with gif_path.open("rb") as f:
+        header = f.read(10)
+    count("image_bytes_read", len(header))
+
+    if len(header) < 10 or header[:6] not in GIF_SIGNATURES:
+        raise ValueError(f"Invalid GIF file: {gif_path}")
+
+    # Logical screen size; GIF is always palette RGB.
+    return int.from_bytes(header[6:8], byteorder="little"), int.from_bytes(header[8:10], byteorder="little"), 3
+
+
+def read_gif_size(gif_path: str | Path | ZipMember) -> tuple[int, int]:
+    return read_gif_info(gif_path)[:2]
+
+
+def read_tiff_info(tiff_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int, int]:
+    # Size of the first image (IFD0).
+    tiff_path = as_source(tiff_path)
+
+    with tiff_path.open("rb", buffering=0) as f:
+        try:
+            tags = _read_tiff_tags(
+                _BufferedReader(f),
+                0,
+                frozenset({_TIFF_IMAGE_WIDTH, _TIFF_IMAGE_LENGTH, _TIFF_ORIENTATION, _TIFF_SAMPLES_PER_PIXEL}),
+            )
+        except ValueError as e:
+            raise ValueError(f"Invalid TIFF file: {tiff_path}") from e
+
+    if _TIFF_IMAGE_WIDTH not in tags or _TIFF_IMAGE_LENGTH not in tags:
+        raise ValueError(f"Could not read TIFF size from: {tiff_path}")
+
+    orientation = tags.get(_TIFF_ORIENTATION) if exif_orientation else None
+    width, height = _transposed(tags[_TIFF_IMAGE_WIDTH], tags[_TIFF_IMAGE_LENGTH], orientation)
+    return width, height, tags.get(_TIFF_SAMPLES_PER_PIXEL, 1)
+
+
+def read_tiff_size(tiff_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int]:
+    return read_tiff_info(tiff_path, exif_orientation=exif_orientation)[:2]
+
+
+def read_image_info(image_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int, int]:
+    # (width, height, depth), with depth as the number of channels.
+    # exif_orientation applies to JPEG, TIFF and WebP; by default the stored pixel size is returned.
+    image_path = as_source(image_path)
     suffix = image_path.suffix.lower()
 
     if suffix == ".png":
-        return read_png_size(image_path)
+        return read_png_info(image_path)
     if suffix in {".jpg", ".jpeg"}:
-        return read_jpeg_size(image_path)
+        return read_jpeg_info(image_path, exif_orientation=exif_orientation)
+    if suffix == ".webp":
+        return read_webp_info(image_path, exif_orientation=exif_orientation)
+    if suffix == ".bmp":
+        return read_bmp_info(image_path)
+    if suffix == ".gif":
+        return read_gif_info(image_path)
+    if suffix in {".tif", ".tiff"}:
+        return read_tiff_info(image_path, exif_orientation=exif_orientation)
 
     raise ValueError(f"Unsupported image extension: {image_path.suffix}")
 
+
+def read_image_size(image_path: str | Path | ZipMember, *, exif_orientation: bool = False) -> tuple[int, int]:
+    return read_image_info(image_path, exif_orientation=exif_orientation)[:2]
@@ -0,0 +1,181 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+from pathlib import Path
+import sqlite3
+from typing import Iterable, Sequence, TypeVar
+
+from get_image_size import read_image_info
+from zip_archive import ZipMember
+
+
+IMAGE_CACHE_VERSION = 2
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_CHUNK = 500
+
+Task = TypeVar("Task", bound=tuple)
+
+
+def _read_row(key: str, exif_orientation: bool) -> tuple[str, int, int, int, int, int, int] | None:
+    # Cache row of one image: stat first, so a file changed while reading is simply read again next time.
+    try:
+        st = os.stat(key)
+        width, height, depth = read_image_info(key, exif_orientation=exif_orientation)
+    except (OSError, ValueError):
+        return None
+    return key, int(exif_orientation), st.st_size, st.st_mtime_ns, width, height, depth
+
+
+class ImageSizeCache:
+    # On-disk (width, height, depth) per image, keyed by absolute path and validated by size and mtime.
+    # Lookups and inserts are batched, so a warm run costs one stat per image and no image opens.
+    # Sizes read with and without exif_orientation (see read_image_info) are stored apart.
+
+    def __init__(self, path: str | Path, *, exif_orientation: bool = False) -> None:
+        self.path = Path(path)
+        self.exif_orientation = exif_orientation
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.path)
+        # Rollback journal: WAL needs shared memory, which network file systems (where this cache
+        # helps most) do not provide. Setting it also turns caches written in WAL mode back.
+        self._connection.execute("PRAGMA journal_mode=DELETE")
+
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != IMAGE_CACHE_VERSION:
+            # Unknown layout: start over rather than trust old rows.
+            self._connection.execute("DROP TABLE IF EXISTS images")
+            self._connection.execute(f"PRAGMA user_version={IMAGE_CACHE_VERSION}")
+
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "path TEXT, exif_orientation INTEGER, size INTEGER, mtime_ns INTEGER,"
+            " width INTEGER, height INTEGER, depth INTEGER, PRIMARY KEY (path, exif_orientation)"
+            ") WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def _key(image_path: str | Path) -> str:
+        return os.path.abspath(image_path)
+
+    def get_many(self, image_paths: Sequence[str | Path]) -> list[tuple[int, int, int] | None]:
+        # Cached info for each path, or None when it is missing or the file changed since it was stored.
+        keys = [self._key(p) for p in image_paths]
+
+        rows: dict[str, tuple[int, int, int, int, int]] = {}
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start : start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for path, size, mtime_ns, width, height, depth in self._connection.execute(
+                "SELECT path, size, mtime_ns, width, height, depth FROM images"
+                f" WHERE exif_orientation = ? AND path IN ({placeholders})",
+                [int(self.exif_orientation), *chunk],
+            ):
+                rows[path] = (size, mtime_ns, width, height, depth)
+
+        result: list[tuple[int, int, int] | None] = []
+        for key in keys:
+            row = rows.get(key)
+            if row is None:
+                result.append(None)
+                continue
+            try:
+                st = os.stat(key)
+            except OSError:
+                result.append(None)
+                continue
+            result.append(row[2:] if (st.st_size, st.st_mtime_ns) == row[:2] else None)
+
+        return result
+
+    def put_many(self, items: Iterable[tuple[str | Path, tuple[int, int, int]]]) -> None:
+        rows = []
+        for image_path, (width, height, depth) in items:
+            key = self._key(image_path)
+            st = os.stat(key)
+            rows.append((key, int(self.exif_orientation), st.st_size, st.st_mtime_ns, width, height, depth))
+
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def read_many(self, image_paths: Sequence[str | Path], threads: int = 1) -> list[tuple[int, int, int] | None]:
+        # Cached info, reading the headers of cache misses on `threads` threads (header reads wait on
+        # I/O, so a cold cache on network storage is read as fast as workers would) and storing them
+        # in one transaction. Unreadable images stay None so the caller reports them as usual.
+        result = self.get_many(image_paths)
+
+        misses = [i for i, info in enumerate(result) if info is None]
+        keys = [self._key(image_paths[i]) for i in misses]
+        if threads > 1 and len(keys) > 1:
+            with ThreadPoolExecutor(max_workers=min(threads, len(keys))) as executor:
+                rows = list(executor.map(partial(_read_row, exif_orientation=self.exif_orientation), keys))
+        else:
+            rows = [_read_row(key, self.exif_orientation) for key in keys]
+
+        fresh = []
+        for i, row in zip(misses, rows):
+            if row is not None:
+                result[i] = row[4:]
+                fresh.append(row)
+
+        if fresh:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", fresh)
+
+        return result
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> ImageSizeCache:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def cached_image_sizes(
+    image_paths: Sequence[str | Path | ZipMember],
+    cache_path: str | Path,
+    *,
+    threads: int = 1,
+    exif_orientation: bool = False,
+) -> list[tuple[int, int] | None]:
+    # ZIP members have no stable path or mtime to key on; they stay None and are read as usual.
+    on_disk = [i for i, p in enumerate(image_paths) if not isinstance(p, ZipMember)]
+
+    result: list[tuple[int, int] | None] = [None] * len(image_paths)
+    with ImageSizeCache(cache_path, exif_orientation=exif_orientation) as cache:
+        for i, info in zip(on_disk, cache.read_many([image_paths[i] for i in on_disk], threads=threads)):
+            if info is not None:
+                result[i] = info[:2]
+    return result
+
+
+def with_cached_image_sizes(
+    tasks: Sequence[Task],
+    cache_path: str | Path,
+    *,
+    threads: int = 1,
+    exif_orientation: bool = False,
+) -> list[Task]:
+    # For batch task tuples (image_path, ..., convert_kwargs): adds "image_size" to the kwargs of
+    # every image found in one bulk cache lookup, so workers never open those images.
+    # Batch callers pass their job count as threads, so cache misses are read in parallel as well.
+    sizes = cached_image_sizes(
+        [task[0] for task in tasks],
+        cache_path,
+        threads=threads,
+        exif_orientation=exif_orientation,
+    )
+    return [
+        (*task[:-1], {**task[-1], "image_size": size}) if size is not None else task
+        for task, size in zip(tasks, sizes)
+    ]
@@ -3,51 +3,242 @@
 
 from __future__ import annotations
 
-from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterable, Iterator, Mapping
 
-from get_image_size import read_image_size
-from xml_to_polygon import xml_to_class_polygon_arrays
+from conversion_stats import stage
+from get_image_size import IMAGE_EXTENSIONS, read_image_size
+from polygon_batch import PolygonBatch
+from xml_to_polygon import iter_class_polygon_arrays, xml_to_polygon_batch
+from zip_archive import ZipMember, as_source, is_zip_archive, iter_zip_members, relative_source_path
 
 
-def load_class_polygons_from_xml(input_xml_path: str | Path):
-    return xml_to_class_polygon_arrays(input_xml_path)
+ANNOTATION_SUFFIX = "_annotations.xml"
 
 
-def load_image_annotation_context(
-    image_path: str | Path,
-    annotation_xml_path: str | Path,
+def load_class_polygons_from_xml(
+    input_xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    polygon_options: Mapping[str, object] | None = None,
+) -> PolygonBatch:
+    # polygon_options are forwarded to xml_to_polygon_batch (e.g. bezier_flatness).
+    # The batch iterates as (class_name, polygon) pairs like the old list of tuples.
+    return xml_to_polygon_batch(input_xml_path, **(polygon_options or {}))
+
+
+def iter_class_polygons_from_xml(
+    input_xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    polygon_options: Mapping[str, object] | None = None,
+):
+    return iter_class_polygon_arrays(input_xml_path, **(polygon_options or {}))
+
+
+def load_image_context(
+    image_path: str | Path | ZipMember,
+    *,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
 ) -> dict[str, object]:
-    image_path = Path(image_path)
-    annotation_xml_path = Path(annotation_xml_path)
+    image_path = as_source(image_path)
 
-    width, height = read_image_size(image_path)
-    class_polygons = load_class_polygons_from_xml(annotation_xml_path)
+    # A known (width, height), e.g. from ImageSizeCache, skips opening the image.
+    # exif_orientation reports the displayed size of rotated JPEG/TIFF/WebP images (see read_image_info).
+    if image_size is not None:
+        width, height = image_size
+    else:
+        with stage("size_read"):
+            width, height = read_image_size(image_path, exif_orientation=exif_orientation)
+
+    folder = image_path.parent.name
+    if not folder and isinstance(image_path, ZipMember):
+        # Top-level archive members: the archive stands in for the directory.
+        folder = image_path.archive.stem
 
     return {
-        "class_polygons": class_polygons,
         "filename": image_path.name,
         "width": width,
         "height": height,
-        "folder": image_path.parent.name,
+        "folder": folder,
         "image_path": str(image_path.resolve()),
     }
 
 
-def discover_image_annotation_pairs(input_dir: str | Path) -> tuple[list[tuple[Path, Path]], list[Path]]:
+def load_image_annotation_context(
+    image_path: str | Path | ZipMember,
+    annotation_xml_path: str | Path | ZipMember,
+    *,
+    streaming: bool = False,
+    polygon_options: Mapping[str, object] | None = None,
+    image_size: tuple[int, int] | None = None,
+    exif_orientation: bool = False,
+) -> dict[str, object]:
+    context = load_image_context(image_path, image_size=image_size, exif_orientation=exif_orientation)
+
+    annotation_xml_path = as_source(annotation_xml_path)
+    if streaming:
+        # Lazily parsed: consume "class_polygons" exactly once.
+        class_polygons = iter_class_polygons_from_xml(annotation_xml_path, polygon_options=polygon_options)
+    else:
+        class_polygons = load_class_polygons_from_xml(annotation_xml_path, polygon_options=polygon_options)
+
+    return {"class_polygons": class_polygons, **context}
+
+
+def _scan_directory(directory: str) -> tuple[list[str], list[str], set[str]]:
+    # One scandir per directory: (image names, subdirectory names, every file name).
+    # DirEntry types come from the directory listing itself, so no per-file stat is needed.
+    image_names: list[str] = []
+    subdirectories: list[str] = []
+    file_names: set[str] = set()
+
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                elif entry.is_file():
+                    file_names.add(entry.name)
+                    if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                        image_names.append(entry.name)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+
+    return image_names, subdirectories, file_names
+
+
+def _iter_directory_pairs(input_dir: Path, threads: int) -> Iterator[tuple[Path, Path | None]]:
+    # Matches each <stem>_annotations.xml against the listing of the image's own directory.
+    # With threads > 1, subdirectories are listed ahead of the walk on a thread pool.
+    executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+    pending: dict[str, Future] = {}
+
+    def listing(directory: str) -> tuple[list[str], list[str], set[str]]:
+        future = pending.pop(directory, None)
+        result = future.result() if future is not None else _scan_directory(directory)
+        if executor is not None:
+            for name in result[1]:
+                child = os.path.join(directory, name)
+                pending[child] = executor.submit(_scan_directory, child)
+        return result
+
+    def walk(directory: Path) -> Iterator[tuple[Path, Path | None]]:
+        image_names, subdirectories, file_names = listing(str(directory))
+        children = set(subdirectories)
+
+        # Siblings in name order, descending into directories in place: the same order as sorted(rglob()).
+        for name in sorted(image_names + subdirectories):
+            if name in children:
+                yield from walk(directory / name)
+                continue
+
+            image_path = directory / name
+            annotation_name = f"{os.path.splitext(name)[0]}{ANNOTATION_SUFFIX}"
+            yield image_path, (directory / annotation_name if annotation_name in file_names else None)
+
+    try:
+        yield from walk(input_dir)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _match_annotation_members(
+    image_keys: Iterable[str],
+    members: Iterable[ZipMember],
+) -> dict[str, ZipMember]:
+    # Archive annotations by image key (relative image path without its suffix). Archives may wrap
+    # everything in extra folders ("delivery/sub/0001"), so one prefix of leading folders is stripped
+    # from every member: the prefix that lines up the most members with images, the shortest on a tie.
+    # Prefixes tied on both count and depth are all applied, and images that then receive more than
+    # one member are left out as ambiguous. No member is ever matched to two images.
+    image_keys = set(image_keys)
+    annotations: list[tuple[ZipMember, tuple[str, ...]]] = []
+    prefix_counts: dict[tuple[str, ...], int] = {}
+
+    for member in members:
+        if not member.member.endswith(ANNOTATION_SUFFIX):
+            continue
+        parts = PurePosixPath(member.member[: -len(ANNOTATION_SUFFIX)]).parts
+        annotations.append((member, parts))
+        for stripped in range(len(parts)):
+            if "/".join(parts[stripped:]) in image_keys:
+                prefix = parts[:stripped]
+                prefix_counts[prefix] = prefix_counts.get(prefix, 0) + 1
+
+    if not prefix_counts:
+        return {}
+
+    best = max(prefix_counts.values())
+    depth = min(len(prefix) for prefix, n in prefix_counts.items() if n == best)
+    prefixes = {prefix for prefix, n in prefix_counts.items() if n == best and len(prefix) == depth}
+
+    matched: dict[str, ZipMember | None] = {}
+    for member, parts in annotations:
+        if parts[:depth] not in prefixes:
+            continue
+        key = "/".join(parts[depth:])
+        if key in image_keys:
+            matched[key] = None if key in matched else member
+
+    return {key: member for key, member in matched.items() if member is not None}
+
+
+def iter_image_annotation_pairs(
+    input_dir: str | Path,
+    *,
+    threads: int = 1,
+    annotation_archive: str | Path | None = None,
+) -> Iterator[tuple[Path | ZipMember, Path | ZipMember | None]]:
+    # Yields (image, annotation_xml or None when it is missing) in sorted path order.
+    # input_dir may be a directory or a ZIP archive of images. Annotations come from annotation_archive
+    # (a delivered ZIP) when given, otherwise from next to the images (inside the same archive for a ZIP).
+    # Archive members are read from the central directory and streamed later; nothing is extracted.
     input_dir = Path(input_dir)
-
-    pairs: list[tuple[Path, Path]] = []
-    missing_annotations: list[Path] = []
-
-    image_paths = sorted(
-        p
-        for p in input_dir.rglob("*")
-        if p.is_file() and p.suffix.lower() in {".png", ".jpg", ".jpeg"}
+    images_in_archive = is_zip_archive(input_dir)
+
+    if annotation_archive is None and not images_in_archive:
+        yield from _iter_directory_pairs(input_dir, threads)
+        return
+
+    if images_in_archive:
+        members = list(iter_zip_members(input_dir))
+        images: list[Path | ZipMember] = sorted(
+            (m for m in members if m.suffix.lower() in IMAGE_EXTENSIONS),
+            key=lambda m: PurePosixPath(m.member).parts,
+        )
+    else:
+        members = []
+        images = [image_path for image_path, _ in _iter_directory_pairs(input_dir, threads)]
+
+    # The member prefix is chosen for the whole archive, so every image key is needed up front.
+    keys = [relative_source_path(image, input_dir).with_suffix("").as_posix() for image in images]
+    matched = _match_annotation_members(
+        keys,
+        iter_zip_members(annotation_archive) if annotation_archive is not None else members,
     )
 
-    for image_path in image_paths:
-        annotation_xml = image_path.with_name(f"{image_path.stem}_annotations.xml")
-        if annotation_xml.exists():
+    for image, key in zip(images, keys):
+        yield image, matched.get(key)
+
+
+def discover_image_annotation_pairs(
+    input_dir: str | Path,
+    *,
+    threads: int = 1,
+    annotation_archive: str | Path | None = None,
+) -> tuple[list[tuple[Path | ZipMember, Path | ZipMember]], list[Path | ZipMember]]:
+    pairs: list[tuple[Path | ZipMember, Path | ZipMember]] = []
+    missing_annotations: list[Path | ZipMember] = []
+
+    for image_path, annotation_xml in iter_image_annotation_pairs(
+        input_dir,
+        threads=threads,
+        annotation_archive=annotation_archive,
+    ):
+        if annotation_xml is not None:
             pairs.append((image_path, annotation_xml))
         else:
             missing_annotations.append(image_path)
@@ -56,6 +247,6 @@ def discover_image_annotation_pairs(input_dir: str | Path) -> tuple[list[tuple[P
 
 
 def discover_png_annotation_pairs(input_dir: str | Path) -> tuple[list[tuple[Path, Path]], list[Path]]:
-    # Backward-compatible alias. Discovery now includes PNG/JPEG.
+    # Backward-compatible alias. Discovery now includes every format in IMAGE_EXTENSIONS.
     return discover_image_annotation_pairs(input_dir)
 
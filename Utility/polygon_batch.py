@@ -0,0 +1,249 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
+
+# Shape-type codes stored per polygon; -1 marks an unknown or unset shape.
+SHAPE_TYPES = ("Point", "Polygon", "Rect", "RotatedRect", "Circle", "Ellipse", "Curve", "ClosedCurve")
+_SHAPE_CODES = {shape: code for code, shape in enumerate(SHAPE_TYPES)}
+
+# Pending polygons are packed into one array every this many appends while building.
+_BUILDER_CHUNK = 1024
+
+
+class PolygonView:
+    # One polygon of a PolygonBatch. Unpacks and indexes like the (class_name, polygon) tuples used
+    # elsewhere, and has the class_name/shape/polygon attributes of AnnotationPolygonItem.
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: PolygonBatch, index: int) -> None:
+        self.batch = batch
+        self.index = index
+
+    @property
+    def class_name(self) -> str:
+        return self.batch.class_name(self.index)
+
+    @property
+    def shape(self) -> str:
+        return self.batch.shape(self.index)
+
+    @property
+    def polygon(self) -> np.ndarray:
+        return self.batch.polygon(self.index)
+
+    def __iter__(self) -> Iterator[str | np.ndarray]:
+        yield self.class_name
+        yield self.polygon
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, k: int) -> str | np.ndarray:
+        return (self.class_name, self.polygon)[k]
+
+    def __repr__(self) -> str:
+        return f"PolygonView({self.class_name!r}, {self.shape!r}, {len(self.polygon)} points)"
+
+
+class PolygonBatch:
+    # All polygons of one annotation file in flat arrays:
+    #   coords       (N, 2) float64, every vertex back to back
+    #   offsets      (M + 1,) int64, polygon k is coords[offsets[k]:offsets[k + 1]]
+    #   class_ids    (M,) int32 into class_names (each name stored once)
+    #   shape_codes  (M,) int8 into SHAPE_TYPES
+    # Iterating yields PolygonView items, so a batch can be passed wherever a list of
+    # (class_name, polygon) tuples is accepted; polygons are views into coords, never copies.
+    __slots__ = ("coords", "offsets", "class_ids", "shape_codes", "class_names")
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        offsets: np.ndarray,
+        class_ids: np.ndarray,
+        shape_codes: np.ndarray,
+        class_names: Sequence[str],
+    ) -> None:
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32)
+        self.shape_codes = np.asarray(shape_codes, dtype=np.int8)
+        self.class_names = list(class_names)
+
+        count = len(self.class_ids)
+        if self.offsets.shape != (count + 1,) or self.shape_codes.shape != (count,):
+            raise ValueError("offsets must have one more entry than class_ids and shape_codes")
+        if count and (self.offsets[0] != 0 or self.offsets[-1] != len(self.coords)):
+            raise ValueError("offsets must start at 0 and end at the number of coordinates")
+
+    @classmethod
+    def empty(cls) -> PolygonBatch:
+        return cls(np.zeros((0, 2)), np.zeros(1, dtype=np.int64), np.zeros(0), np.zeros(0), [])
+
+    @classmethod
+    def from_class_polygons(
+        cls,
+        class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+        shapes: Iterable[str] | None = None,
+    ) -> PolygonBatch:
+        # From the (class_name, polygon) tuple format. Polygons that are consecutive views of
+        # one buffer (e.g. from to_class_polygons()) are taken over without copying.
+        builder = PolygonBatchBuilder()
+        shapes = iter(shapes) if shapes is not None else None
+        for class_name, polygon in class_polygons:
+            builder.append(class_name, next(shapes) if shapes is not None else "", polygon)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.class_ids)
+
+    def __iter__(self) -> Iterator[PolygonView]:
+        return (PolygonView(self, k) for k in range(len(self.class_ids)))
+
+    def __getitem__(self, k: int) -> PolygonView:
+        count = len(self.class_ids)
+        if k < 0:
+            k += count
+        if not 0 <= k < count:
+            raise IndexError("polygon index out of range")
+        return PolygonView(self, k)
+
+    def __repr__(self) -> str:
+        return f"PolygonBatch({len(self)} polygons, {len(self.coords)} points, {len(self.class_names)} classes)"
+
+    def polygon(self, k: int) -> np.ndarray:
+        return self.coords[self.offsets[k] : self.offsets[k + 1]]
+
+    def class_name(self, k: int) -> str:
+        return self.class_names[self.class_ids[k]]
+
+    def shape(self, k: int) -> str:
+        code = self.shape_codes[k]
+        return SHAPE_TYPES[code] if code >= 0 else ""
+
+    @property
+    def vertex_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def take(self, picks: Sequence[int] | np.ndarray) -> PolygonBatch:
+        # The polygons `picks` (in that order) as a new batch; coordinates are copied, names shared.
+        picks = np.asarray(picks, dtype=np.int64)
+        index, offsets = ragged_take(self.offsets, picks)
+        return PolygonBatch(self.coords[index], offsets, self.class_ids[picks], self.shape_codes[picks], self.class_names)
+
+    def to_class_polygons(self) -> list[tuple[str, np.ndarray]]:
+        # The (class_name, polygon) tuple format; every polygon is a view into coords.
+        names = self.class_names
+        coords = self.coords
+        bounds = self.offsets.tolist()
+        return [
+            (names[class_id], coords[bounds[k] : bounds[k + 1]])
+            for k, class_id in enumerate(self.class_ids.tolist())
+        ]
+
+
+def ragged_take(offsets: np.ndarray, picks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Vertex indices of polygons `picks` back to back, and the offsets of each pick in them.
+    lengths = offsets[picks + 1] - offsets[picks]
+    local = np.zeros(picks.shape[0] + 1, dtype=np.int64)
+    np.cumsum(lengths, out=local[1:])
+    index = np.arange(local[-1]) + np.repeat(offsets[picks] - local[:-1], lengths)
+    return index, local
+
+
+def _shared_buffer(polygons: list[np.ndarray]) -> np.ndarray | None:
+    # The (N, 2) span of one float64 buffer that holds these polygons back to back, if there is one.
+    # Empty polygons take no space (and their data pointer is not meaningful), so they are skipped.
+    polygons = [polygon for polygon in polygons if len(polygon)]
+    if not polygons:
+        return None
+
+    first = polygons[0]
+    if len(polygons) == 1 and first.dtype == np.float64 and first.flags.c_contiguous:
+        return first
+
+    base = first.base
+    if not isinstance(base, np.ndarray) or base.dtype != np.float64 or not base.flags.c_contiguous or base.size % 2:
+        return None
+
+    root = base.reshape(-1, 2)
+    row_bytes = root.strides[0]
+    root_address = root.__array_interface__["data"][0]
+    address = first.__array_interface__["data"][0]
+    if (address - root_address) % row_bytes:
+        return None
+
+    start = (address - root_address) // row_bytes
+    for polygon in polygons:
+        if (
+            polygon.base is not base
+            or polygon.dtype != np.float64
+            or not polygon.flags.c_contiguous
+            or polygon.__array_interface__["data"][0] != address
+        ):
+            return None
+        address += polygon.nbytes
+
+    return root[start : (address - root_address) // row_bytes]
+
+
+class PolygonBatchBuilder:
+    # Accumulates polygons and packs them into a PolygonBatch. Pending arrays are packed every
+    # _BUILDER_CHUNK appends, so building does not hold one small array per object, unless they
+    # are consecutive views of one buffer, which is then taken over as is.
+    __slots__ = ("_chunks", "_pending", "_shared", "_lengths", "_class_ids", "_shape_codes", "_class_index")
+
+    def __init__(self) -> None:
+        self._chunks: list[np.ndarray] = []
+        self._pending: list[np.ndarray] = []
+        self._shared = False
+        self._lengths: list[int] = []
+        self._class_ids: list[int] = []
+        self._shape_codes: list[int] = []
+        self._class_index: dict[str, int] = {}
+
+    def append(self, class_name: str, shape: str, polygon: Sequence[Sequence[float]] | np.ndarray) -> None:
+        arr = np.asarray(polygon, dtype=float)
+        if arr.size == 0:
+            arr = arr.reshape(0, 2)
+        if arr.ndim != 2 or arr.shape[1] != 2:
+            raise ValueError("polygon must be shape (N, 2)")
+
+        class_id = self._class_index.get(class_name)
+        if class_id is None:
+            class_id = self._class_index[class_name] = len(self._class_index)
+
+        self._pending.append(arr)
+        self._lengths.append(len(arr))
+        self._class_ids.append(class_id)
+        self._shape_codes.append(_SHAPE_CODES.get(shape, -1))
+
+        if len(self._pending) >= _BUILDER_CHUNK and not self._shared:
+            # Checked once, on the first full chunk; build() confirms it for the rest.
+            self._shared = not self._chunks and _shared_buffer(self._pending) is not None
+            if not self._shared:
+                self._pack()
+
+    def _pack(self) -> None:
+        if self._pending:
+            self._chunks.append(np.concatenate(self._pending))
+            self._pending = []
+
+    def build(self) -> PolygonBatch:
+        coords = _shared_buffer(self._pending) if self._pending and not self._chunks else None
+        if coords is None:
+            self._pack()
+            coords = np.concatenate(self._chunks) if self._chunks else np.zeros((0, 2))
+
+        offsets = np.zeros(len(self._lengths) + 1, dtype=np.int64)
+        np.cumsum(self._lengths, out=offsets[1:])
+        class_names = [""] * len(self._class_index)
+        for class_name, class_id in self._class_index.items():
+            class_names[class_id] = class_name
+
+        return PolygonBatch(coords, offsets, self._class_ids, self._shape_codes, class_names)
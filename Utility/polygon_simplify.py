@@ -0,0 +1,113 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+
+def remove_consecutive_duplicates(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    *,
+    closed: bool = True,
+) -> np.ndarray:
+    pts = np.asarray(polygon)
+    if pts.shape[0] < 2:
+        return pts.copy()
+
+    keep = np.ones(pts.shape[0], dtype=bool)
+    keep[1:] = np.any(pts[1:] != pts[:-1], axis=1)
+    pts = pts[keep]
+
+    # A ring that returns to its first vertex does not need the closing copy.
+    if closed and pts.shape[0] >= 2 and np.array_equal(pts[0], pts[-1]):
+        pts = pts[:-1]
+
+    return pts
+
+
+def _point_segment_distance(pts: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    ab = b - a
+    ap = pts - a
+    ab_len2 = np.einsum("ij,ij->i", ab, ab)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.einsum("ij,ij->i", ap, ab) / ab_len2
+    t = np.where(ab_len2 > 0.0, np.clip(t, 0.0, 1.0), 0.0)
+
+    d = ap - ab * t[:, None]
+    return np.sqrt(np.einsum("ij,ij->i", d, d))
+
+
+def _douglas_peucker_keep(pts: np.ndarray, starts: np.ndarray, ends: np.ndarray, tolerance: float) -> np.ndarray:
+    # Level-synchronous Ramer-Douglas-Peucker: every open range [start, end] is
+    # processed in the same vectorized pass, and each pass splits the ranges
+    # whose farthest interior vertex is more than `tolerance` away from the chord.
+    keep = np.zeros(pts.shape[0], dtype=bool)
+    keep[starts] = True
+    keep[ends] = True
+
+    while starts.shape[0] > 0:
+        interior = ends - starts - 1
+        active = interior > 0
+        starts, ends, interior = starts[active], ends[active], interior[active]
+        if starts.shape[0] == 0:
+            break
+
+        group = np.repeat(np.arange(starts.shape[0]), interior)
+        first = np.cumsum(interior) - interior
+        index = starts[group] + 1 + np.arange(group.shape[0]) - first[group]
+
+        dist = _point_segment_distance(pts[index], pts[starts[group]], pts[ends[group]])
+
+        # Farthest vertex of each range (first one on ties).
+        order = np.lexsort((-dist, group))
+        farthest = order[first]
+        split = dist[farthest] > tolerance
+
+        mid = index[farthest[split]]
+        keep[mid] = True
+
+        starts = np.concatenate((starts[split], mid))
+        ends = np.concatenate((mid, ends[split]))
+
+    return keep
+
+
+def simplify_polygon(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    tolerance: float,
+    *,
+    closed: bool = True,
+) -> np.ndarray:
+    if tolerance < 0.0:
+        raise ValueError("tolerance must be >= 0")
+
+    pts = remove_consecutive_duplicates(polygon, closed=closed)
+    n = pts.shape[0]
+    if n < 3:
+        return pts
+
+    work = pts.astype(float)
+
+    if closed:
+        # Split the ring at vertex 0 and the vertex farthest from it, then
+        # simplify both halves as open chains (index n stands for vertex 0 again).
+        ring = np.vstack((work, work[:1]))
+        offset = ring[1:n] - ring[0]
+        far = 1 + int(np.argmax(np.einsum("ij,ij->i", offset, offset)))
+        keep = _douglas_peucker_keep(ring, np.asarray([0, far]), np.asarray([far, n]), tolerance)[:n]
+
+        # A ring needs 3 vertices to keep an area: when only the split pair survives, also keep
+        # the vertex farthest from the chord between them.
+        if np.count_nonzero(keep) < 3:
+            chord = np.broadcast_to(work[[0, far]], (n, 2, 2))
+            dist = _point_segment_distance(work, chord[:, 0], chord[:, 1])
+            dist[[0, far]] = -1.0
+            keep[int(np.argmax(dist))] = True
+    else:
+        keep = _douglas_peucker_keep(work, np.asarray([0]), np.asarray([n - 1]), tolerance)
+
+    return pts[keep]
@@ -0,0 +1,164 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from polygon_batch import PolygonBatch
+from polygon_to_bbox_util import polygon_bounds
+from spatial_index import SpatialIndex
+
+
+@dataclass
+class TileOptions:
+    # Tile width/height in pixels (height None = square), overlap between neighbouring tiles,
+    # and whether tiles without any object still get an output.
+    width: int = 1024
+    height: int | None = None
+    overlap: int = 0
+    keep_empty: bool = False
+
+
+def tile_size(options: TileOptions) -> tuple[int, int]:
+    # (width, height) of a full tile; raises ValueError for invalid options.
+    tile_width = options.width
+    tile_height = options.height if options.height is not None else options.width
+    if tile_width < 1 or tile_height < 1:
+        raise ValueError("tile size must be >= 1")
+    if not 0 <= options.overlap < min(tile_width, tile_height):
+        raise ValueError("tile overlap must be >= 0 and smaller than the tile size")
+    return tile_width, tile_height
+
+
+def tile_grid(image_width: int, image_height: int, options: TileOptions) -> list[tuple[int, int, int, int]]:
+    # (x0, y0, width, height) of every tile, row by row. Along each axis the fewest tiles that
+    # keep at least `overlap` between neighbours are spread evenly from 0 to the image edge, so
+    # no tile is partial (unless the image is smaller than one tile) and none nearly repeats
+    # another.
+    tile_width, tile_height = tile_size(options)
+
+    def starts(size: int, tile: int) -> list[int]:
+        if size <= tile:
+            return [0]
+        count = -(-(size - options.overlap) // (tile - options.overlap))
+        return [k * (size - tile) // (count - 1) for k in range(count)]
+
+    return [
+        (x0, y0, min(tile_width, image_width), min(tile_height, image_height))
+        for y0 in starts(image_height, tile_height)
+        for x0 in starts(image_width, tile_width)
+    ]
+
+
+def _ring_prev(offsets: np.ndarray, count: int) -> np.ndarray:
+    # Predecessor of each vertex on its own ring.
+    prev = np.arange(-1, count - 1)
+    nonempty = offsets[1:] > offsets[:-1]
+    prev[offsets[:-1][nonempty]] = offsets[1:][nonempty] - 1
+    return prev
+
+
+def _clip_half_plane(
+    coords: np.ndarray,
+    offsets: np.ndarray,
+    axis: int,
+    bound: float,
+    keep_below: bool,
+) -> tuple[np.ndarray, np.ndarray]:
+    # One Sutherland-Hodgman pass over every ring at once, against coords[:, axis] <= bound
+    # (keep_below) or >= bound. Per edge prev -> cur: in/in emits cur, in/out the crossing,
+    # out/in the crossing and cur, out/out nothing.
+    values = coords[:, axis]
+    cur_in = values <= bound if keep_below else values >= bound
+    if np.all(cur_in):
+        return coords, offsets
+
+    prev = _ring_prev(offsets, coords.shape[0])
+    crossing = np.flatnonzero(cur_in != cur_in[prev])
+    counts = cur_in.astype(np.int64)
+    counts[crossing] += 1
+
+    slots = np.zeros(coords.shape[0] + 1, dtype=np.int64)
+    np.cumsum(counts, out=slots[1:])
+    out = np.empty((slots[-1], 2), dtype=float)
+
+    # Every kept vertex goes last in its slots, the crossing point (if any) first.
+    kept = np.flatnonzero(cur_in)
+    out[slots[kept + 1] - 1] = coords[kept]
+
+    # Only edges that cross (so prev and cur differ along axis) are divided.
+    a = coords[prev[crossing]]
+    b = coords[crossing]
+    t = (bound - a[:, axis]) / (b[:, axis] - a[:, axis])
+    hits = a + t[:, None] * (b - a)
+    hits[:, axis] = bound
+    out[slots[crossing]] = hits
+
+    return out, slots[offsets]
+
+
+def clip_polygons_to_rect(
+    coords: np.ndarray,
+    offsets: Sequence[int] | np.ndarray,
+    rect: tuple[float, float, float, float],
+) -> tuple[np.ndarray, np.ndarray]:
+    # Clips many ragged rings (polygon k is coords[offsets[k]:offsets[k + 1]]) to the closed
+    # rect (xmin, ymin, xmax, ymax). Polygons stay in place; fully outside ones become empty.
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    xmin, ymin, xmax, ymax = rect
+
+    for axis, bound, keep_below in ((0, xmin, False), (0, xmax, True), (1, ymin, False), (1, ymax, True)):
+        coords, offsets = _clip_half_plane(coords, offsets, axis, bound, keep_below)
+
+    return coords, offsets
+
+
+def iter_polygon_tiles(
+    batch: PolygonBatch,
+    image_width: int,
+    image_height: int,
+    options: TileOptions,
+) -> Iterator[tuple[tuple[int, int, int, int], PolygonBatch, np.ndarray]]:
+    # (tile, polygons clipped to the tile in tile coordinates, truncated flags) per tile.
+    # Candidates come from a bbox query on a spatial index; an object is truncated when it
+    # extends past its tile, and dropped from a tile it only touches along an edge.
+    index = SpatialIndex(batch)
+
+    for tile in tile_grid(image_width, image_height, options):
+        x0, y0, tile_width, tile_height = tile
+        rect = (float(x0), float(y0), float(x0 + tile_width), float(y0 + tile_height))
+
+        picks = index.query_window(*rect, exact=False)
+        bounds = index.bounds[picks]
+        truncated = (
+            (bounds[:, 0] < rect[0]) | (bounds[:, 1] < rect[1]) | (bounds[:, 2] > rect[2]) | (bounds[:, 3] > rect[3])
+        )
+
+        # Only objects crossing the border are clipped; both groups are merged back in file order.
+        inside = batch.take(picks[~truncated])
+        cut = batch.take(picks[truncated])
+        cut_coords, cut_offsets = clip_polygons_to_rect(cut.coords, cut.offsets, rect)
+
+        clipped = polygon_bounds(cut_coords, cut_offsets)
+        keep_cut = (cut_offsets[1:] > cut_offsets[:-1]) & (clipped[:, 2] > clipped[:, 0]) & (clipped[:, 3] > clipped[:, 1])
+
+        merged = PolygonBatch(
+            np.concatenate((inside.coords, cut_coords)) - (x0, y0),
+            np.concatenate((inside.offsets, cut_offsets[1:] + inside.offsets[-1])),
+            np.concatenate((inside.class_ids, cut.class_ids)),
+            np.concatenate((inside.shape_codes, cut.shape_codes)),
+            batch.class_names,
+        )
+        positions = np.concatenate((np.flatnonzero(~truncated), np.flatnonzero(truncated)[keep_cut]))
+        merged_index = np.concatenate((np.arange(len(inside)), len(inside) + np.flatnonzero(keep_cut)))
+        order = np.argsort(positions, kind="stable")
+        tile_batch = merged.take(merged_index[order])
+        truncated = truncated[np.sort(positions)]
+
+        if len(tile_batch) or options.keep_empty:
+            yield tile, tile_batch, truncated
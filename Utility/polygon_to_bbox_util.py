@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import Sequence
+from typing import Iterable, Sequence
 
 import numpy as np
 
@@ -79,3 +79,111 @@ def polygon_to_voc_polygon(
         pts[:, 1] = np.clip(pts[:, 1], 0.0, float(image_height - 1))
 
     return np.rint(pts).astype(int)
+
+
+def pack_polygons(polygons: Iterable[Sequence[Sequence[float]] | np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    # Flat (N, 2) coords + (M + 1,) offsets for the batch functions below, with the checks of
+    # _ensure_polygon_array applied to every polygon.
+    arrays = [_ensure_polygon_array(polygon) for polygon in polygons]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([arr.shape[0] for arr in arrays], out=offsets[1:])
+    coords = np.concatenate(arrays) if arrays else np.zeros((0, 2), dtype=float)
+    return coords, offsets
+
+
+def _ensure_ragged(coords: np.ndarray, offsets: Sequence[int] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    coords = np.asarray(coords, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError("coords must be shape (N, 2)")
+    if offsets.ndim != 1 or offsets.shape[0] < 1 or offsets[0] != 0 or offsets[-1] != coords.shape[0]:
+        raise ValueError("offsets must start at 0 and end at the number of coordinates")
+    if np.any(offsets[1:] <= offsets[:-1]):
+        raise ValueError("polygon must contain at least one point")
+    return coords, offsets
+
+
+def _clamp(values: np.ndarray, upper: float) -> np.ndarray:
+    # max(lower, min(v, upper)) as in the scalar code: NaN becomes 0 and upper < 0 gives 0.
+    return np.fmax(0.0, np.minimum(values, upper))
+
+
+def polygon_bounds(coords: np.ndarray, offsets: Sequence[int] | np.ndarray) -> np.ndarray:
+    # Unclipped float (xmin, ymin, xmax, ymax) of many ragged polygons; empty polygons get NaN rows.
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    nonempty = offsets[1:] > offsets[:-1]
+
+    bounds = np.full((offsets.shape[0] - 1, 4), np.nan)
+    if np.any(nonempty):
+        starts = offsets[:-1][nonempty]
+        bounds[nonempty, :2] = np.minimum.reduceat(coords, starts, axis=0)
+        bounds[nonempty, 2:] = np.maximum.reduceat(coords, starts, axis=0)
+    return bounds
+
+
+def polygons_to_bboxes(
+    coords: np.ndarray,
+    offsets: Sequence[int] | np.ndarray,
+    *,
+    image_width: int | None = None,
+    image_height: int | None = None,
+    min_size: int = 1,
+) -> np.ndarray:
+    # polygon_to_bbox of many ragged polygons at once: polygon k is coords[offsets[k]:offsets[k + 1]].
+    # Returns (M, 4) int64 rows of (xmin, ymin, xmax, ymax), equal to the scalar results.
+    coords, offsets = _ensure_ragged(coords, offsets)
+    if offsets.shape[0] == 1:
+        return np.zeros((0, 4), dtype=np.int64)
+
+    bounds = polygon_bounds(coords, offsets)
+
+    columns = []
+    for axis, size in ((0, image_width), (1, image_height)):
+        vmin = bounds[:, axis]
+        vmax = bounds[:, axis + 2]
+        if size is not None:
+            vmin = _clamp(vmin, float(size - 1))
+            vmax = _clamp(vmax, float(size - 1))
+
+        vmin = np.floor(vmin)
+        vmax = np.ceil(vmax)
+        if not (np.all(np.isfinite(vmin)) and np.all(np.isfinite(vmax))):
+            raise ValueError("polygon coordinates must be finite")
+        imin = vmin.astype(np.int64)
+        imax = vmax.astype(np.int64)
+
+        imax = np.where(imax <= imin, imin + max(1, min_size), imax)
+
+        if size is not None:
+            imin = np.maximum(0, np.minimum(imin, size - 1))
+            imax = np.maximum(1, np.minimum(imax, size))
+            empty = imax <= imin
+            if np.any(empty):
+                fixed = np.maximum(0, np.minimum(imin - 1, size - 1))
+                imin = np.where(empty, fixed, imin)
+                imax = np.where(empty, np.minimum(size, fixed + 1), imax)
+
+        columns.append((imin, imax))
+
+    (xmin, xmax), (ymin, ymax) = columns
+    return np.column_stack((xmin, ymin, xmax, ymax))
+
+
+def polygons_to_voc_polygons(
+    coords: np.ndarray,
+    offsets: Sequence[int] | np.ndarray,
+    *,
+    image_width: int | None = None,
+    image_height: int | None = None,
+) -> np.ndarray:
+    # polygon_to_voc_polygon of many ragged polygons at once; the result keeps the same offsets.
+    coords, _ = _ensure_ragged(coords, offsets)
+    pts = coords.copy()
+
+    if image_width is not None:
+        pts[:, 0] = np.clip(pts[:, 0], 0.0, float(image_width - 1))
+    if image_height is not None:
+        pts[:, 1] = np.clip(pts[:, 1], 0.0, float(image_height - 1))
+
+    return np.rint(pts).astype(int)
@@ -0,0 +1,165 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+from polygon_to_bbox_util import polygon_to_bbox
+from polygon_to_mask import paint_polygon
+
+
+COCO_SEGMENTATIONS = ("polygon", "rle")
+
+
+def polygon_areas(coords: np.ndarray, offsets: Sequence[int] | np.ndarray) -> np.ndarray:
+    # Shoelace area of many ragged polygons at once: polygon k is coords[offsets[k]:offsets[k + 1]].
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+
+    if coords.shape[0] == 0:
+        return np.zeros(lengths.shape[0], dtype=float)
+
+    # Successor of each vertex, wrapping to the first vertex of its own polygon.
+    index = np.arange(coords.shape[0])
+    next_index = index + 1
+    ends = offsets[1:][lengths > 0]
+    next_index[ends - 1] = offsets[:-1][lengths > 0]
+
+    x = coords[:, 0]
+    y = coords[:, 1]
+    cross = x * y[next_index] - x[next_index] * y
+
+    # reduceat needs valid start indices, so empty polygons are summed separately as 0.
+    sums = np.zeros(lengths.shape[0], dtype=float)
+    nonempty = lengths > 0
+    sums[nonempty] = np.add.reduceat(cross, offsets[:-1][nonempty])
+
+    return np.abs(sums) * 0.5
+
+
+def polygon_area(polygon: Sequence[Sequence[float]] | np.ndarray) -> float:
+    pts = np.asarray(polygon, dtype=float).reshape(-1, 2)
+    return float(polygon_areas(pts, [0, pts.shape[0]])[0])
+
+
+def coco_bbox(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    *,
+    image_width: int,
+    image_height: int,
+) -> list[int]:
+    # COCO [x, y, width, height], from the same integer box that the VOC export uses.
+    xmin, ymin, xmax, ymax = polygon_to_bbox(polygon, image_width=image_width, image_height=image_height)
+    return [xmin, ymin, xmax - xmin, ymax - ymin]
+
+
+def coco_polygon(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    *,
+    image_width: int,
+    image_height: int,
+    decimals: int = 2,
+) -> list[float]:
+    # Flat [x1, y1, x2, y2, ...] clipped to the image; COCO needs at least 3 vertices,
+    # so points and segments fall back to their bounding box.
+    pts = np.asarray(polygon, dtype=float).reshape(-1, 2)
+    if pts.shape[0] < 3:
+        x, y, w, h = coco_bbox(pts, image_width=image_width, image_height=image_height)
+        pts = np.asarray([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=float)
+
+    pts = np.column_stack(
+        (
+            np.clip(pts[:, 0], 0.0, float(image_width)),
+            np.clip(pts[:, 1], 0.0, float(image_height)),
+        )
+    )
+    return np.round(pts, decimals).reshape(-1).tolist()
+
+
+def polygon_rle_counts(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    width: int,
+    height: int,
+) -> tuple[list[int], int]:
+    # Uncompressed COCO RLE (column-major runs, starting with background) of one filled polygon,
+    # and its pixel area. Only the polygon's bounding box is rasterized.
+    pts = np.asarray(polygon, dtype=float).reshape(-1, 2)
+    total = width * height
+
+    if pts.shape[0] == 0 or total == 0:
+        return [total], 0
+
+    x0 = max(0, int(np.floor(np.min(pts[:, 0]))))
+    y0 = max(0, int(np.floor(np.min(pts[:, 1]))))
+    x1 = min(width, int(np.ceil(np.max(pts[:, 0]))) + 1)
+    y1 = min(height, int(np.ceil(np.max(pts[:, 1]))) + 1)
+    if x1 <= x0 or y1 <= y0:
+        return [total], 0
+
+    # Pixel centers move by whole pixels, so the crop rasterizes exactly like the full image.
+    crop = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    paint_polygon(crop, 0, pts - (x0, y0), 1)
+
+    # Column-major transitions inside the crop, padded so every run opens and closes.
+    columns = np.zeros((x1 - x0, y1 - y0 + 2), dtype=np.int8)
+    columns[:, 1:-1] = crop.T
+    column, row = np.nonzero(np.diff(columns, axis=1))
+
+    # Global column-major index of every run boundary; runs ending at the bottom of one column
+    # and starting at the top of the next are merged.
+    bounds = (x0 + column) * height + y0 + row
+    starts = bounds[0::2]
+    stops = bounds[1::2]
+    if starts.shape[0] == 0:
+        return [total], 0
+
+    joined = starts[1:] == stops[:-1]
+    starts = np.concatenate((starts[:1], starts[1:][~joined]))
+    stops = np.concatenate((stops[:-1][~joined], stops[-1:]))
+
+    edges = np.empty(starts.shape[0] * 2 + 2, dtype=np.int64)
+    edges[0] = 0
+    edges[1:-1:2] = starts
+    edges[2:-1:2] = stops
+    edges[-1] = total
+    counts = np.diff(edges)
+
+    # A trailing empty background run is not written.
+    if counts[-1] == 0:
+        counts = counts[:-1]
+
+    return counts.tolist(), int(np.sum(stops - starts))
+
+
+def rle_counts_to_string(counts: Sequence[int]) -> str:
+    # COCO compressed RLE: each count (after the first two, as a delta to the count two back)
+    # in little-endian 5-bit groups with a continuation bit, offset into printable ASCII.
+    chars: list[str] = []
+    for i, count in enumerate(counts):
+        x = int(count)
+        if i > 2:
+            x -= int(counts[i - 2])
+
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+
+    return "".join(chars)
+
+
+def polygon_to_rle(
+    polygon: Sequence[Sequence[float]] | np.ndarray,
+    width: int,
+    height: int,
+) -> tuple[dict[str, object], int]:
+    counts, area = polygon_rle_counts(polygon, width, height)
+    return {"size": [int(height), int(width)], "counts": rle_counts_to_string(counts)}, area
@@ -0,0 +1,321 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import struct
+from typing import Iterable, Iterator, Mapping, Sequence
+import zlib
+
+import numpy as np
+
+from get_image_size import PNG_SIGNATURE
+
+
+MASK_MODES = ("merged", "per_class", "instance")
+BAND_HEIGHT = 1024
+
+
+def _polygon_spans(
+    polygon: np.ndarray,
+    row_start: int,
+    row_stop: int,
+    width: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Even-odd scanline fill of one polygon over rows [row_start, row_stop).
+    # Pixel (x, y) is inside when its center (x + 0.5, y + 0.5) is; edges are half-open in y
+    # so every scanline meets an even number of crossings.
+    # Returns (rows, x_begin, x_end) spans with x_end exclusive.
+    x0 = polygon[:, 0]
+    y0 = polygon[:, 1]
+    x1 = np.roll(x0, -1)
+    y1 = np.roll(y0, -1)
+
+    sloped = y0 != y1
+    x0, y0, x1, y1 = x0[sloped], y0[sloped], x1[sloped], y1[sloped]
+
+    first_row = np.ceil(np.minimum(y0, y1) - 0.5).astype(np.int64)
+    stop_row = np.ceil(np.maximum(y0, y1) - 0.5).astype(np.int64)
+    first_row = np.maximum(first_row, row_start)
+    stop_row = np.minimum(stop_row, row_stop)
+    counts = np.maximum(stop_row - first_row, 0)
+
+    edge = np.repeat(np.arange(counts.shape[0]), counts)
+    rows = first_row[edge] + np.arange(edge.shape[0]) - (np.cumsum(counts) - counts)[edge]
+
+    yc = rows + 0.5
+    xs = x0[edge] + (yc - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+
+    order = np.lexsort((xs, rows))
+    rows = rows[order][0::2]
+    xs = xs[order]
+
+    x_begin = np.clip(np.ceil(xs[0::2] - 0.5), 0, width).astype(np.int64)
+    x_end = np.clip(np.ceil(xs[1::2] - 0.5), 0, width).astype(np.int64)
+
+    valid = x_end > x_begin
+    return rows[valid], x_begin[valid], x_end[valid]
+
+
+def paint_polygon(band: np.ndarray, row_start: int, polygon: np.ndarray, value: int) -> None:
+    # Fills one polygon into band, a (rows, width) slice of a mask whose first row is image row
+    # row_start, with the same pixel-center rule as the mask export (in place).
+    height, width = band.shape
+    row_stop = row_start + height
+
+    if polygon.shape[0] < 3:
+        # Points and segments have no area: mark the pixels under their vertices.
+        px = np.floor(polygon[:, 0]).astype(np.int64)
+        py = np.floor(polygon[:, 1]).astype(np.int64)
+        inside = (px >= 0) & (px < width) & (py >= row_start) & (py < row_stop)
+        band[py[inside] - row_start, px[inside]] = value
+        return
+
+    rows, x_begin, x_end = _polygon_spans(polygon, row_start, row_stop, width)
+    lengths = x_end - x_begin
+    if lengths.shape[0] == 0:
+        return
+
+    # Flat pixel indices of every span; spans of one polygon never overlap.
+    span = np.repeat(np.arange(lengths.shape[0]), lengths)
+    local = np.arange(span.shape[0]) - (np.cumsum(lengths) - lengths)[span]
+    flat = (rows[span] - row_start) * width + x_begin[span] + local
+    band.reshape(-1)[flat] = value
+
+
+def _polygon_row_ranges(polygons: Sequence[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    # Rows that each polygon can touch, for skipping polygons outside a band.
+    low = np.empty(len(polygons), dtype=np.int64)
+    high = np.empty(len(polygons), dtype=np.int64)
+    for k, polygon in enumerate(polygons):
+        if polygon.shape[0] == 0:
+            low[k], high[k] = 0, -1
+            continue
+        low[k] = int(np.floor(np.min(polygon[:, 1]) - 0.5))
+        high[k] = int(np.ceil(np.max(polygon[:, 1])))
+    return low, high
+
+
+def mask_class_ids(class_names: Iterable[str]) -> dict[str, int]:
+    # Merged-mask label values: 0 is background, classes are numbered from 1 in the given order.
+    return {name: i for i, name in enumerate(dict.fromkeys(class_names), start=1)}
+
+
+def iter_mask_bands(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    width: int,
+    height: int,
+    *,
+    mode: str = "merged",
+    class_ids: Mapping[str, int] | None = None,
+    band_height: int = BAND_HEIGHT,
+) -> Iterator[tuple[int, np.ndarray | dict[str, np.ndarray]]]:
+    # Yields (row_start, band) top to bottom; only one band of rows is allocated at a time.
+    #   merged:    class label per pixel (later objects paint over earlier ones)
+    #   per_class: {class_name: 0/255 band}
+    #   instance:  1-based object index per pixel
+    if mode not in MASK_MODES:
+        raise ValueError(f"Unsupported mask mode: {mode}")
+    if band_height < 1:
+        raise ValueError("band_height must be >= 1")
+
+    items = [(class_name, np.asarray(polygon, dtype=float).reshape(-1, 2)) for class_name, polygon in class_polygons]
+    polygons = [polygon for _, polygon in items]
+    low, high = _polygon_row_ranges(polygons)
+
+    if mode == "merged":
+        if class_ids is None:
+            class_ids = mask_class_ids(class_name for class_name, _ in items)
+        unknown = sorted({class_name for class_name, _ in items} - set(class_ids))
+        if unknown:
+            raise ValueError(f"No mask label for classes: {unknown}")
+        values = [class_ids[class_name] for class_name, _ in items]
+        dtype = np.uint8 if max(class_ids.values(), default=0) <= 0xFF else np.uint16
+    elif mode == "instance":
+        values = list(range(1, len(items) + 1))
+        dtype = np.uint8 if len(items) <= 0xFF else np.uint16
+        if len(items) > 0xFFFF:
+            raise ValueError("instance masks support at most 65535 objects")
+    else:
+        class_names = list(dict.fromkeys(class_name for class_name, _ in items))
+
+    for row_start in range(0, height, band_height):
+        row_stop = min(height, row_start + band_height)
+        in_band = np.flatnonzero((high >= row_start) & (low < row_stop))
+
+        if mode == "per_class":
+            bands = {name: np.zeros((row_stop - row_start, width), dtype=np.uint8) for name in class_names}
+            for k in in_band:
+                paint_polygon(bands[items[k][0]], row_start, polygons[k], 0xFF)
+            yield row_start, bands
+            continue
+
+        band = np.zeros((row_stop - row_start, width), dtype=dtype)
+        for k in in_band:
+            paint_polygon(band, row_start, polygons[k], values[k])
+        yield row_start, band
+
+
+def rasterize_mask(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    width: int,
+    height: int,
+    *,
+    mode: str = "merged",
+    class_ids: Mapping[str, int] | None = None,
+) -> np.ndarray | dict[str, np.ndarray]:
+    # Whole-image variant of iter_mask_bands, for images that comfortably fit in memory.
+    bands = [band for _, band in iter_mask_bands(class_polygons, width, height, mode=mode, class_ids=class_ids)]
+
+    if mode == "per_class":
+        names = bands[0].keys() if bands else []
+        return {name: np.vstack([band[name] for band in bands]) for name in names}
+    if not bands:
+        return np.zeros((0, width), dtype=np.uint8)
+    return np.vstack(bands)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+class PngGrayWriter:
+    # Row-streaming grayscale PNG writer (8 or 16 bit), so masks never need to be held whole.
+
+    def __init__(self, path: str | Path, width: int, height: int, bit_depth: int = 8) -> None:
+        if bit_depth not in (8, 16):
+            raise ValueError("bit_depth must be 8 or 16")
+
+        self.path = Path(path)
+        self.width = width
+        self.height = height
+        self.bit_depth = bit_depth
+        self.rows_written = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("wb")
+        self._compressor = zlib.compressobj(6)
+
+        self._file.write(PNG_SIGNATURE)
+        self._file.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, 0, 0, 0, 0)))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows)
+        if rows.ndim != 2 or rows.shape[1] != self.width:
+            raise ValueError("rows must be shape (N, width)")
+
+        dtype = ">u1" if self.bit_depth == 8 else ">u2"
+        pixels = rows.astype(dtype, copy=False).view(np.uint8).reshape(rows.shape[0], -1)
+
+        # Filter type 0 (None) in front of every scanline.
+        scanlines = np.zeros((rows.shape[0], pixels.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 1:] = pixels
+
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._file.write(_png_chunk(b"IDAT", data))
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG expects {self.height} rows, got {self.rows_written}: {self.path}")
+            self._file.write(_png_chunk(b"IDAT", self._compressor.flush()))
+            self._file.write(_png_chunk(b"IEND", b""))
+        finally:
+            self._file.close()
+
+    def __enter__(self) -> PngGrayWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self._file.close()
+            self.path.unlink(missing_ok=True)
+            return
+        self.close()
+
+
+def _mask_bit_depth(max_value: int) -> int:
+    return 8 if max_value <= 0xFF else 16
+
+
+def _class_file_stem(class_name: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in class_name)
+    return safe or "_"
+
+
+def _class_file_stems(class_names: Sequence[str]) -> list[str]:
+    # File-safe stem per class, unique even on case-insensitive file systems: a name that maps
+    # onto an earlier stem (e.g. "a b" after "a_b") gets _2, _3, ... appended.
+    stems: list[str] = []
+    taken: set[str] = set()
+    for class_name in class_names:
+        base = _class_file_stem(class_name)
+        stem = base
+        suffix = 2
+        while stem.casefold() in taken:
+            stem = f"{base}_{suffix}"
+            suffix += 1
+        taken.add(stem.casefold())
+        stems.append(stem)
+    return stems
+
+
+def save_mask_png(
+    class_polygons: Iterable[tuple[str, Sequence[Sequence[float]] | np.ndarray]],
+    output_path: str | Path,
+    width: int,
+    height: int,
+    *,
+    mode: str = "merged",
+    class_ids: Mapping[str, int] | None = None,
+    band_height: int = BAND_HEIGHT,
+) -> list[Path]:
+    # merged/instance write output_path; per_class writes <stem>_<class>.png next to it.
+    output_path = Path(output_path)
+    class_polygons = list(class_polygons)
+
+    if mode == "merged" and class_ids is None:
+        class_ids = mask_class_ids(class_name for class_name, _ in class_polygons)
+
+    bands = iter_mask_bands(
+        class_polygons,
+        width,
+        height,
+        mode=mode,
+        class_ids=class_ids,
+        band_height=band_height,
+    )
+
+    if mode == "per_class":
+        class_names = list(dict.fromkeys(class_name for class_name, _ in class_polygons))
+        paths = [output_path.with_name(f"{output_path.stem}_{stem}.png") for stem in _class_file_stems(class_names)]
+        if len({str(path).casefold() for path in paths}) != len(paths):
+            raise ValueError(f"per-class mask file names collide: {[path.name for path in paths]}")
+        writers = [PngGrayWriter(path, width, height) for path in paths]
+        try:
+            for _, band in bands:
+                for name, writer in zip(class_names, writers):
+                    writer.write_rows(band[name])
+        except BaseException:
+            for writer in writers:
+                writer.__exit__(Exception, None, None)
+            raise
+        for writer in writers:
+            writer.close()
+        return paths
+
+    if mode == "merged":
+        max_value = max(class_ids.values(), default=0)
+    else:
+        max_value = len(class_polygons)
+
+    with PngGrayWriter(output_path, width, height, bit_depth=_mask_bit_depth(max_value)) as writer:
+        for _, band in bands:
+            writer.write_rows(band)
+
+    return [output_path]
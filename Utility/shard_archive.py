@@ -0,0 +1,169 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import io
+import json
+import os
+from pathlib import Path
+import tarfile
+import threading
+import time
+from typing import IO
+import zipfile
+
+
+SHARD_FORMATS = ("tar", "zip")
+SHARD_INDEX_SUFFIX = ".index.json"
+
+
+@dataclass
+class ShardOptions:
+    # Archive format, soft size limit of each shard in bytes, and the shard file name prefix.
+    format: str = "tar"
+    max_bytes: int = 256 << 20
+    prefix: str = "pascal_voc"
+
+
+def shard_name(prefix: str, number: int, format: str) -> str:
+    return f"{prefix}-{number:05d}.{format}"
+
+
+def shard_index_path(shard_path: str | Path) -> Path:
+    shard_path = Path(shard_path)
+    return shard_path.with_name(shard_path.name + SHARD_INDEX_SUFFIX)
+
+
+def _replace_atomic(tmp_path: Path, path: Path) -> None:
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class ShardWriter:
+    # Appends records to numbered tar/zip shards as a stream, starting a new shard once the current
+    # one would grow past max_bytes (a single larger record still gets a shard of its own).
+    # Every shard gets <shard>.index.json mapping record keys to the member name and the offset/size
+    # of its data in the shard; members are stored uncompressed, so a record is one seek + read.
+    # add() is thread-safe; records keep the order they were added in.
+
+    def __init__(self, output_dir: str | Path, options: ShardOptions | None = None) -> None:
+        self.options = options if options is not None else ShardOptions()
+        if self.options.format not in SHARD_FORMATS:
+            raise ValueError(f"unknown shard format: {self.options.format} (expected one of {SHARD_FORMATS})")
+        if self.options.max_bytes < 1:
+            raise ValueError("max_bytes must be >= 1")
+
+        self.output_dir = Path(output_dir)
+        self.shards: list[Path] = []
+
+        self._lock = threading.Lock()
+        self._mtime = int(time.time())
+        self._path: Path | None = None
+        self._file: IO[bytes] | None = None
+        self._archive: tarfile.TarFile | zipfile.ZipFile | None = None
+        self._records: dict[str, dict[str, object]] = {}
+
+    def _tmp_path(self, path: Path) -> Path:
+        return path.with_name(path.name + ".tmp")
+
+    def _open_shard(self) -> None:
+        self._path = self.output_dir / shard_name(self.options.prefix, len(self.shards), self.options.format)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._tmp_path(self._path).open("wb")
+
+        if self.options.format == "tar":
+            self._archive = tarfile.open(fileobj=self._file, mode="w", format=tarfile.PAX_FORMAT)
+        else:
+            self._archive = zipfile.ZipFile(self._file, mode="w", compression=zipfile.ZIP_STORED)
+        self._records = {}
+
+    def _close_shard(self) -> None:
+        self._archive.close()
+        self._file.close()
+        _replace_atomic(self._tmp_path(self._path), self._path)
+
+        index_path = shard_index_path(self._path)
+        index = {"shard": self._path.name, "format": self.options.format, "records": self._records}
+        self._tmp_path(index_path).write_text(json.dumps(index, indent=1, ensure_ascii=False), encoding="utf-8")
+        _replace_atomic(self._tmp_path(index_path), index_path)
+
+        self.shards.append(self._path)
+        self._path, self._file, self._archive = None, None, None
+
+    def add(self, key: str, member: str, data: bytes) -> Path:
+        # Appends one record and returns the shard it went into.
+        with self._lock:
+            if self._archive is not None and self._records and self._file.tell() + len(data) > self.options.max_bytes:
+                self._close_shard()
+            if self._archive is None:
+                self._open_shard()
+
+            if self.options.format == "tar":
+                info = tarfile.TarInfo(member)
+                info.size = len(data)
+                info.mtime = self._mtime
+                self._archive.addfile(info, io.BytesIO(data))
+                # addfile pads the data to whole 512-byte blocks.
+                padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                offset = self._file.tell() - padded
+            else:
+                info = zipfile.ZipInfo(member, date_time=time.localtime(self._mtime)[:6])
+                info.external_attr = 0o644 << 16
+                self._archive.writestr(info, data)
+                offset = self._file.tell() - len(data)
+
+            self._records[key] = {"member": member, "offset": offset, "size": len(data)}
+            return self._path
+
+    def close(self) -> None:
+        with self._lock:
+            if self._archive is not None:
+                self._close_shard()
+
+            # Shards left over from an earlier, longer run would otherwise look like part of this one.
+            number = len(self.shards)
+            while True:
+                leftover = self.output_dir / shard_name(self.options.prefix, number, self.options.format)
+                if not leftover.exists():
+                    break
+                leftover.unlink()
+                shard_index_path(leftover).unlink(missing_ok=True)
+                number += 1
+
+    def abort(self) -> None:
+        # Drops the shard being written; shards already closed are kept.
+        with self._lock:
+            if self._archive is not None:
+                self._file.close()
+                self._tmp_path(self._path).unlink(missing_ok=True)
+                self._path, self._file, self._archive = None, None, None
+
+    def __enter__(self) -> ShardWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def load_shard_index(shard_path: str | Path) -> dict[str, dict[str, object]]:
+    return json.loads(shard_index_path(shard_path).read_text(encoding="utf-8"))["records"]
+
+
+def read_shard_record(
+    shard_path: str | Path,
+    key: str,
+    index: dict[str, dict[str, object]] | None = None,
+) -> bytes:
+    # One record by key, read with a single seek (pass a loaded index to skip re-reading it).
+    record = (index if index is not None else load_shard_index(shard_path))[key]
+    with Path(shard_path).open("rb") as f:
+        f.seek(int(record["offset"]))
+        return f.read(int(record["size"]))
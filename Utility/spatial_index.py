@@ -0,0 +1,341 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Mapping
+
+import numpy as np
+
+from load_annotation import discover_image_annotation_pairs, load_class_polygons_from_xml
+from polygon_batch import PolygonBatch, ragged_take
+from polygon_to_bbox_util import polygon_bounds
+from zip_archive import ZipMember, source_stamp
+
+
+SPATIAL_INDEX_SUFFIX = ".sindex.npz"
+SPATIAL_INDEX_VERSION = 1
+NODE_SIZE = 16
+
+
+def spatial_index_path(xml_path: str | Path) -> Path:
+    xml_path = Path(xml_path)
+    return xml_path.with_name(xml_path.name + SPATIAL_INDEX_SUFFIX)
+
+
+def _sort_tile_recursive(centers: np.ndarray, node_size: int) -> np.ndarray:
+    # STR packing order: sqrt(n / node_size) vertical slabs by x, each sorted by y, so
+    # consecutive runs of node_size entries are spatially compact.
+    count = centers.shape[0]
+    leaves = -(-count // node_size)
+    slab_size = node_size * max(1, int(np.ceil(np.sqrt(leaves))))
+
+    slabs = np.empty(count, dtype=np.int64)
+    slabs[np.argsort(centers[:, 0], kind="stable")] = np.arange(count) // slab_size
+    return np.lexsort((centers[:, 1], slabs))
+
+
+def _pack_levels(boxes: np.ndarray, node_size: int) -> list[np.ndarray]:
+    # levels[0] are the sorted item boxes; node j of level l + 1 bounds entries
+    # [j * node_size, (j + 1) * node_size) of level l. The last level has at most node_size nodes.
+    levels = [boxes]
+    while levels[-1].shape[0] > node_size:
+        below = levels[-1]
+        starts = np.arange(0, below.shape[0], node_size)
+        levels.append(
+            np.column_stack(
+                (
+                    np.minimum.reduceat(below[:, :2], starts, axis=0),
+                    np.maximum.reduceat(below[:, 2:], starts, axis=0),
+                )
+            )
+        )
+    return levels
+
+
+def _segments_hit_window(a: np.ndarray, b: np.ndarray, window: np.ndarray) -> np.ndarray:
+    # Liang-Barsky: does segment a -> b meet the closed window? Zero-length segments and
+    # zero-size windows (point queries) are handled by the same test.
+    t0 = np.zeros(a.shape[0])
+    t1 = np.ones(a.shape[0])
+    hit = np.ones(a.shape[0], dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for axis in (0, 1):
+            p = a[:, axis]
+            d = b[:, axis] - p
+            lo = window[axis]
+            hi = window[axis + 2]
+
+            flat = d == 0.0
+            hit &= ~flat | ((p >= lo) & (p <= hi))
+
+            ta = (lo - p) / d
+            tb = (hi - p) / d
+            t0 = np.where(flat, t0, np.maximum(t0, np.minimum(ta, tb)))
+            t1 = np.where(flat, t1, np.minimum(t1, np.maximum(ta, tb)))
+
+    return hit & (t0 <= t1)
+
+
+def _contains_point(a: np.ndarray, b: np.ndarray, x: float, y: float) -> np.ndarray:
+    # Per-edge even-odd crossing of a ray from (x, y) towards +x, as in the mask rasterizer.
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return crosses & (x < at)
+
+
+class SpatialIndex:
+    # Packed static R-tree (STR order, NODE_SIZE entries per node) over the polygons of one
+    # annotation file. Queries walk the tree one level at a time with array operations, then
+    # refine the candidates against the exact polygons (closed rings, even-odd interior).
+    # Results are polygon indices in file order, i.e. indices into `batch`.
+
+    def __init__(self, batch: PolygonBatch, *, node_size: int = NODE_SIZE) -> None:
+        if node_size < 2:
+            raise ValueError("node_size must be >= 2")
+
+        bounds = polygon_bounds(batch.coords, batch.offsets)
+
+        # Empty polygons have no extent and are left out of the tree.
+        items = np.flatnonzero(~np.isnan(bounds[:, 0]))
+        centers = (bounds[items, :2] + bounds[items, 2:]) / 2.0
+        order = items[_sort_tile_recursive(centers, node_size)]
+        self._attach(batch, node_size, order, _pack_levels(bounds[order], node_size), bounds)
+
+    def _attach(
+        self,
+        batch: PolygonBatch,
+        node_size: int,
+        order: np.ndarray,
+        levels: list[np.ndarray],
+        bounds: np.ndarray,
+    ) -> None:
+        self.batch = batch
+        self.node_size = node_size
+        self.bounds = bounds
+        self._order = order
+        self._levels = levels
+
+        # Successor of each vertex on its own ring, for the edge tests.
+        nonempty = batch.vertex_counts > 0
+        self._next = np.arange(1, batch.coords.shape[0] + 1)
+        self._next[batch.offsets[1:][nonempty] - 1] = batch.offsets[:-1][nonempty]
+
+    def __len__(self) -> int:
+        return len(self.batch)
+
+    @classmethod
+    def from_xml(
+        cls,
+        xml_path: str | Path | ZipMember | BinaryIO,
+        *,
+        polygon_options: Mapping[str, object] | None = None,
+    ) -> SpatialIndex:
+        return cls(load_class_polygons_from_xml(xml_path, polygon_options=polygon_options))
+
+    def _candidates(self, window: np.ndarray) -> np.ndarray:
+        nodes = np.arange(self._levels[-1].shape[0])
+        for level in range(len(self._levels) - 1, -1, -1):
+            boxes = self._levels[level][nodes]
+            nodes = nodes[
+                (boxes[:, 0] <= window[2])
+                & (boxes[:, 2] >= window[0])
+                & (boxes[:, 1] <= window[3])
+                & (boxes[:, 3] >= window[1])
+            ]
+            if level > 0:
+                nodes = (nodes[:, None] * self.node_size + np.arange(self.node_size)).ravel()
+                nodes = nodes[nodes < self._levels[level - 1].shape[0]]
+        return self._order[nodes]
+
+    def _refine(self, candidates: np.ndarray, window: np.ndarray) -> np.ndarray:
+        # A polygon meets the window iff one of its edges does (covers vertices inside it and
+        # boundary crossings) or it contains the window (then it contains the window center).
+        index, local = ragged_take(self.batch.offsets, candidates)
+        a = self.batch.coords[index]
+        b = self.batch.coords[self._next[index]]
+
+        cx = (window[0] + window[2]) / 2.0
+        cy = (window[1] + window[3]) / 2.0
+        starts = local[:-1]
+        edge_hit = np.logical_or.reduceat(_segments_hit_window(a, b, window), starts)
+        inside = np.add.reduceat(_contains_point(a, b, cx, cy).astype(np.int64), starts) % 2 == 1
+        return candidates[edge_hit | inside]
+
+    def query_window(
+        self,
+        xmin: float,
+        ymin: float,
+        xmax: float,
+        ymax: float,
+        *,
+        exact: bool = True,
+    ) -> np.ndarray:
+        # Polygons intersecting the closed window; exact=False stops at the bbox test.
+        window = np.asarray([min(xmin, xmax), min(ymin, ymax), max(xmin, xmax), max(ymin, ymax)], dtype=float)
+        candidates = self._candidates(window)
+
+        if exact and candidates.shape[0]:
+            # Boxes inside the window need no refinement.
+            boxes = self.bounds[candidates]
+            covered = (
+                (boxes[:, 0] >= window[0])
+                & (boxes[:, 2] <= window[2])
+                & (boxes[:, 1] >= window[1])
+                & (boxes[:, 3] <= window[3])
+            )
+            partial = candidates[~covered]
+            if partial.shape[0]:
+                candidates = np.concatenate((candidates[covered], self._refine(partial, window)))
+
+        return np.sort(candidates)
+
+    def query_point(self, x: float, y: float, *, exact: bool = True) -> np.ndarray:
+        # Polygons containing (x, y), boundary included.
+        return self.query_window(x, y, x, y, exact=exact)
+
+    def save(self, path: str | Path, *, source: Mapping[str, object] | None = None) -> None:
+        # One .npz holding the polygons and the packed tree, written atomically. `source` is stored
+        # as JSON and returned by load() (used to detect a changed annotation file).
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        batch = self.batch
+        level_sizes = [level.shape[0] for level in self._levels]
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                np.savez(
+                    f,
+                    version=np.int64(SPATIAL_INDEX_VERSION),
+                    node_size=np.int64(self.node_size),
+                    source=np.str_(json.dumps(dict(source or {}), sort_keys=True)),
+                    coords=batch.coords,
+                    offsets=batch.offsets,
+                    class_ids=batch.class_ids,
+                    shape_codes=batch.shape_codes,
+                    class_names=np.asarray(batch.class_names, dtype=np.str_),
+                    order=self._order,
+                    level_sizes=np.asarray(level_sizes, dtype=np.int64),
+                    levels=np.concatenate(self._levels),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: str | Path) -> tuple[SpatialIndex, dict[str, object]]:
+        # (index, source) from save(); the tree is read back as stored, not rebuilt.
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != SPATIAL_INDEX_VERSION:
+                raise ValueError(f"unsupported spatial index version in {path}")
+
+            batch = PolygonBatch(
+                data["coords"],
+                data["offsets"],
+                data["class_ids"],
+                data["shape_codes"],
+                data["class_names"].tolist(),
+            )
+            levels = np.split(data["levels"], np.cumsum(data["level_sizes"])[:-1])
+            order = data["order"]
+            node_size = int(data["node_size"])
+            source = json.loads(str(data["source"]))
+
+        index = cls.__new__(cls)
+        index._attach(batch, node_size, order, levels, polygon_bounds(batch.coords, batch.offsets))
+        return index, source
+
+
+def load_spatial_index(
+    xml_path: str | Path | ZipMember,
+    *,
+    index_path: str | Path | None = None,
+    polygon_options: Mapping[str, object] | None = None,
+    save: bool = True,
+) -> SpatialIndex:
+    # The index saved next to the annotation file (<xml>.sindex.npz) if it matches the file and the
+    # polygon options; otherwise it is built and, with save=True, written there for the next call.
+    if index_path is None:
+        if isinstance(xml_path, ZipMember):
+            raise ValueError("index_path is required for annotations inside a ZIP archive")
+        index_path = spatial_index_path(xml_path)
+    index_path = Path(index_path)
+
+    source = {
+        "stamp": source_stamp(xml_path),
+        "polygon_options": {key: polygon_options[key] for key in sorted(polygon_options or {})},
+    }
+    if index_path.is_file():
+        try:
+            index, saved = SpatialIndex.load(index_path)
+        except (OSError, ValueError, KeyError):
+            index, saved = None, None
+        if index is not None and saved == json.loads(json.dumps(source)):
+            return index
+
+    index = SpatialIndex.from_xml(xml_path, polygon_options=polygon_options)
+    if save:
+        index.save(index_path, source=source)
+    return index
+
+
+def _parse_floats(text: str, count: int, name: str) -> list[float]:
+    values = [float(v) for v in text.split(",")]
+    if len(values) != count:
+        raise SystemExit(f"{name} expects {count} comma-separated numbers")
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build <xml>.sindex.npz spatial indexes next to annotation XML files and run region queries.",
+    )
+    parser.add_argument("--input-dir", help="Build (or refresh) the index of every *_annotations.xml pair under this directory")
+    parser.add_argument("--xml", help="Query the index of this annotation XML (built first if missing or stale)")
+    parser.add_argument("--window", help="Query window xmin,ymin,xmax,ymax")
+    parser.add_argument("--point", help="Query point x,y")
+    parser.add_argument("--bbox-only", action="store_true", help="Skip the exact polygon test")
+    parser.add_argument("--bezier-flatness", type=float, help="As in convert_to_pascal_voc.py")
+    parser.add_argument("--arc-tolerance", type=float, help="As in convert_to_pascal_voc.py")
+    args = parser.parse_args()
+
+    if not args.input_dir and not args.xml:
+        parser.error("--input-dir or --xml is required")
+    if args.xml and not (args.window or args.point):
+        parser.error("--xml needs --window or --point")
+
+    polygon_options: dict[str, object] = {}
+    if args.bezier_flatness is not None:
+        polygon_options["bezier_flatness"] = args.bezier_flatness
+    if args.arc_tolerance is not None:
+        polygon_options["arc_tolerance"] = args.arc_tolerance
+
+    if args.input_dir:
+        pairs, _ = discover_image_annotation_pairs(args.input_dir)
+        polygons = 0
+        for _, annotation_xml in pairs:
+            polygons += len(load_spatial_index(annotation_xml, polygon_options=polygon_options))
+        print(f"indexed: {len(pairs)} annotation files, {polygons} polygons")
+
+    if args.xml:
+        index = load_spatial_index(args.xml, polygon_options=polygon_options)
+        if args.window:
+            hits = index.query_window(*_parse_floats(args.window, 4, "--window"), exact=not args.bbox_only)
+        else:
+            hits = index.query_point(*_parse_floats(args.point, 2, "--point"), exact=not args.bbox_only)
+
+        for k in hits.tolist():
+            xmin, ymin, xmax, ymax = index.bounds[k].tolist()
+            print(f"{k}\t{index.batch.class_name(k)}\t{index.batch.shape(k)}\t{xmin:g},{ymin:g},{xmax:g},{ymax:g}")
+
+
+if __name__ == "__main__":
+    main()
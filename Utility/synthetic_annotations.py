@@ -0,0 +1,215 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import math
+from pathlib import Path
+import random
+import struct
+from typing import Sequence
+import zlib
+
+from load_annotation import ANNOTATION_SUFFIX
+
+
+SYNTHETIC_SHAPES = ("Point", "Polygon", "Rect", "RotatedRect", "Circle", "Ellipse", "Curve", "ClosedCurve")
+SYNTHETIC_IMAGE_FORMATS = ("png", "jpeg")
+
+
+@dataclass
+class SyntheticDatasetOptions:
+    # Dataset shape: image count, spread over `directories` subdirectories (1 = flat), annotation
+    # entries per image, points per Polygon/Curve/ClosedCurve, image size and header format.
+    # Entries cycle through `shapes` so every geometry type is covered in equal parts.
+    images: int = 100
+    directories: int = 1
+    entries: int = 50
+    points: int = 16
+    width: int = 1920
+    height: int = 1080
+    image_format: str = "png"
+    classes: int = 8
+    shapes: Sequence[str] = SYNTHETIC_SHAPES
+    seed: int = 0
+
+
+def png_header(width: int, height: int) -> bytes:
+    # Signature + IHDR (8-bit RGB) + IEND: enough for header-only size readers.
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IEND", b"")
+    )
+
+
+def jpeg_header(width: int, height: int) -> bytes:
+    # SOI + JFIF APP0 + baseline SOF0 (3 components) + EOI.
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0
+        + b"\xff\xc0" + struct.pack(">H", len(sof0) + 2) + sof0
+        + b"\xff\xd9"
+    )
+
+
+def _points_xml(rng: random.Random, count: int, cx: float, cy: float, radius: float) -> str:
+    # Points in angle order on a jittered circle around (cx, cy), so polygons stay simple.
+    points = []
+    for i in range(count):
+        t = 2.0 * math.pi * i / count
+        r = radius * rng.uniform(0.7, 1.0)
+        points.append(f'<Point X="{cx + r * math.cos(t):.2f}" Y="{cy + r * math.sin(t):.2f}" />')
+    return "<Points>" + "".join(points) + "</Points>"
+
+
+def _geometry_xml(rng: random.Random, shape: str, options: SyntheticDatasetOptions) -> str:
+    size = min(options.width, options.height)
+    radius = rng.uniform(0.02, 0.15) * size
+    cx = rng.uniform(radius, options.width - radius)
+    cy = rng.uniform(radius, options.height - radius)
+    angle = rng.uniform(0.0, math.pi)
+    dx, dy = radius * math.cos(angle), radius * math.sin(angle)
+
+    if shape == "Point":
+        return f'<Point X="{cx:.2f}" Y="{cy:.2f}" />'
+    if shape == "Polygon":
+        return f"<Polygon>{_points_xml(rng, max(3, options.points), cx, cy, radius)}</Polygon>"
+    if shape == "Rect":
+        return f'<Rect X="{cx - radius:.2f}" Y="{cy - radius / 2:.2f}" Width="{2 * radius:.2f}" Height="{radius:.2f}" />'
+    if shape == "RotatedRect":
+        return (
+            f'<RotatedRect V0X="{cx - dx:.2f}" V0Y="{cy - dy:.2f}" V1X="{cx + dx:.2f}" V1Y="{cy + dy:.2f}" '
+            f'Width="{radius / 2:.2f}" />'
+        )
+    if shape == "Circle":
+        return f'<Circle X="{cx:.2f}" Y="{cy:.2f}" Radius="{radius:.2f}" />'
+    if shape == "Ellipse":
+        return (
+            f'<Ellipse V0X="{cx - dx:.2f}" V0Y="{cy - dy:.2f}" V1X="{cx + dx:.2f}" V1Y="{cy + dy:.2f}" '
+            f'Width="{radius:.2f}" />'
+        )
+    if shape == "Curve":
+        stroke_width = rng.uniform(2.0, 12.0)
+        return f'<Curve StrokeWidth="{stroke_width:.2f}">{_points_xml(rng, max(2, options.points), cx, cy, radius)}</Curve>'
+    if shape == "ClosedCurve":
+        return f"<ClosedCurve>{_points_xml(rng, max(3, options.points), cx, cy, radius)}</ClosedCurve>"
+
+    raise ValueError(f"Unsupported geometry shape: {shape}")
+
+
+def synthetic_annotation_xml(rng: random.Random, options: SyntheticDatasetOptions) -> str:
+    entries = []
+    for i in range(options.entries):
+        shape = options.shapes[i % len(options.shapes)]
+        class_name = f"class{rng.randrange(max(1, options.classes))}"
+        entries.append(
+            f'<AnnotationEntry><ClassDetail Name="{class_name}" />'
+            f"<Geometry>{_geometry_xml(rng, shape, options)}</Geometry></AnnotationEntry>"
+        )
+
+    return '<?xml version="1.0" encoding="utf-8"?>\n<Annotations>' + "".join(entries) + "</Annotations>\n"
+
+
+def generate_synthetic_dataset(
+    output_dir: str | Path,
+    options: SyntheticDatasetOptions | None = None,
+) -> list[tuple[Path, Path]]:
+    # Writes header-only images and their *_annotations.xml; the same options and seed give the same files.
+    options = options if options is not None else SyntheticDatasetOptions()
+    if options.image_format not in SYNTHETIC_IMAGE_FORMATS:
+        raise ValueError(f"unknown image format: {options.image_format} (expected one of {SYNTHETIC_IMAGE_FORMATS})")
+    for shape in options.shapes:
+        if shape not in SYNTHETIC_SHAPES:
+            raise ValueError(f"Unsupported geometry shape: {shape}")
+
+    output_dir = Path(output_dir)
+    rng = random.Random(options.seed)
+
+    if options.image_format == "png":
+        header, suffix = png_header(options.width, options.height), ".png"
+    else:
+        header, suffix = jpeg_header(options.width, options.height), ".jpg"
+
+    directories = max(1, options.directories)
+    pairs: list[tuple[Path, Path]] = []
+    for i in range(options.images):
+        directory = output_dir if directories == 1 else output_dir / f"d{i % directories:04d}"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        stem = f"{i:06d}"
+        image_path = directory / f"{stem}{suffix}"
+        annotation_xml = directory / f"{stem}{ANNOTATION_SUFFIX}"
+        image_path.write_bytes(header)
+        annotation_xml.write_text(synthetic_annotation_xml(rng, options), encoding="utf-8")
+        pairs.append((image_path, annotation_xml))
+
+    return pairs
+
+
+def add_synthetic_dataset_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = SyntheticDatasetOptions()
+    parser.add_argument("--images", type=int, default=defaults.images, help=f"Number of images (default: {defaults.images})")
+    parser.add_argument(
+        "--directories",
+        type=int,
+        default=defaults.directories,
+        help=f"Spread images over this many subdirectories (default: {defaults.directories} = flat)",
+    )
+    parser.add_argument("--entries", type=int, default=defaults.entries, help=f"Annotation entries per image (default: {defaults.entries})")
+    parser.add_argument(
+        "--points",
+        type=int,
+        default=defaults.points,
+        help=f"Points per Polygon/Curve/ClosedCurve (default: {defaults.points})",
+    )
+    parser.add_argument("--width", type=int, default=defaults.width, help=f"Image width (default: {defaults.width})")
+    parser.add_argument("--height", type=int, default=defaults.height, help=f"Image height (default: {defaults.height})")
+    parser.add_argument(
+        "--image-format",
+        choices=SYNTHETIC_IMAGE_FORMATS,
+        default=defaults.image_format,
+        help=f"Image header format (default: {defaults.image_format})",
+    )
+    parser.add_argument("--classes", type=int, default=defaults.classes, help=f"Number of class names (default: {defaults.classes})")
+    parser.add_argument(
+        "--shapes",
+        help=f"Comma-separated geometry types to cycle through (default: {','.join(SYNTHETIC_SHAPES)})",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed, help=f"Random seed (default: {defaults.seed})")
+
+
+def synthetic_dataset_options(args: argparse.Namespace) -> SyntheticDatasetOptions:
+    return SyntheticDatasetOptions(
+        images=args.images,
+        directories=args.directories,
+        entries=args.entries,
+        points=args.points,
+        width=args.width,
+        height=args.height,
+        image_format=args.image_format,
+        classes=args.classes,
+        shapes=tuple(s.strip() for s in args.shapes.split(",") if s.strip()) if args.shapes else SYNTHETIC_SHAPES,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic image headers and *_annotations.xml for benchmarks.")
+    parser.add_argument("--output-dir", required=True, help="Directory to write the dataset into")
+    add_synthetic_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    pairs = generate_synthetic_dataset(args.output_dir, synthetic_dataset_options(args))
+    print(f"generated: {len(pairs)} image/annotation pairs in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from bezier_control_point import bezier_closed_curve, bezier_open_curve, control_point
+from testing_support import random_polygons
+
+
+def _reference_open_curve(points: np.ndarray, tension: float) -> np.ndarray:
+    # The per-segment loop over the scalar control_point.
+    n = len(points)
+    weight = tension / 2.0
+    pts = np.empty((n * 3 - 2, 2), dtype=float)
+    pts[0::3] = points
+
+    if n == 2:
+        pts[1], pts[2] = control_point(0.0, 0.0, points[0], points[0], points[1], points[1])
+    else:
+        pts[1], pts[2] = control_point(0.0, weight, points[0], points[0], points[1], points[2])
+        for i in range(1, n - 2):
+            pts[i * 3 + 1], pts[i * 3 + 2] = control_point(
+                weight, weight, points[i - 1], points[i], points[i + 1], points[i + 2]
+            )
+        pts[-3], pts[-2] = control_point(weight, 0.0, points[-3], points[-2], points[-1], points[-1])
+    return pts
+
+
+def _reference_closed_curve(points: np.ndarray, tension: float) -> np.ndarray:
+    n = len(points)
+    weight = tension / 2.0
+    pts = np.empty((n * 3 + 1, 2), dtype=float)
+    pts[0 : n * 3 : 3] = points
+    pts[n * 3] = points[0]
+
+    if n == 2:
+        pts[1], pts[2] = control_point(0.0, 0.0, points[0], points[0], points[1], points[1])
+        pts[4], pts[5] = pts[2], pts[1]
+    else:
+        pts[1], pts[2] = control_point(weight, weight, points[-1], points[0], points[1], points[2])
+        for i in range(1, n - 2):
+            pts[i * 3 + 1], pts[i * 3 + 2] = control_point(
+                weight, weight, points[i - 1], points[i], points[i + 1], points[i + 2]
+            )
+        pts[-6], pts[-5] = control_point(weight, weight, points[-3], points[-2], points[-1], points[0])
+        pts[-3], pts[-2] = control_point(weight, weight, points[-2], points[-1], points[0], points[1])
+    return pts
+
+
+def _cases(seed: int) -> list[np.ndarray]:
+    # Repeated clicks and back-and-forth strokes hit the zero-length branches.
+    cases = random_polygons(1000, seed, min_points=2, max_points=11, repeat=0.3)
+    return cases + [np.vstack((points, points[::-1])) for points in cases[:100]]
+
+
+@pytest.mark.parametrize("tension", [0.0, 0.5, 1.0])
+def test_open_curve_matches_scalar_loop(tension: float) -> None:
+    for points in _cases(0):
+        np.testing.assert_array_equal(bezier_open_curve(points, tension), _reference_open_curve(points, tension))
+
+
+@pytest.mark.parametrize("tension", [0.0, 0.5, 1.0])
+def test_closed_curve_matches_scalar_loop(tension: float) -> None:
+    for points in _cases(1):
+        np.testing.assert_array_equal(bezier_closed_curve(points, tension), _reference_closed_curve(points, tension))
+
+
+def test_short_inputs() -> None:
+    assert bezier_open_curve(np.zeros((0, 2)), 0.5).shape == (0, 2)
+    assert bezier_closed_curve(np.zeros((0, 2)), 0.5).shape == (0, 2)
+    np.testing.assert_array_equal(bezier_open_curve([[1.0, 2.0]], 0.5), [[1.0, 2.0]])
+    np.testing.assert_array_equal(bezier_closed_curve([[1.0, 2.0]], 0.5), [[1.0, 2.0]])
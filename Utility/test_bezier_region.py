@@ -0,0 +1,85 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import numpy as np
+
+from bezier_interpolation import interpolate_open_curve
+from bezier_region import SAMPLES_PER_SEGMENT, bezier_open_stroke_region, bezier_regions
+from testing_support import assert_ragged_equal, random_polygons, ragged_offsets
+
+
+def _reference_stroke(points: np.ndarray, stroke_width: float) -> np.ndarray:
+    # Per-vertex outline as the original loop computed it, with steps below the rounding noise
+    # of the curve's coordinates treated as zero.
+    centerline = interpolate_open_curve(points, samples_per_segment=SAMPLES_PER_SEGMENT)
+    n = centerline.shape[0]
+    tolerance = 1e-9 * max(1.0, float(np.abs(centerline).max()))
+
+    def normalize(v: np.ndarray) -> np.ndarray:
+        length = np.linalg.norm(v)
+        return v / length if length > tolerance else np.zeros(2)
+
+    tangents = np.zeros((n, 2))
+    tangents[0] = normalize(centerline[1] - centerline[0])
+    tangents[-1] = normalize(centerline[-1] - centerline[-2])
+    for i in range(1, n - 1):
+        tangents[i] = normalize(centerline[i + 1] - centerline[i - 1])
+    for i in range(n):
+        if not tangents[i].any():
+            tangents[i] = tangents[i - 1] if i > 0 and tangents[i - 1].any() else (1.0, 0.0)
+
+    normals = np.column_stack((-tangents[:, 1], tangents[:, 0])) * (stroke_width * 0.5)
+    return np.vstack((centerline + normals, (centerline - normals)[::-1]))
+
+
+def _strokes_with_repeated_clicks(count: int, seed: int = 0) -> list[tuple[np.ndarray, float]]:
+    polygons = random_polygons(count, seed, min_points=2, max_points=6, repeat=1.0, step=0.01)
+    widths = np.random.default_rng(seed).uniform(2.0, 12.0, count)
+    return list(zip(polygons, widths.tolist()))
+
+
+def test_repeated_click_matches_reference() -> None:
+    for points, stroke_width in _strokes_with_repeated_clicks(300):
+        np.testing.assert_allclose(
+            bezier_open_stroke_region(points, stroke_width),
+            _reference_stroke(points, stroke_width),
+            rtol=0.0,
+            atol=1e-6,
+        )
+
+
+def test_repeated_click_is_translation_invariant() -> None:
+    # Rounding noise differs after a shift; the outline must not follow it.
+    shift = np.array([1234.567, -321.123])
+    for points, stroke_width in _strokes_with_repeated_clicks(300, seed=1):
+        np.testing.assert_allclose(
+            bezier_open_stroke_region(points + shift, stroke_width) - shift,
+            bezier_open_stroke_region(points, stroke_width),
+            rtol=0.0,
+            atol=1e-6,
+        )
+
+
+def test_repeated_click_keeps_width() -> None:
+    points = np.array([[100.0, 100.0], [300.0, 150.0], [300.0, 150.0], [500.0, 400.0]])
+    region = bezier_open_stroke_region(points, 6.0)
+    n = region.shape[0] // 2
+    left, right = region[:n], region[n:][::-1]
+    np.testing.assert_allclose(np.hypot(*(left - right).T), 6.0)
+
+
+def test_batched_regions_match_single_curves() -> None:
+    strokes = _strokes_with_repeated_clicks(50, seed=2)
+    polygons = [points for points, _ in strokes]
+    widths = [stroke_width for _, stroke_width in strokes]
+
+    regions, region_offsets = bezier_regions(
+        np.concatenate(polygons), ragged_offsets(polygons), [False] * len(strokes), widths
+    )
+    assert_ragged_equal(
+        regions,
+        region_offsets,
+        [bezier_open_stroke_region(points, stroke_width) for points, stroke_width in strokes],
+    )
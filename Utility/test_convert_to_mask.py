@@ -0,0 +1,36 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import random
+
+import pytest
+
+from convert_to_mask import MASK_CLASSES_FILENAME, convert_directory_to_masks
+from convert_to_pascal_voc_kernel import DirectoryConversionReport
+from load_annotation import ANNOTATION_SUFFIX
+from synthetic_annotations import SyntheticDatasetOptions, png_header, synthetic_annotation_xml
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_malformed_xml_fails_one_file_in_merged_mode(tmp_path: Path, jobs: int) -> None:
+    images = tmp_path / "images"
+    images.mkdir()
+    options = SyntheticDatasetOptions(entries=8, width=64, height=48, classes=3)
+    for stem in ("0001", "0002", "0003"):
+        (images / f"{stem}.png").write_bytes(png_header(options.width, options.height))
+        xml = synthetic_annotation_xml(random.Random(stem), options)
+        (images / f"{stem}{ANNOTATION_SUFFIX}").write_text(xml, encoding="utf-8")
+    (images / f"0002{ANNOTATION_SUFFIX}").write_text("<Annotations><Polygon>", encoding="utf-8")
+
+    report = DirectoryConversionReport()
+    convert_directory_to_masks(images, tmp_path / "masks", mode="merged", jobs=jobs, report=report)
+
+    assert [path.name for path in report.written] == ["0001_mask.png", "0003_mask.png"]
+    assert [path.name for path, _ in report.failed] == ["0002.png"]
+    assert (tmp_path / "masks" / MASK_CLASSES_FILENAME).is_file()
+
+    with pytest.raises(RuntimeError, match="0002.png"):
+        convert_directory_to_masks(images, tmp_path / "masks", mode="merged", jobs=jobs)
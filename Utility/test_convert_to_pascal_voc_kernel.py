@@ -0,0 +1,142 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import struct
+
+import numpy as np
+import pytest
+
+from convert_to_pascal_voc_kernel import (
+    DirectoryConversionReport,
+    class_polygons_to_pascal_voc_tree,
+    convert_directory_to_pascal_voc,
+    save_pascal_voc,
+    write_pascal_voc,
+)
+from load_annotation import ANNOTATION_SUFFIX
+from polygon_batch import PolygonBatch
+from synthetic_annotations import jpeg_header, png_header
+from testing_support import random_polygons
+
+
+_CLASS_NAMES = ["person", "car", 'say "hi"', "a<b>&c", "ｸﾗｽ", "tab\tname"]
+
+
+def _random_class_polygons(count: int, seed: int = 0) -> list[tuple[str, np.ndarray]]:
+    polygons = random_polygons(count, seed, max_points=39, low=-50.0, high=700.0, spread=80.0)
+    names = np.random.default_rng(seed).integers(0, len(_CLASS_NAMES), count)
+    return [(_CLASS_NAMES[k], polygon) for k, polygon in zip(names.tolist(), polygons)]
+
+
+def _tree_bytes(tmp_path: Path, class_polygons, **kwargs) -> bytes:
+    path = tmp_path / "tree.xml"
+    save_pascal_voc(class_polygons_to_pascal_voc_tree(class_polygons, **kwargs), path)
+    return path.read_bytes()
+
+
+def _stream_bytes(tmp_path: Path, class_polygons, **kwargs) -> bytes:
+    path = tmp_path / "stream.xml"
+    write_pascal_voc(class_polygons, path, **kwargs)
+    return path.read_bytes()
+
+
+_HEADER = {"filename": "0001.png", "width": 640, "height": 480}
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"simplify_tolerance": 1.5},
+        {"depth": 1, "folder": "images & more", "image_path": "C:/data/<0001>.png", "database": 'db "v2"'},
+    ],
+)
+def test_write_pascal_voc_matches_tree(tmp_path: Path, options: dict) -> None:
+    class_polygons = _random_class_polygons(300)
+    kwargs = {**_HEADER, **options}
+
+    assert _stream_bytes(tmp_path, class_polygons, **kwargs) == _tree_bytes(tmp_path, class_polygons, **kwargs)
+
+
+def test_write_pascal_voc_matches_tree_with_truncated(tmp_path: Path) -> None:
+    class_polygons = _random_class_polygons(300, seed=1)
+    truncated = np.random.default_rng(1).random(len(class_polygons)) < 0.3
+    kwargs = {**_HEADER, "truncated": truncated.tolist()}
+
+    assert _stream_bytes(tmp_path, class_polygons, **kwargs) == _tree_bytes(tmp_path, class_polygons, **kwargs)
+
+
+def test_write_pascal_voc_accepts_polygon_batch(tmp_path: Path) -> None:
+    class_polygons = _random_class_polygons(300, seed=2)
+    batch = PolygonBatch.from_class_polygons(class_polygons)
+
+    assert _stream_bytes(tmp_path, batch, **_HEADER) == _tree_bytes(tmp_path, class_polygons, **_HEADER)
+    assert _tree_bytes(tmp_path, batch, **_HEADER) == _tree_bytes(tmp_path, class_polygons, **_HEADER)
+
+
+def test_write_pascal_voc_without_objects(tmp_path: Path) -> None:
+    assert _stream_bytes(tmp_path, [], **_HEADER) == _tree_bytes(tmp_path, [], **_HEADER)
+
+
+_ANNOTATION_XML = '<?xml version="1.0" encoding="utf-8"?>\n<Annotations></Annotations>\n'
+
+
+def _incremental_run(input_dir: Path, output_dir: Path) -> DirectoryConversionReport:
+    report = DirectoryConversionReport()
+    convert_directory_to_pascal_voc(input_dir, output_dir, incremental=True, prune_stale=True, report=report)
+    return report
+
+
+def test_prune_stale_keeps_output_of_replaced_extension(tmp_path: Path) -> None:
+    # x.png replaced by x.jpg: the old key is stale but its output path is written again.
+    images = tmp_path / "images"
+    output_dir = tmp_path / "voc"
+    images.mkdir()
+    (images / f"x{ANNOTATION_SUFFIX}").write_text(_ANNOTATION_XML, encoding="utf-8")
+    (images / f"y{ANNOTATION_SUFFIX}").write_text(_ANNOTATION_XML, encoding="utf-8")
+    (images / "x.png").write_bytes(png_header(8, 8))
+    (images / "y.png").write_bytes(png_header(8, 8))
+    _incremental_run(images, output_dir)
+
+    (images / "x.png").unlink()
+    (images / "x.jpg").write_bytes(jpeg_header(8, 8))
+    (images / "y.png").unlink()
+    report = _incremental_run(images, output_dir)
+
+    assert report.written == [output_dir / "x.xml"]
+    assert report.stale == [output_dir / "y.xml"]
+    assert (output_dir / "x.xml").is_file()
+    assert not (output_dir / "y.xml").exists()
+
+    report = _incremental_run(images, output_dir)
+    assert report.written == [] and report.stale == []
+    assert report.skipped == [output_dir / "x.xml"]
+
+
+def _rotated_jpeg(width: int, height: int, orientation: int) -> bytes:
+    # jpeg_header with an APP1 EXIF block (little-endian TIFF, one Orientation entry) after SOI.
+    tiff = b"II*\x00" + struct.pack("<IH", 8, 1) + struct.pack("<HHIHH", 274, 3, 1, orientation, 0) + b"\x00" * 4
+    app1 = b"Exif\x00\x00" + tiff
+    header = jpeg_header(width, height)
+    return header[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + header[2:]
+
+
+@pytest.mark.parametrize("image_cache", [False, True])
+def test_exif_orientation_option(tmp_path: Path, image_cache: bool) -> None:
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "x.jpg").write_bytes(_rotated_jpeg(40, 30, 6))
+    (images / f"x{ANNOTATION_SUFFIX}").write_text(_ANNOTATION_XML, encoding="utf-8")
+    cache = tmp_path / "cache.sqlite" if image_cache else None
+
+    sizes = []
+    for exif_orientation in (False, True, False):
+        output_dir = tmp_path / f"voc_{len(sizes)}"
+        convert_directory_to_pascal_voc(images, output_dir, image_cache=cache, exif_orientation=exif_orientation)
+        text = (output_dir / "x.xml").read_text(encoding="utf-8")
+        sizes.append((text.split("<width>")[1].split("<")[0], text.split("<height>")[1].split("<")[0]))
+
+    assert sizes == [("40", "30"), ("30", "40"), ("40", "30")]
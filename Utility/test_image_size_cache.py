@@ -0,0 +1,44 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import sqlite3
+
+from image_size_cache import ImageSizeCache
+from synthetic_annotations import png_header
+
+
+def _journal_mode(path: Path) -> str:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_cache_uses_rollback_journal(tmp_path: Path) -> None:
+    images = [tmp_path / f"{k}.png" for k in range(3)]
+    for k, path in enumerate(images):
+        path.write_bytes(png_header(10 + k, 20 + k))
+
+    cache_path = tmp_path / "cache.sqlite"
+    with ImageSizeCache(cache_path) as cache:
+        assert cache.read_many(images, threads=2) == [(10, 20, 3), (11, 21, 3), (12, 22, 3)]
+
+    assert _journal_mode(cache_path) == "delete"
+    assert not cache_path.with_name(cache_path.name + "-wal").exists()
+    with ImageSizeCache(cache_path) as cache:
+        assert cache.get_many(images) == [(10, 20, 3), (11, 21, 3), (12, 22, 3)]
+
+
+def test_wal_cache_is_switched_back(tmp_path: Path) -> None:
+    cache_path = tmp_path / "cache.sqlite"
+    connection = sqlite3.connect(cache_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.close()
+
+    ImageSizeCache(cache_path).close()
+
+    assert _journal_mode(cache_path) == "delete"
@@ -0,0 +1,123 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import zipfile
+
+from load_annotation import ANNOTATION_SUFFIX, discover_image_annotation_pairs
+from synthetic_annotations import png_header
+from zip_archive import ZipMember
+
+
+_ANNOTATION_XML = '<?xml version="1.0" encoding="utf-8"?>\n<Annotations></Annotations>\n'
+
+
+def _write_images(root: Path, stems: list[str]) -> None:
+    for stem in stems:
+        path = root / f"{stem}.png"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(png_header(8, 8))
+
+
+def _write_zip(path: Path, members: dict[str, bytes | str]) -> Path:
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+def _annotations(stems: list[str]) -> dict[str, str]:
+    return {f"{stem}{ANNOTATION_SUFFIX}": _ANNOTATION_XML for stem in stems}
+
+
+def _pairs_by_key(input_dir: Path, **kwargs) -> tuple[dict[str, str], list[str]]:
+    # {image path relative to input_dir: annotation member}, [missing image paths]
+    pairs, missing = discover_image_annotation_pairs(input_dir, **kwargs)
+
+    def key(image: Path | ZipMember) -> str:
+        return image.member if isinstance(image, ZipMember) else image.relative_to(input_dir).as_posix()
+
+    members = [annotation.member for _, annotation in pairs]
+    assert len(members) == len(set(members)), "an annotation member was paired with two images"
+    return {key(image): annotation.member for image, annotation in pairs}, sorted(key(image) for image in missing)
+
+
+def test_annotation_archive_does_not_borrow_other_folder(tmp_path: Path) -> None:
+    images = tmp_path / "images"
+    _write_images(images, ["0001", "sub/0001"])
+    archive = _write_zip(tmp_path / "annotations.zip", _annotations(["sub/0001"]))
+
+    pairs, missing = _pairs_by_key(images, annotation_archive=archive)
+
+    assert pairs == {"sub/0001.png": f"sub/0001{ANNOTATION_SUFFIX}"}
+    assert missing == ["0001.png"]
+
+
+def test_image_archive_does_not_borrow_other_folder(tmp_path: Path) -> None:
+    header = png_header(8, 8)
+    archive = _write_zip(
+        tmp_path / "images.zip",
+        {"0001.png": header, "sub/0001.png": header, **_annotations(["sub/0001"])},
+    )
+
+    pairs, missing = _pairs_by_key(archive)
+
+    assert pairs == {"sub/0001.png": f"sub/0001{ANNOTATION_SUFFIX}"}
+    assert missing == ["0001.png"]
+
+
+def test_annotation_archive_wrapped_in_folders(tmp_path: Path) -> None:
+    images = tmp_path / "images"
+    _write_images(images, ["0001", "0002", "sub/0001"])
+    archive = _write_zip(
+        tmp_path / "annotations.zip",
+        _annotations(["delivery/0001", "delivery/0002", "delivery/sub/0001"]),
+    )
+
+    pairs, missing = _pairs_by_key(images, annotation_archive=archive)
+
+    assert pairs == {
+        "0001.png": f"delivery/0001{ANNOTATION_SUFFIX}",
+        "0002.png": f"delivery/0002{ANNOTATION_SUFFIX}",
+        "sub/0001.png": f"delivery/sub/0001{ANNOTATION_SUFFIX}",
+    }
+    assert missing == []
+
+
+def test_wrapped_archive_missing_one_image(tmp_path: Path) -> None:
+    # "delivery/sub/0001" must not stand in for the top-level 0001 as well.
+    images = tmp_path / "images"
+    _write_images(images, ["0001", "sub/0001", "sub/0002"])
+    archive = _write_zip(tmp_path / "annotations.zip", _annotations(["delivery/sub/0001", "delivery/sub/0002"]))
+
+    pairs, missing = _pairs_by_key(images, annotation_archive=archive)
+
+    assert pairs == {
+        "sub/0001.png": f"delivery/sub/0001{ANNOTATION_SUFFIX}",
+        "sub/0002.png": f"delivery/sub/0002{ANNOTATION_SUFFIX}",
+    }
+    assert missing == ["0001.png"]
+
+
+def test_ambiguous_wrappers_are_missing(tmp_path: Path) -> None:
+    images = tmp_path / "images"
+    _write_images(images, ["0001"])
+    archive = _write_zip(tmp_path / "annotations.zip", _annotations(["a/0001", "b/0001"]))
+
+    pairs, missing = _pairs_by_key(images, annotation_archive=archive)
+
+    assert pairs == {}
+    assert missing == ["0001.png"]
+
+
+def test_directory_pairs_without_archive(tmp_path: Path) -> None:
+    images = tmp_path / "images"
+    _write_images(images, ["0001", "sub/0001"])
+    (images / "sub" / f"0001{ANNOTATION_SUFFIX}").write_text(_ANNOTATION_XML, encoding="utf-8")
+
+    pairs, missing = discover_image_annotation_pairs(images)
+
+    assert [image.relative_to(images).as_posix() for image, _ in pairs] == ["sub/0001.png"]
+    assert [image.relative_to(images).as_posix() for image in missing] == ["0001.png"]
@@ -0,0 +1,52 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import numpy as np
+
+from polygon_batch import SHAPE_TYPES, PolygonBatch
+from testing_support import assert_ragged_equal, random_polygons
+
+
+def _class_polygons(count: int, seed: int) -> list[tuple[str, np.ndarray]]:
+    # More than one builder chunk, with a few empty polygons in between.
+    polygons = random_polygons(count, seed, min_points=0, max_points=12, spread=40.0)
+    return [(f"class{k % 7}", polygon) for k, polygon in enumerate(polygons)]
+
+
+def test_round_trip_through_class_polygons() -> None:
+    class_polygons = _class_polygons(3000, seed=0)
+    shapes = [SHAPE_TYPES[k % len(SHAPE_TYPES)] for k in range(len(class_polygons))]
+
+    batch = PolygonBatch.from_class_polygons(class_polygons, shapes)
+
+    assert len(batch) == len(class_polygons)
+    assert batch.class_names == [f"class{k}" for k in range(7)]
+    assert_ragged_equal(batch.coords, batch.offsets, [polygon for _, polygon in class_polygons])
+    assert [name for name, _ in batch.to_class_polygons()] == [name for name, _ in class_polygons]
+    assert [batch.shape(k) for k in range(len(batch))] == shapes
+    for view, (class_name, polygon) in zip(batch, class_polygons):
+        name, points = view
+        assert name == class_name
+        np.testing.assert_array_equal(points, polygon)
+
+
+def test_consecutive_views_are_not_copied() -> None:
+    batch = PolygonBatch.from_class_polygons(_class_polygons(3000, seed=1))
+
+    again = PolygonBatch.from_class_polygons(batch.to_class_polygons())
+
+    assert np.shares_memory(again.coords, batch.coords)
+    np.testing.assert_array_equal(again.offsets, batch.offsets)
+
+
+def test_take() -> None:
+    class_polygons = _class_polygons(200, seed=2)
+    batch = PolygonBatch.from_class_polygons(class_polygons)
+    picks = [5, 0, 199, 5, 17]
+
+    taken = batch.take(picks)
+
+    assert [taken.class_name(k) for k in range(len(taken))] == [class_polygons[k][0] for k in picks]
+    assert_ragged_equal(taken.coords, taken.offsets, [class_polygons[k][1] for k in picks])
@@ -0,0 +1,45 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from polygon_simplify import simplify_polygon
+from polygon_to_coco import polygon_areas
+from testing_support import random_polygons
+
+
+def _area(polygon: np.ndarray) -> float:
+    return float(polygon_areas(polygon, [0, polygon.shape[0]])[0])
+
+
+def test_large_tolerance_keeps_a_triangle() -> None:
+    square = np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0]])
+    simplified = simplify_polygon(square, 100.0)
+
+    assert simplified.shape == (3, 2)
+    assert _area(simplified) > 0.0
+
+
+def test_thin_ring_keeps_apex() -> None:
+    ring = np.array([[0.0, 0.0], [10.0, 0.1], [20.0, 0.0], [10.0, 1.0], [5.0, 0.5]])
+    np.testing.assert_array_equal(simplify_polygon(ring, 5.0), [[0.0, 0.0], [20.0, 0.0], [10.0, 1.0]])
+
+
+@pytest.mark.parametrize("tolerance", [0.5, 5.0, 50.0, 1e6])
+def test_closed_rings_keep_three_vertices(tolerance: float) -> None:
+    for polygon in random_polygons(500, min_points=3, max_points=30, spread=40.0, step=1.0):
+        simplified = simplify_polygon(polygon, tolerance)
+        distinct = np.unique(polygon, axis=0).shape[0]
+
+        assert simplified.shape[0] >= min(3, distinct)
+        # Kept vertices are a subsequence of the input ring.
+        remaining = iter(polygon.tolist())
+        assert all(point in remaining for point in simplified.tolist())
+
+
+def test_open_chain_may_reduce_to_endpoints() -> None:
+    chain = np.array([[0.0, 0.0], [10.0, 0.1], [20.0, 0.0]])
+    np.testing.assert_array_equal(simplify_polygon(chain, 1.0, closed=False), [[0.0, 0.0], [20.0, 0.0]])
@@ -0,0 +1,35 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import pytest
+
+from polygon_tiling import TileOptions, tile_grid
+
+
+def _starts(size: int, tile: int, overlap: int) -> list[int]:
+    return [x0 for x0, _, _, _ in tile_grid(size, tile, TileOptions(width=tile, overlap=overlap))]
+
+
+def test_no_near_duplicate_tiles() -> None:
+    grid = tile_grid(1920, 1080, TileOptions(width=400, overlap=64))
+    assert sorted({y0 for _, y0, _, _ in grid}) == [0, 226, 453, 680]
+    assert sorted({x0 for x0, _, _, _ in grid}) == [0, 304, 608, 912, 1216, 1520]
+    assert all(width == 400 and height == 400 for _, _, width, height in grid)
+
+
+@pytest.mark.parametrize("tile, overlap", [(1, 0), (16, 0), (16, 15), (37, 5), (64, 63), (100, 30)])
+def test_starts_cover_image_with_overlap(tile: int, overlap: int) -> None:
+    for size in range(tile + 1, 600):
+        starts = _starts(size, tile, overlap)
+        steps = [b - a for a, b in zip(starts, starts[1:])]
+
+        assert starts[0] == 0 and starts[-1] == size - tile
+        assert all(0 < step <= tile - overlap for step in steps)
+        # Fewest tiles: one less would leave a neighbour pair overlapping by less than `overlap`.
+        assert (len(starts) - 2) * (tile - overlap) < size - tile
+
+
+def test_image_smaller_than_tile() -> None:
+    assert tile_grid(300, 200, TileOptions(width=400, overlap=64)) == [(0, 0, 300, 200)]
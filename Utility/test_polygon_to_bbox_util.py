@@ -0,0 +1,73 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from polygon_to_bbox_util import (
+    pack_polygons,
+    polygon_to_bbox,
+    polygon_to_voc_polygon,
+    polygons_to_bboxes,
+    polygons_to_voc_polygons,
+)
+from testing_support import assert_ragged_equal, random_polygons
+
+
+def _cases(seed: int) -> list[np.ndarray]:
+    # Single points, half-pixel and integer corners, and thin strips along either axis, with
+    # vertices outside a 640 x 480 image on every side.
+    options = {"count": 750, "low": -100.0, "high": 800.0}
+    return (
+        random_polygons(seed=seed, **options)
+        + random_polygons(seed=seed + 1, step=0.5, **options)
+        + random_polygons(seed=seed + 2, step=1.0, spread=40.0, **options)
+        + random_polygons(seed=seed + 3, spread=(0.45, 0.0), **options)
+        + random_polygons(seed=seed + 4, spread=(0.0, 0.45), **options)
+    )
+
+
+_BOUNDS = [
+    {"image_width": 640, "image_height": 480},
+    {"image_width": None, "image_height": None},
+    {"image_width": 640, "image_height": None},
+    {"image_width": 1, "image_height": 1},
+]
+
+
+@pytest.mark.parametrize("bounds", _BOUNDS)
+@pytest.mark.parametrize("min_size", [1, 3])
+def test_polygons_to_bboxes_matches_scalar(bounds: dict, min_size: int) -> None:
+    polygons = _cases(0)
+    coords, offsets = pack_polygons(polygons)
+
+    bboxes = polygons_to_bboxes(coords, offsets, min_size=min_size, **bounds)
+
+    expected = [polygon_to_bbox(polygon, min_size=min_size, **bounds) for polygon in polygons]
+    assert bboxes.dtype == np.int64
+    np.testing.assert_array_equal(bboxes, np.array(expected, dtype=np.int64))
+
+
+@pytest.mark.parametrize("bounds", _BOUNDS)
+def test_polygons_to_voc_polygons_matches_scalar(bounds: dict) -> None:
+    polygons = _cases(10)
+    coords, offsets = pack_polygons(polygons)
+
+    voc = polygons_to_voc_polygons(coords, offsets, **bounds)
+
+    assert_ragged_equal(voc, offsets, [polygon_to_voc_polygon(polygon, **bounds) for polygon in polygons])
+
+
+def test_empty_batch() -> None:
+    coords, offsets = pack_polygons([])
+    assert polygons_to_bboxes(coords, offsets, image_width=640, image_height=480).shape == (0, 4)
+    assert polygons_to_voc_polygons(coords, offsets, image_width=640, image_height=480).shape == (0, 2)
+
+
+def test_empty_polygon_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        pack_polygons([np.zeros((0, 2))])
+    with pytest.raises(ValueError):
+        polygons_to_bboxes(np.zeros((2, 2)), [0, 2, 2])
@@ -0,0 +1,46 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+import struct
+import zlib
+
+import numpy as np
+
+from polygon_to_mask import rasterize_mask, save_mask_png
+
+
+def _read_gray8_png(path: Path) -> np.ndarray:
+    # Enough of a decoder for PngGrayWriter output: 8-bit gray, filter type 0 on every row.
+    data = path.read_bytes()[8:]
+    idat = b""
+    while data:
+        length, tag = struct.unpack(">I4s", data[:8])
+        body = data[8 : 8 + length]
+        if tag == b"IHDR":
+            width, height = struct.unpack(">II", body[:8])
+        elif tag == b"IDAT":
+            idat += body
+        data = data[12 + length :]
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width + 1)
+    assert not rows[:, 0].any()
+    return rows[:, 1:]
+
+
+def test_per_class_file_names_are_unique(tmp_path: Path) -> None:
+    # "a b", "a_b" and "A_B" all sanitize to a_b (the last one on case-insensitive file systems).
+    class_polygons = [
+        ("a b", np.array([[1.0, 1.0], [5.0, 1.0], [5.0, 5.0], [1.0, 5.0]])),
+        ("a_b", np.array([[10.0, 10.0], [14.0, 10.0], [14.0, 14.0], [10.0, 14.0]])),
+        ("A_B", np.array([[1.0, 10.0], [5.0, 10.0], [5.0, 14.0], [1.0, 14.0]])),
+        ("a b", np.array([[10.0, 1.0], [14.0, 1.0], [14.0, 5.0], [10.0, 5.0]])),
+    ]
+
+    paths = save_mask_png(class_polygons, tmp_path / "0001_mask.png", 16, 16, mode="per_class")
+
+    assert [path.name for path in paths] == ["0001_mask_a_b.png", "0001_mask_a_b_2.png", "0001_mask_A_B_3.png"]
+    expected = rasterize_mask(class_polygons, 16, 16, mode="per_class")
+    for path, class_name in zip(paths, ["a b", "a_b", "A_B"]):
+        np.testing.assert_array_equal(_read_gray8_png(path), expected[class_name])
@@ -0,0 +1,156 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from polygon_batch import PolygonBatch
+from spatial_index import SpatialIndex
+from testing_support import random_polygons
+
+
+# Brute-force reference on plain Python floats. Coordinates are multiples of 0.5, so every
+# orientation test below is exact.
+
+def _orientation(p, q, r) -> float:
+    return (q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0])
+
+
+def _on_segment(p, q, r) -> bool:
+    # r on the closed segment p - q
+    return (
+        _orientation(p, q, r) == 0.0
+        and min(p[0], q[0]) <= r[0] <= max(p[0], q[0])
+        and min(p[1], q[1]) <= r[1] <= max(p[1], q[1])
+    )
+
+
+def _segments_meet(p1, p2, q1, q2) -> bool:
+    d1 = _orientation(q1, q2, p1)
+    d2 = _orientation(q1, q2, p2)
+    d3 = _orientation(p1, p2, q1)
+    d4 = _orientation(p1, p2, q2)
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    return _on_segment(q1, q2, p1) or _on_segment(q1, q2, p2) or _on_segment(p1, p2, q1) or _on_segment(p1, p2, q2)
+
+
+def _edges(polygon):
+    return [(polygon[i], polygon[(i + 1) % len(polygon)]) for i in range(len(polygon))]
+
+
+def _contains(polygon, point) -> bool:
+    # Closed polygon, even-odd interior.
+    if any(_on_segment(a, b, point) for a, b in _edges(polygon)):
+        return True
+    x, y = point
+    inside = False
+    for a, b in _edges(polygon):
+        if (a[1] > y) != (b[1] > y) and x < a[0] + (y - a[1]) * (b[0] - a[0]) / (b[1] - a[1]):
+            inside = not inside
+    return inside
+
+
+def _meets_window(polygon, window) -> bool:
+    xmin, ymin, xmax, ymax = window
+    corners = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
+    if any(xmin <= x <= xmax and ymin <= y <= ymax for x, y in polygon):
+        return True
+    if any(_segments_meet(a, b, c, d) for a, b in _edges(polygon) for c, d in _edges(corners)):
+        return True
+    return _contains(polygon, corners[0])
+
+
+def _bbox_meets_window(polygon, window) -> bool:
+    xs = [x for x, _ in polygon]
+    ys = [y for _, y in polygon]
+    return min(xs) <= window[2] and max(xs) >= window[0] and min(ys) <= window[3] and max(ys) >= window[1]
+
+
+def _random_batch(count: int, seed: int = 0) -> tuple[PolygonBatch, list[list[tuple[float, float]]]]:
+    # Self-intersecting rings of several sizes, two-point slivers, single points and a few empty
+    # polygons, on a half-pixel grid.
+    options = {"low": 0.0, "high": 400.0, "step": 0.5}
+    polygons = (
+        random_polygons(count // 2, seed, min_points=3, max_points=10, spread=30.0, **options)
+        + random_polygons(count // 8, seed + 1, min_points=4, max_points=4, spread=60.0, **options)
+        + random_polygons(count // 4, seed + 2, min_points=2, max_points=2, spread=30.0, **options)
+        + random_polygons(count // 8, seed + 3, max_points=1, **options)
+    )
+    order = np.random.default_rng(seed).permutation(len(polygons))
+    polygons = [polygons[k] for k in order]
+    polygons[::25] = [np.zeros((0, 2))] * len(polygons[::25])
+
+    batch = PolygonBatch.from_class_polygons((f"class{k % 3}", pts) for k, pts in enumerate(polygons))
+    return batch, [[(float(x), float(y)) for x, y in pts] for pts in polygons]
+
+
+def _random_windows(count: int, seed: int = 0) -> list[tuple[float, float, float, float]]:
+    rng = np.random.default_rng(seed)
+    windows = []
+    for _ in range(count):
+        x, y = np.round(rng.uniform(-20.0, 420.0, 2) * 2.0) / 2.0
+        w, h = np.round(rng.uniform(0.0, 60.0, 2) * 2.0) / 2.0 if rng.random() < 0.8 else (0.0, 0.0)
+        windows.append((float(x), float(y), float(x + w), float(y + h)))
+    return windows
+
+
+def _expected(polygons, window, exact: bool) -> list[int]:
+    meets = _meets_window if exact else _bbox_meets_window
+    return [k for k, polygon in enumerate(polygons) if polygon and meets(polygon, window)]
+
+
+@pytest.mark.parametrize("node_size", [2, 16])
+@pytest.mark.parametrize("exact", [True, False])
+def test_query_window_matches_brute_force(node_size: int, exact: bool) -> None:
+    batch, polygons = _random_batch(250)
+    index = SpatialIndex(batch, node_size=node_size)
+
+    for window in _random_windows(150):
+        assert index.query_window(*window, exact=exact).tolist() == _expected(polygons, window, exact)
+
+
+def test_query_point_matches_brute_force() -> None:
+    batch, polygons = _random_batch(400, seed=1)
+    index = SpatialIndex(batch)
+
+    # Query at vertices (always on the boundary) as well as at random points.
+    rng = np.random.default_rng(1)
+    points = [polygon[0] for polygon in polygons if polygon][:100]
+    points += [tuple(float(v) for v in np.round(rng.uniform(-20.0, 420.0, 2) * 2.0) / 2.0) for _ in range(300)]
+    for x, y in points:
+        expected = [k for k, polygon in enumerate(polygons) if polygon and _contains(polygon, (x, y))]
+        assert index.query_point(x, y).tolist() == expected
+
+
+def test_swapped_window_corners() -> None:
+    batch, _ = _random_batch(100, seed=2)
+    index = SpatialIndex(batch)
+    np.testing.assert_array_equal(index.query_window(300, 250, 100, 50), index.query_window(100, 50, 300, 250))
+
+
+def test_save_load_round_trip(tmp_path: Path) -> None:
+    batch, polygons = _random_batch(400, seed=3)
+    index = SpatialIndex(batch, node_size=4)
+    path = tmp_path / "0001.sindex.npz"
+    index.save(path, source={"size": 123})
+
+    loaded, source = SpatialIndex.load(path)
+
+    assert source == {"size": 123}
+    assert loaded.node_size == 4
+    assert loaded.batch.class_names == batch.class_names
+    np.testing.assert_array_equal(loaded.batch.coords, batch.coords)
+    np.testing.assert_array_equal(loaded.batch.offsets, batch.offsets)
+    for window in _random_windows(100, seed=3):
+        np.testing.assert_array_equal(loaded.query_window(*window), index.query_window(*window))
+
+
+def test_empty_batch() -> None:
+    index = SpatialIndex(PolygonBatch.empty())
+    assert index.query_window(0, 0, 100, 100).tolist() == []
+    assert index.query_point(0, 0).tolist() == []
@@ -0,0 +1,59 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+# Shared helpers for the test_*.py files: seeded random polygons and ragged-array comparisons.
+
+
+def random_polygons(
+    count: int,
+    seed: int = 0,
+    *,
+    min_points: int = 1,
+    max_points: int = 8,
+    low: float = 0.0,
+    high: float = 2000.0,
+    spread: float | tuple[float, float] | None = None,
+    repeat: float = 0.0,
+    step: float | None = None,
+) -> list[np.ndarray]:
+    # `count` (N, 2) float arrays with min_points..max_points vertices. Vertices are uniform in
+    # [low, high], or within +-spread (per axis if a pair) of a uniform center. With probability
+    # `repeat` one vertex is clicked again once or twice in a row; `step` snaps coordinates to
+    # its multiples (0.5 keeps later float arithmetic exact).
+    rng = np.random.default_rng(seed)
+    polygons = []
+    for _ in range(count):
+        n = int(rng.integers(min_points, max_points + 1))
+        if spread is None:
+            pts = rng.uniform(low, high, (n, 2))
+        else:
+            pts = rng.uniform(low, high, 2) + rng.uniform(-1.0, 1.0, (n, 2)) * np.asarray(spread, dtype=float)
+        if rng.random() < repeat:
+            k = int(rng.integers(0, n))
+            pts = np.concatenate((pts[:k], np.repeat(pts[k : k + 1], int(rng.integers(1, 3)), axis=0), pts[k:]))
+        if step is not None:
+            pts = np.round(pts / step) * step
+        polygons.append(pts)
+    return polygons
+
+
+def ragged_offsets(polygons: Sequence[np.ndarray]) -> np.ndarray:
+    offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum([polygon.shape[0] for polygon in polygons], out=offsets[1:])
+    return offsets
+
+
+def assert_ragged_equal(values: np.ndarray, offsets: np.ndarray, expected: Sequence[np.ndarray]) -> None:
+    # Item k of a flat batched result, values[offsets[k]:offsets[k + 1]], equals expected[k]
+    # bit for bit and in dtype.
+    assert offsets.shape[0] == len(expected) + 1
+    for k, item in enumerate(expected):
+        got = values[offsets[k] : offsets[k + 1]]
+        assert got.dtype == item.dtype, f"item {k}: {got.dtype} != {item.dtype}"
+        np.testing.assert_array_equal(got, item, err_msg=f"item {k}")
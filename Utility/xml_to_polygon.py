@@ -2,8 +2,12 @@
 # https://github.com/tk-yoshimura
 
 
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import lru_cache
+import math
 from pathlib import Path
+from typing import BinaryIO, Iterator
 import xml.etree.ElementTree as ET
 
 import numpy as np
@@ -12,16 +16,44 @@ from bezier_region import (
     SAMPLES_PER_SEGMENT,
     bezier_closed_region,
     bezier_open_stroke_region,
+    bezier_regions,
 )
+from conversion_stats import active_stats, stage, timed_iter
+from polygon_batch import PolygonBatch, PolygonBatchBuilder
+from zip_archive import ZipMember
 
 
-@dataclass
+CURVE_BATCH_SIZE = 1024
+MIN_ARC_SEGMENTS = 8
+MAX_ARC_SEGMENTS = 4096
+
+
+@dataclass(slots=True)
 class AnnotationPolygonItem:
     class_name: str
     shape: str
     polygon: np.ndarray
 
 
+@contextmanager
+def _open_xml(xml_path: str | Path | ZipMember | BinaryIO) -> Iterator[Path | BinaryIO]:
+    # ZIP members are streamed and closed afterwards; binary file objects are parsed as they are
+    # (their bytes are counted by whoever read them).
+    stats = active_stats()
+    if isinstance(xml_path, ZipMember):
+        if stats is not None:
+            stats.count("xml_bytes_read", xml_path.info().file_size)
+        with xml_path.open() as f:
+            yield f
+    elif hasattr(xml_path, "read"):
+        yield xml_path
+    else:
+        xml_path = Path(xml_path)
+        if stats is not None:
+            stats.count("xml_bytes_read", xml_path.stat().st_size)
+        yield xml_path
+
+
 def _parse_point_element(point_element: ET.Element) -> tuple[float, float]:
     x = float(point_element.attrib["X"])
     y = float(point_element.attrib["Y"])
@@ -74,18 +106,45 @@ def _polygon_from_rotated_rect(shape_element: ET.Element) -> np.ndarray:
     return np.asarray([p0, p1, p2, p3], dtype=float)
 
 
-def _polygon_from_circle(shape_element: ET.Element, segments: int) -> np.ndarray:
+@lru_cache(maxsize=256)
+def _unit_circle(segments: int) -> tuple[np.ndarray, np.ndarray]:
+    t = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    cos_t = np.cos(t)
+    sin_t = np.sin(t)
+    cos_t.setflags(write=False)
+    sin_t.setflags(write=False)
+    return cos_t, sin_t
+
+
+def arc_segment_count(radius: float, tolerance: float) -> int:
+    # Fewest segments (rounded up to a multiple of 4 to share cached tables) whose chords
+    # stay within `tolerance` pixels of a circle: radius * (1 - cos(pi / n)) <= tolerance.
+    if not tolerance > 0.0:
+        raise ValueError("arc tolerance must be > 0")
+    if not radius > tolerance:
+        return MIN_ARC_SEGMENTS
+
+    segments = math.ceil(math.pi / math.acos(1.0 - tolerance / radius))
+    segments = (segments + 3) // 4 * 4
+
+    return max(MIN_ARC_SEGMENTS, min(segments, MAX_ARC_SEGMENTS))
+
+
+def _polygon_from_circle(shape_element: ET.Element, segments: int, tolerance: float | None = None) -> np.ndarray:
     x = float(shape_element.attrib["X"])
     y = float(shape_element.attrib["Y"])
     radius = float(shape_element.attrib["Radius"])
 
-    t = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
-    pts = np.column_stack((x + radius * np.cos(t), y + radius * np.sin(t)))
+    if tolerance is not None:
+        segments = arc_segment_count(abs(radius), tolerance)
+
+    cos_t, sin_t = _unit_circle(segments)
+    pts = np.column_stack((x + radius * cos_t, y + radius * sin_t))
 
     return pts.astype(float)
 
 
-def _polygon_from_ellipse(shape_element: ET.Element, segments: int) -> np.ndarray:
+def _polygon_from_ellipse(shape_element: ET.Element, segments: int, tolerance: float | None = None) -> np.ndarray:
     v0 = np.asarray([float(shape_element.attrib["V0X"]), float(shape_element.attrib["V0Y"])], dtype=float)
     v1 = np.asarray([float(shape_element.attrib["V1X"]), float(shape_element.attrib["V1Y"])], dtype=float)
     width = float(shape_element.attrib["Width"])
@@ -95,8 +154,12 @@ def _polygon_from_ellipse(shape_element: ET.Element, segments: int) -> np.ndarra
     axis_y = width / 2.0
     angle = np.arctan2(v1[1] - v0[1], v1[0] - v0[0])
 
-    t = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
-    local = np.column_stack((axis_x * np.cos(t), axis_y * np.sin(t)))
+    # The ellipse is an affine image of the unit circle, so the longer axis bounds the chord error.
+    if tolerance is not None:
+        segments = arc_segment_count(max(abs(axis_x), abs(axis_y)), tolerance)
+
+    cos_t, sin_t = _unit_circle(segments)
+    local = np.column_stack((axis_x * cos_t, axis_y * sin_t))
 
     c = np.cos(angle)
     s = np.sin(angle)
@@ -105,7 +168,11 @@ def _polygon_from_ellipse(shape_element: ET.Element, segments: int) -> np.ndarra
     return (local @ rot.T + center).astype(float)
 
 
-def _polygon_from_curve(shape_element: ET.Element, bezier_samples_per_segment: int) -> np.ndarray:
+def _polygon_from_curve(
+    shape_element: ET.Element,
+    bezier_samples_per_segment: int,
+    bezier_flatness: float | None = None,
+) -> np.ndarray:
     stroke_width = float(shape_element.attrib["StrokeWidth"])
     points = _parse_points(shape_element)
 
@@ -114,16 +181,22 @@ def _polygon_from_curve(shape_element: ET.Element, bezier_samples_per_segment: i
         stroke_width=stroke_width,
         tension=0.5,
         samples_per_segment=bezier_samples_per_segment,
+        flatness=bezier_flatness,
     )
 
 
-def _polygon_from_closed_curve(shape_element: ET.Element, bezier_samples_per_segment: int) -> np.ndarray:
+def _polygon_from_closed_curve(
+    shape_element: ET.Element,
+    bezier_samples_per_segment: int,
+    bezier_flatness: float | None = None,
+) -> np.ndarray:
     points = _parse_points(shape_element)
 
     return bezier_closed_region(
         points,
         tension=0.5,
         samples_per_segment=bezier_samples_per_segment,
+        flatness=bezier_flatness,
     )
 
 
@@ -132,6 +205,8 @@ def _polygon_from_geometry(
     circle_segments: int,
     ellipse_segments: int,
     bezier_samples_per_segment: int,
+    bezier_flatness: float | None = None,
+    arc_tolerance: float | None = None,
 ) -> np.ndarray:
     shape = shape_element.tag
 
@@ -146,83 +221,264 @@ def _polygon_from_geometry(
     if shape == "RotatedRect":
         return _polygon_from_rotated_rect(shape_element)
     if shape == "Circle":
-        return _polygon_from_circle(shape_element, segments=circle_segments)
+        return _polygon_from_circle(shape_element, segments=circle_segments, tolerance=arc_tolerance)
     if shape == "Ellipse":
-        return _polygon_from_ellipse(shape_element, segments=ellipse_segments)
+        return _polygon_from_ellipse(shape_element, segments=ellipse_segments, tolerance=arc_tolerance)
     if shape == "Curve":
-        return _polygon_from_curve(shape_element, bezier_samples_per_segment=bezier_samples_per_segment)
+        return _polygon_from_curve(
+            shape_element,
+            bezier_samples_per_segment=bezier_samples_per_segment,
+            bezier_flatness=bezier_flatness,
+        )
     if shape == "ClosedCurve":
-        return _polygon_from_closed_curve(shape_element, bezier_samples_per_segment=bezier_samples_per_segment)
+        return _polygon_from_closed_curve(
+            shape_element,
+            bezier_samples_per_segment=bezier_samples_per_segment,
+            bezier_flatness=bezier_flatness,
+        )
 
     raise ValueError(f"Unsupported geometry shape: {shape}")
 
 
-def xml_to_polygon_items(
-    xml_path: str | Path,
+def _entry_class_and_shape(entry: ET.Element) -> tuple[str, ET.Element | None]:
+    class_name = ""
+    class_detail = entry.find("ClassDetail")
+    if class_detail is not None:
+        class_name = class_detail.attrib.get("Name", "")
+
+    geometry = entry.find("Geometry")
+    if geometry is None:
+        return class_name, None
+
+    return class_name, next(iter(geometry), None)
+
+
+def _polygonize_curve_batch(
+    pending: list[tuple[str, str, np.ndarray | None]],
+    curves: list[tuple[np.ndarray, bool, float]],
+    bezier_samples_per_segment: int,
+    bezier_flatness: float | None,
+) -> list[tuple[str, str, np.ndarray]]:
+    # Fill the deferred Curve/ClosedCurve polygons of a chunk with one batched Bezier call.
+    regions = iter(())
+    if curves:
+        for points, _, _ in curves:
+            if points.ndim != 2 or points.shape[1] != 2:
+                raise ValueError("points must be shape (N, 2)")
+
+        lengths = [points.shape[0] for points, _, _ in curves]
+        with stage("bezier"):
+            coords, offsets = bezier_regions(
+                np.concatenate([points for points, _, _ in curves]),
+                np.concatenate(([0], np.cumsum(lengths))),
+                [closed for _, closed, _ in curves],
+                [stroke_width for _, _, stroke_width in curves],
+                tension=0.5,
+                samples_per_segment=bezier_samples_per_segment,
+                flatness=bezier_flatness,
+            )
+        regions = (coords[offsets[k] : offsets[k + 1]] for k in range(len(curves)))
+
+    items = [
+        (class_name, shape, polygon if polygon is not None else next(regions))
+        for class_name, shape, polygon in pending
+    ]
+
+    stats = active_stats()
+    if stats is not None:
+        stats.count("vertices", sum(len(polygon) for _, _, polygon in items))
+
+    return items
+
+
+def _iter_polygons(
+    source: Path | BinaryIO,
     *,
     circle_segments: int = 64,
     ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
     bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
-) -> list[AnnotationPolygonItem]:
-    tree = ET.parse(Path(xml_path))
-    root = tree.getroot()
-
-    items: list[AnnotationPolygonItem] = []
-
-    for entry in root.findall("AnnotationEntry"):
-        class_name = ""
-        class_detail = entry.find("ClassDetail")
-        if class_detail is not None:
-            class_name = class_detail.attrib.get("Name", "")
-
-        geometry = entry.find("Geometry")
-        if geometry is None:
+    bezier_flatness: float | None = None,
+    batch_size: int | None = CURVE_BATCH_SIZE,
+) -> Iterator[tuple[str, str, np.ndarray]]:
+    # (class_name, shape, polygon) per entry; callers wrap them in whatever container they return.
+    root = None
+    depth = 0
+
+    pending: list[tuple[str, str, np.ndarray | None]] = []
+    curves: list[tuple[np.ndarray, bool, float]] = []
+    stats = active_stats()
+
+    for event, element in timed_iter("xml_parse", ET.iterparse(source, events=("start", "end"))):
+        if event == "start":
+            if root is None:
+                root = element
+            depth += 1
             continue
 
-        shape_element = next(iter(geometry), None)
-        if shape_element is None:
+        depth -= 1
+        if depth != 1:
             continue
 
-        polygon = _polygon_from_geometry(
-            shape_element,
+        if element.tag == "AnnotationEntry":
+            class_name, shape_element = _entry_class_and_shape(element)
+
+            if stats is not None:
+                stats.count(f"entries.{shape_element.tag if shape_element is not None else '(none)'}")
+
+            if shape_element is None:
+                pass
+            elif shape_element.tag == "Curve":
+                stroke_width = float(shape_element.attrib["StrokeWidth"])
+                curves.append((_parse_points(shape_element), False, stroke_width))
+                pending.append((class_name, shape_element.tag, None))
+            elif shape_element.tag == "ClosedCurve":
+                curves.append((_parse_points(shape_element), True, 0.0))
+                pending.append((class_name, shape_element.tag, None))
+            else:
+                with stage("geometry"):
+                    polygon = _polygon_from_geometry(
+                        shape_element,
+                        circle_segments=circle_segments,
+                        ellipse_segments=ellipse_segments,
+                        arc_tolerance=arc_tolerance,
+                        bezier_samples_per_segment=bezier_samples_per_segment,
+                        bezier_flatness=bezier_flatness,
+                    )
+                pending.append((class_name, shape_element.tag, np.asarray(polygon, dtype=float)))
+
+        # Drop finished top-level children (and their subtrees) from the root.
+        root.clear()
+
+        if batch_size is not None and len(pending) >= batch_size:
+            yield from _polygonize_curve_batch(pending, curves, bezier_samples_per_segment, bezier_flatness)
+            pending, curves = [], []
+
+    yield from _polygonize_curve_batch(pending, curves, bezier_samples_per_segment, bezier_flatness)
+
+
+def iter_polygon_items(
+    xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    circle_segments: int = 64,
+    ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
+    bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
+    batch_size: int | None = CURVE_BATCH_SIZE,
+) -> Iterator[AnnotationPolygonItem]:
+    # Streaming counterpart of xml_to_polygon_items: only one AnnotationEntry
+    # subtree is alive at a time, so memory does not grow with file size.
+    # Curves are buffered up to batch_size entries (None = whole file) and polygonized together.
+    with _open_xml(xml_path) as source:
+        for class_name, shape, polygon in _iter_polygons(
+            source,
             circle_segments=circle_segments,
             ellipse_segments=ellipse_segments,
+            arc_tolerance=arc_tolerance,
             bezier_samples_per_segment=bezier_samples_per_segment,
-        )
+            bezier_flatness=bezier_flatness,
+            batch_size=batch_size,
+        ):
+            yield AnnotationPolygonItem(class_name=class_name, shape=shape, polygon=polygon)
 
-        items.append(
-            AnnotationPolygonItem(
-                class_name=class_name,
-                shape=shape_element.tag,
-                polygon=np.asarray(polygon, dtype=float),
-            )
+
+def xml_to_polygon_items(
+    xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    circle_segments: int = 64,
+    ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
+    bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
+) -> list[AnnotationPolygonItem]:
+    return list(
+        iter_polygon_items(
+            xml_path,
+            circle_segments=circle_segments,
+            ellipse_segments=ellipse_segments,
+            arc_tolerance=arc_tolerance,
+            bezier_samples_per_segment=bezier_samples_per_segment,
+            bezier_flatness=bezier_flatness,
+            batch_size=None,
         )
+    )
 
-    return items
+
+def xml_to_polygon_batch(
+    xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    circle_segments: int = 64,
+    ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
+    bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
+) -> PolygonBatch:
+    # All polygons of the file in one PolygonBatch (a single coordinate buffer, no per-object items).
+    builder = PolygonBatchBuilder()
+    with _open_xml(xml_path) as source:
+        for class_name, shape, polygon in _iter_polygons(
+            source,
+            circle_segments=circle_segments,
+            ellipse_segments=ellipse_segments,
+            arc_tolerance=arc_tolerance,
+            bezier_samples_per_segment=bezier_samples_per_segment,
+            bezier_flatness=bezier_flatness,
+        ):
+            builder.append(class_name, shape, polygon)
+
+    return builder.build()
+
+
+def iter_class_polygon_arrays(
+    xml_path: str | Path | ZipMember | BinaryIO,
+    *,
+    circle_segments: int = 64,
+    ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
+    bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
+) -> Iterator[tuple[str, np.ndarray]]:
+    with _open_xml(xml_path) as source:
+        for class_name, _, polygon in _iter_polygons(
+            source,
+            circle_segments=circle_segments,
+            ellipse_segments=ellipse_segments,
+            arc_tolerance=arc_tolerance,
+            bezier_samples_per_segment=bezier_samples_per_segment,
+            bezier_flatness=bezier_flatness,
+        ):
+            yield class_name, polygon
 
 
 def xml_to_class_polygon_arrays(
-    xml_path: str | Path,
+    xml_path: str | Path | ZipMember | BinaryIO,
     *,
     circle_segments: int = 64,
     ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
     bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
 ) -> list[tuple[str, np.ndarray]]:
-    items = xml_to_polygon_items(
+    # The polygons are views into one PolygonBatch coordinate buffer.
+    return xml_to_polygon_batch(
         xml_path,
         circle_segments=circle_segments,
         ellipse_segments=ellipse_segments,
+        arc_tolerance=arc_tolerance,
         bezier_samples_per_segment=bezier_samples_per_segment,
-    )
-    return [(item.class_name, item.polygon) for item in items]
+        bezier_flatness=bezier_flatness,
+    ).to_class_polygons()
 
 
 def xml_to_class_polygon_lists(
-    xml_path: str | Path,
+    xml_path: str | Path | ZipMember | BinaryIO,
     *,
     circle_segments: int = 64,
     ellipse_segments: int = 64,
+    arc_tolerance: float | None = None,
     bezier_samples_per_segment: int = SAMPLES_PER_SEGMENT,
+    bezier_flatness: float | None = None,
 ) -> list[tuple[str, list[list[float]]]]:
     result: list[tuple[str, list[list[float]]]] = []
 
@@ -230,8 +486,34 @@ def xml_to_class_polygon_lists(
         xml_path,
         circle_segments=circle_segments,
         ellipse_segments=ellipse_segments,
+        arc_tolerance=arc_tolerance,
         bezier_samples_per_segment=bezier_samples_per_segment,
+        bezier_flatness=bezier_flatness,
     ):
         result.append((class_name, polygon.tolist()))
 
     return result
+
+
+def xml_to_class_names(xml_path: str | Path | ZipMember | BinaryIO) -> list[str]:
+    # Class names in order of first appearance, without building any geometry.
+    names: dict[str, None] = {}
+    root = None
+    depth = 0
+
+    with _open_xml(xml_path) as source:
+        for event, element in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 2 and element.tag == "ClassDetail":
+                names.setdefault(element.attrib.get("Name", ""), None)
+            elif depth == 1:
+                # Drop finished top-level children (and their subtrees) from the root.
+                root.clear()
+
+    return list(names)
@@ -0,0 +1,104 @@
+﻿# Copyright (c) T.Yoshimura
+# https://github.com/tk-yoshimura
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import os
+from pathlib import Path, PurePosixPath
+import threading
+from typing import IO, Iterator
+import zipfile
+
+
+ZIP_SUFFIX = ".zip"
+
+# One open ZipFile per archive and process: the central directory is read once, and
+# forked workers never share a file offset with their parent.
+_open_archives: dict[tuple[int, Path], zipfile.ZipFile] = {}
+_open_archives_lock = threading.Lock()
+
+
+def _zip_file(archive: Path) -> zipfile.ZipFile:
+    key = (os.getpid(), archive)
+    with _open_archives_lock:
+        zf = _open_archives.get(key)
+        if zf is None:
+            zf = zipfile.ZipFile(archive)
+            _open_archives[key] = zf
+        return zf
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    # A file inside a ZIP archive, usable where image/annotation paths are expected.
+    # Members are streamed (decompressed on read), never extracted.
+    archive: Path
+    member: str
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.member).stem
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.member).suffix
+
+    @property
+    def parent(self) -> PurePosixPath:
+        return PurePosixPath(self.member).parent
+
+    def open(self, mode: str = "rb", buffering: int = -1) -> IO[bytes]:
+        if mode != "rb":
+            raise ValueError(f"ZIP members can only be opened as 'rb': {self}")
+        return _zip_file(self.archive).open(self.member)
+
+    def read_bytes(self) -> bytes:
+        return _zip_file(self.archive).read(self.member)
+
+    def info(self) -> zipfile.ZipInfo:
+        return _zip_file(self.archive).getinfo(self.member)
+
+    def resolve(self) -> ZipMember:
+        return ZipMember(self.archive.resolve(), self.member)
+
+    def __str__(self) -> str:
+        return f"{self.archive}/{self.member}"
+
+
+def as_source(path: str | Path | ZipMember) -> Path | ZipMember:
+    return path if isinstance(path, ZipMember) else Path(path)
+
+
+def is_zip_archive(path: str | Path) -> bool:
+    path = Path(path)
+    return path.suffix.lower() == ZIP_SUFFIX and path.is_file()
+
+
+def iter_zip_members(archive: str | Path) -> Iterator[ZipMember]:
+    # File members in archive order (central directory only; nothing is decompressed).
+    archive = Path(archive)
+    for info in _zip_file(archive).infolist():
+        if not info.is_dir():
+            yield ZipMember(archive, info.filename)
+
+
+def source_stamp(path: str | Path | ZipMember) -> dict[str, int]:
+    # Cheap change marker: size + mtime for files, size + CRC-32 from the central directory for members.
+    if isinstance(path, ZipMember):
+        info = path.info()
+        return {"size": info.file_size, "crc32": info.CRC}
+
+    st = Path(path).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def relative_source_path(path: str | Path | ZipMember, root: str | Path) -> PurePosixPath:
+    # Path of an input relative to the input root (the member path for archive members).
+    if isinstance(path, ZipMember):
+        return PurePosixPath(path.member)
+    return PurePosixPath(Path(path).relative_to(root).as_posix())